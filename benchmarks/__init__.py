@@ -0,0 +1,7 @@
+"""
+In-process performance benchmarks for Firefly IRC.
+
+These are not unit tests; each module is a small click command meant to be run by hand, e.g.
+
+    python -m benchmarks.throughput run --output results.json
+"""
@@ -0,0 +1,115 @@
+"""
+Shared helpers for running a FireflyIRC instance in-process against a fake transport.
+"""
+import json
+import logging
+import platform
+import resource
+from timeit import default_timer
+
+from twisted.test.proto_helpers import StringTransport
+
+from benchmarks.sandbox import Sandbox
+import firefly
+from firefly import FireflyIRC
+from firefly.configuration import copy_configuration
+from firefly.containers import Server
+from firefly.stats import percentiles
+
+HOSTNAME = 'bench.example.org'
+
+
+def quiet_logging():
+    """
+    Keep logging overhead representative of a production (WARN) configuration.
+    """
+    log = logging.getLogger('firefly')
+    log.setLevel(logging.WARN)
+    log.addHandler(logging.NullHandler())
+
+
+def build_server(hostname=HOSTNAME):
+    """
+    Build a Server container from the default server configuration.
+
+    @rtype: Server
+    """
+    config = copy_configuration(FireflyIRC.load_configuration('servers'))
+    if not config.has_section(hostname):
+        config.add_section(hostname)
+    config.set(hostname, 'Enabled', 'True')
+    return Server(hostname, config)
+
+
+def build_client(plugins=None):
+    """
+    Instantiate FireflyIRC and connect it to a fake transport.
+
+    @type   plugins:    list of str or None
+    @param  plugins:    Names of the plugins to keep bound. None keeps every plugin.
+
+    @rtype: tuple of (FireflyIRC, StringTransport)
+    """
+    firefly_irc = FireflyIRC(build_server())
+    firefly_irc.heartbeatInterval = None  # There is no running reactor to drive the heartbeat
+
+    if plugins is not None:
+        registry = firefly_irc.registry
+        for name in (set(registry._commands) | set(registry._events) | set(registry._lazy_plugins)) - set(plugins):
+            registry.unbind_plugin(name)
+
+    transport = StringTransport()
+    firefly_irc.makeConnection(transport)
+    transport.clear()
+
+    return firefly_irc, transport
+
+
+def peak_memory():
+    """
+    Peak resident set size of the current process in kilobytes.
+
+    @rtype: int
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, everything else reports kilobytes
+    return usage // 1024 if platform.system() == 'Darwin' else usage
+
+
+def timer():
+    """
+    @rtype: float
+    """
+    return default_timer()
+
+
+def metadata():
+    """
+    Environment information stored alongside benchmark results.
+
+    @rtype: dict
+    """
+    return {
+        'firefly_version': firefly.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+    }
+
+
+def write_results(path, results):
+    """
+    @type   path:       str
+    @type   results:    dict
+    """
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def read_results(path):
+    """
+    @type   path:   str
+    @rtype: dict
+    """
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,76 @@
+"""
+Language engine benchmark.
+
+Compares the AgentML and trie language engines on the same generated triggers: how long each takes to load them, and
+how long each takes to reply to a corpus of chatter messages. Trigger counts are given as a comma separated list, so
+the scaling of each engine with the number of loaded triggers is visible at a glance.
+
+Usage:
+    python -m benchmarks.language --triggers 100,1000,5000 --messages 5000
+"""
+import os
+import shutil
+import tempfile
+
+import click
+
+from benchmarks import harness
+from benchmarks.prefilter import write_triggers, time_calls, report
+from benchmarks.traffic import TrafficGenerator
+from firefly.languages.trie import TrieLanguage
+
+
+def engines():
+    """
+    Get the available language engines.
+
+    @rtype: list of (str, type)
+    """
+    available = [('trie', TrieLanguage)]
+    try:
+        from firefly.languages.aml import AgentMLLanguage
+    except ImportError as e:
+        click.echo('AgentML is not available, only benchmarking the trie engine: {e}'.format(e=e))
+    else:
+        available.insert(0, ('aml', AgentMLLanguage))
+
+    return available
+
+
+@click.command()
+@click.option('-n', '--messages', default=5000, help='Number of chatter messages.')
+@click.option('-t', '--triggers', default='100,1000,5000', help='Comma separated numbers of generated triggers.')
+@click.option('-s', '--seed', default=0, help='Random seed.')
+def cli(messages, triggers, seed):
+    """
+    Benchmark the language engines
+    """
+    corpus = TrafficGenerator(seed=seed).sentences(messages)
+    available = engines()
+
+    for count in [int(c) for c in triggers.split(',')]:
+        tempdir = tempfile.mkdtemp(prefix='firefly-bench-')
+        try:
+            write_triggers(os.path.join(tempdir, 'generated.aml'), count, seed)
+            click.echo('{n} triggers'.format(n=count))
+
+            for name, language_class in available:
+                language = language_class()
+
+                started = harness.timer()
+                language.load_directory(tempdir)
+                click.echo('  {n:<22} loaded in {t:.1f}ms'.format(n=name, t=(harness.timer() - started) * 1000.0))
+
+                # Keep the comparison between the engines themselves
+                if getattr(language, 'prefilter', None):
+                    language.prefilter.unanchored += 1
+
+                replies = []
+                report(name, time_calls(lambda m: replies.append(language.get_reply(m)), corpus))
+                click.echo('  {n:<22} {r:,d} replies'.format(n='', r=len([r for r in replies if r])))
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,140 @@
+"""
+Language prefilter benchmark.
+
+Measures how many chatter messages the keyword prefilter lets through to the language engine, and what that saves per
+message. Triggers are generated from the same vocabulary as the chatter corpus so the hit rate is realistic rather than
+flattering; the bundled plugin language files and any directories given with --language-dir are loaded as well.
+
+Usage:
+    python -m benchmarks.prefilter --messages 20000 --triggers 200
+    python -m benchmarks.prefilter --language-dir ~/.config/firefly/irc/language
+"""
+import os
+import random
+import shutil
+import tempfile
+
+import click
+
+from benchmarks import harness
+from benchmarks.traffic import TrafficGenerator, WORDS
+from firefly.languages.prefilter import KeywordPrefilter
+
+AML_TEMPLATE = """<agentml version="0.2" xmlns="">
+{triggers}
+</agentml>
+"""
+
+TRIGGER_TEMPLATE = """    <trigger>
+        <pattern>{pattern}</pattern>
+        <template>Matched</template>
+    </trigger>"""
+
+# Pattern shapes, filled in with random vocabulary words
+PATTERN_SHAPES = (
+    '{0} {1} *',
+    '* {0} {1}',
+    '{0} is *',
+    'what is {0}',
+    '({0}|{1}) {2}',
+    '[{0}] {1} {2} #',
+    '{0} {1} {2}',
+)
+
+
+def write_triggers(path, count, seed):
+    """
+    Write an AgentML file containing generated triggers.
+
+    @type   path:   str
+    @type   count:  int
+    @type   seed:   int
+    """
+    rand = random.Random(seed)
+    patterns = []
+    for __ in range(count):
+        shape = rand.choice(PATTERN_SHAPES)
+        patterns.append(shape.format(*[rand.choice(WORDS) for __ in range(3)]))
+
+    with open(path, 'w') as f:
+        f.write(AML_TEMPLATE.format(triggers='\n'.join(TRIGGER_TEMPLATE.format(pattern=p) for p in patterns)))
+
+
+def time_calls(func, messages):
+    """
+    @rtype: list of float
+    """
+    latencies = []
+    for message in messages:
+        started = harness.timer()
+        func(message)
+        latencies.append(harness.timer() - started)
+
+    return latencies
+
+
+def report(name, latencies):
+    percentiles = harness.percentiles(latencies)
+    click.echo('  {n:<22} {t:>10.1f}ms total  p50 {p50:.4f}ms  p99 {p99:.4f}ms'.format(
+        n=name, t=sum(latencies) * 1000.0, p50=percentiles['p50'] * 1000.0, p99=percentiles['p99'] * 1000.0))
+
+
+@click.command()
+@click.option('-n', '--messages', default=20000, help='Number of chatter messages.')
+@click.option('-t', '--triggers', default=200, help='Number of generated triggers.')
+@click.option('-s', '--seed', default=0, help='Random seed.')
+@click.option('-l', '--language-dir', multiple=True, type=click.Path(exists=True, file_okay=False),
+              help='Additional AgentML language directory to load. May be given multiple times.')
+def cli(messages, triggers, seed, language_dir):
+    """
+    Benchmark the language keyword prefilter
+    """
+    corpus = TrafficGenerator(seed=seed).sentences(messages)
+    plugin_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                               'firefly', 'plugins', 'test', 'lang', 'default')
+
+    tempdir = tempfile.mkdtemp(prefix='firefly-bench-')
+    try:
+        write_triggers(os.path.join(tempdir, 'generated.aml'), triggers, seed)
+        directories = [tempdir, plugin_path] + list(language_dir)
+
+        prefilter = KeywordPrefilter()
+        for directory in directories:
+            prefilter.load_directory(directory)
+
+        stats = prefilter.stats
+        click.echo('{p} patterns, {a} anchor words, prefilter {e}'.format(
+            p=stats['patterns'], a=stats['anchor_words'], e='enabled' if stats['enabled'] else
+            'DISABLED ({u} unanchored patterns)'.format(u=stats['unanchored_patterns'])))
+
+        report('prefilter', time_calls(prefilter.check, corpus))
+        stats = prefilter.stats
+        click.echo('  {c:,d} checked  {p:,d} passed  {r:,d} rejected  hit rate {h:.1%}'.format(
+            c=stats['checked'], p=stats['passed'], r=stats['rejected'], h=stats['hit_rate'] or 0))
+
+        # Compare against the language engine itself, if it's available
+        try:
+            from agentml import errors
+            from firefly.languages.aml import AgentMLLanguage
+        except ImportError as e:
+            click.echo('AgentML is not available, skipping the engine comparison: {e}'.format(e=e))
+            return
+
+        language = AgentMLLanguage()
+        for directory in directories:
+            language.load_directory(directory)
+
+        def unfiltered(message):
+            try:
+                language.aml.get_reply('localhost', unicode(message, 'utf-8'))
+            except errors.AgentMLError:
+                pass
+
+        report('engine (unfiltered)', time_calls(unfiltered, corpus))
+        report('engine (prefiltered)', time_calls(language.get_reply, corpus))
+    finally:
+        shutil.rmtree(tempdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,78 @@
+"""
+An isolated environment for running FireflyIRC in-process, without network access.
+"""
+from twisted.internet import defer
+from twisted.internet.error import DNSLookupError
+
+from firefly import FireflyIRC
+from firefly.capture import TemporaryDirectories
+from firefly.configuration import ConfigurationCache
+from firefly.resolver import Resolver
+
+# Canned responses returned in place of real plugin network requests while sandboxed
+CANNED_PAGE = '<html><head><title>Example Domain</title></head><body><p>Replay</p></body></html>'
+CANNED_DEFINITIONS = ([('example', 'noun', 'one that serves as a pattern to be imitated')], [])
+CANNED_SEARCH = [(u'Example Domain', 'http://example.com/')]
+
+
+class Sandbox(TemporaryDirectories):
+    """
+    Runs FireflyIRC in temporary directories with a fresh configuration cache and resolver, and optionally replaces
+    the network requests made by the url, dictionary and google plugins, and DNS lookups, with canned responses.
+
+    The plugin methods replaced here are private, so this has to be kept in step with those plugins.
+    """
+    def __init__(self, offline=True):
+        """
+        @type   offline:    bool
+        @param  offline:    Replace plugin network requests and DNS lookups with canned responses while sandboxed.
+        """
+        super(Sandbox, self).__init__()
+        self.offline = offline
+        self._patched = []
+        """@type: list of (type, str, object)"""
+
+    def _patch(self, cls, name, value):
+        """
+        Replace a class attribute until we exit the sandbox.
+        """
+        self._patched.append((cls, name, cls.__dict__[name]))
+        setattr(cls, name, value)
+
+    def __enter__(self):
+        super(Sandbox, self).__enter__()
+
+        # Shared by every instance, so they're created when FireflyIRC is defined rather than in the sandbox
+        self._patch(FireflyIRC, 'config_cache', ConfigurationCache())
+        self._patch(FireflyIRC, 'resolver', Resolver(lookup=self._lookup if self.offline else None))
+
+        if self.offline:
+            from firefly.plugins.url.url import UrlParser
+            from firefly.plugins.dictionary import Dictionary
+            from firefly.plugins.google import Google
+
+            define = lambda dictionary, word, limit: CANNED_DEFINITIONS
+            search = lambda query, results: CANNED_SEARCH[:results]
+
+            self._patch(UrlParser, '_fetch_partial_page', lambda parser, url, page_bytes=8192: CANNED_PAGE)
+            self._patch(Dictionary, '_fetch_definitions', staticmethod(define))
+            self._patch(Google, '_google_search', staticmethod(search))
+
+        return self
+
+    @staticmethod
+    def _lookup(host):
+        """
+        Fail every DNS lookup made while sandboxed.
+
+        @type   host:   str
+        @rtype: twisted.internet.defer.Deferred
+        """
+        return defer.fail(DNSLookupError(host))
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        while self._patched:
+            cls, name, value = self._patched.pop()
+            setattr(cls, name, value)
+
+        super(Sandbox, self).__exit__(exc_type, exc_val, exc_tb)
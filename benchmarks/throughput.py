@@ -0,0 +1,190 @@
+"""
+Throughput benchmark.
+
+Drives FireflyIRC with synthetic server traffic through lineReceived and reports lines per second, per-line latency
+percentiles and peak memory usage for different plugin sets. Every plugin set runs in its own process so memory
+figures are not polluted by previous runs.
+
+Usage:
+    python -m benchmarks.throughput run --lines 20000 --output before.json
+    python -m benchmarks.throughput run --lines 20000 --output after.json
+    python -m benchmarks.throughput compare before.json after.json
+"""
+import multiprocessing
+import time
+
+import click
+
+from benchmarks import harness
+from benchmarks.traffic import TrafficGenerator
+
+# Named plugin sets. None binds every available plugin.
+PLUGIN_SETS = {
+    'none': [],
+    'core': ['auth', 'datetime', 'test'],
+    'all':  None,
+}
+
+
+def run_scenario(name, plugins, count, warmup, seed):
+    """
+    Run a single benchmark scenario in the current process.
+
+    @type   name:       str
+    @param  name:       Name of the scenario.
+
+    @type   plugins:    list of str or None
+    @param  plugins:    The plugins to keep bound.
+
+    @type   count:      int
+    @param  count:      Number of measured lines.
+
+    @type   warmup:     int
+    @param  warmup:     Number of lines fed before measurement starts.
+
+    @type   seed:       int
+    @param  seed:       Traffic generator seed.
+
+    @rtype: dict
+    """
+    harness.quiet_logging()
+
+    with harness.Sandbox():
+        baseline_rss = harness.peak_memory()
+
+        started = harness.timer()
+        firefly_irc, transport = harness.build_client(plugins)
+        startup = harness.timer() - started
+
+        generator = TrafficGenerator(nick=firefly_irc.nickname, seed=seed, plugins=plugins,
+                                     command_prefix=firefly_irc.server.command_prefix or '@')
+
+        for line in generator.welcome():
+            firefly_irc.lineReceived(line)
+
+        lines = generator.lines(warmup + count)
+        for line in lines[:warmup]:
+            try:
+                firefly_irc.lineReceived(line)
+            except Exception:
+                pass
+        transport.clear()
+
+        latencies = []
+        errors = 0
+        began = harness.timer()
+        for line in lines[warmup:]:
+            line_start = harness.timer()
+            try:
+                firefly_irc.lineReceived(line)
+            except Exception:
+                errors += 1
+            latencies.append(harness.timer() - line_start)
+        elapsed = harness.timer() - began
+
+        peak_rss = harness.peak_memory()
+
+    return {
+        'name': name,
+        'plugins': plugins if plugins is not None else 'all',
+        'lines': count,
+        'errors': errors,
+        'elapsed_sec': elapsed,
+        'lines_per_sec': count / elapsed if elapsed else None,
+        'latency_ms': dict((k, v * 1000.0) for k, v in harness.percentiles(latencies).items()),
+        'startup_ms': startup * 1000.0,
+        'peak_rss_kb': peak_rss,
+        'rss_growth_kb': peak_rss - baseline_rss,
+        'outbound_bytes': len(transport.value()),
+    }
+
+
+def _run_isolated(queue, *args):
+    queue.put(run_scenario(*args))
+
+
+def run_isolated(*args):
+    """
+    Run a scenario in a child process and return its results.
+
+    @rtype: dict
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_isolated, args=(queue,) + args)
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+@click.group()
+def cli():
+    """
+    Firefly IRC throughput benchmarks
+    """
+    pass
+
+
+@cli.command('run')
+@click.option('-n', '--lines', default=10000, help='Number of measured lines per plugin set.')
+@click.option('-w', '--warmup', default=1000, help='Number of unmeasured warmup lines.')
+@click.option('-s', '--seed', default=0, help='Traffic generator seed.')
+@click.option('-p', '--plugin-set', 'plugin_sets', multiple=True, type=click.Choice(sorted(PLUGIN_SETS.keys())),
+              help='Plugin set to benchmark. May be given multiple times; defaults to every set.')
+@click.option('--plugins', help='Comma separated list of plugins to benchmark as an additional "custom" set.')
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True), help='Write JSON results here.')
+def run(lines, warmup, seed, plugin_sets, plugins, output):
+    """
+    Run the throughput benchmark
+    """
+    scenarios = [(name, PLUGIN_SETS[name]) for name in (plugin_sets or sorted(PLUGIN_SETS.keys()))]
+    if plugins:
+        scenarios.append(('custom', [p.strip().lower() for p in plugins.split(',') if p.strip()]))
+
+    results = {'meta': harness.metadata(), 'timestamp': int(time.time()), 'seed': seed, 'scenarios': {}}
+
+    for name, plugin_set in scenarios:
+        click.echo('Running {n}...'.format(n=name))
+        result = run_isolated(name, plugin_set, lines, warmup, seed)
+        results['scenarios'][name] = result
+
+        latency = result['latency_ms']
+        click.echo('  {lps:,.0f} lines/sec  p50 {p50:.3f}ms  p99 {p99:.3f}ms  max {max:.3f}ms  '
+                   'peak {rss:,d} KB  errors {err}'
+                   .format(lps=result['lines_per_sec'], p50=latency['p50'], p99=latency['p99'], max=latency['max'],
+                           rss=result['peak_rss_kb'], err=result['errors']))
+
+    if output:
+        harness.write_results(output, results)
+        click.secho('Results written to {o}'.format(o=output), bold=True)
+
+
+@cli.command('compare')
+@click.argument('baseline', type=click.Path(exists=True, dir_okay=False))
+@click.argument('candidate', type=click.Path(exists=True, dir_okay=False))
+def compare(baseline, candidate):
+    """
+    Compare two saved benchmark runs
+    """
+    before = harness.read_results(baseline)
+    after  = harness.read_results(candidate)
+
+    def delta(old, new):
+        return ((new - old) / old * 100.0) if old else 0.0
+
+    for name in sorted(set(before['scenarios']) & set(after['scenarios'])):
+        old, new = before['scenarios'][name], after['scenarios'][name]
+        click.secho(name, bold=True)
+        click.echo('  lines/sec   {o:>12,.0f} -> {n:>12,.0f}  ({d:+.1f}%)'.format(
+            o=old['lines_per_sec'], n=new['lines_per_sec'], d=delta(old['lines_per_sec'], new['lines_per_sec'])))
+
+        for point in ('p50', 'p99', 'max'):
+            o, n = old['latency_ms'][point], new['latency_ms'][point]
+            click.echo('  {p:<11} {o:>10.3f}ms -> {n:>10.3f}ms  ({d:+.1f}%)'.format(p=point, o=o, n=n, d=delta(o, n)))
+
+        click.echo('  peak rss    {o:>10,d}KB -> {n:>10,d}KB  ({d:+.1f}%)'.format(
+            o=old['peak_rss_kb'], n=new['peak_rss_kb'], d=delta(old['peak_rss_kb'], new['peak_rss_kb'])))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,167 @@
+"""
+Synthetic IRC traffic generation.
+
+Lines are produced in raw server format (without the trailing CRLF) so they can be fed directly into
+IRCClient.lineReceived.
+"""
+import random
+
+# Relative weights of each line type in the generated traffic
+DEFAULT_MIX = (
+    ('chatter',  55),
+    ('mention',  8),
+    ('command',  8),
+    ('url',      7),
+    ('action',   5),
+    ('join',     6),
+    ('part',     4),
+    ('quit',     3),
+    ('nick',     1),
+    ('ctcp',     3),
+)
+
+# Commands issued per plugin. Only commands that never touch the network are included here.
+COMMANDS = {
+    'auth':     ['auth status'],
+    'datetime': ['datetime date', 'datetime time --iso', 'datetime datetime', 'datetime format "YYYY"'],
+    'test':     ['test poke 2'],
+}
+
+WORDS = ('the', 'a', 'is', 'it', 'to', 'and', 'of', 'that', 'this', 'what', 'how', 'why', 'lol', 'yeah', 'no',
+         'i', 'you', 'we', 'think', 'know', 'build', 'server', 'network', 'release', 'bug', 'patch', 'test',
+         'python', 'works', 'broken', 'again', 'today', 'tomorrow', 'anyone', 'here', 'there', 'ok', 'thanks',
+         'hello', 'hey', 'good', 'morning', 'night', 'brb', 'afk', 'back', 'nice', 'cool', 'weird', 'fixed')
+
+URLS = ('https://example.org/some/page', 'http://www.example.com/', 'www.example.net/news/2015/10/31',
+        'example.io/docs', 'https://example.org/search?q=firefly+irc')
+
+CTCPS = ('PING 1446163200', 'VERSION', 'TIME', 'FINGER', 'USERINFO')
+
+
+class TrafficGenerator(object):
+    """
+    Generates a reproducible stream of raw IRC server lines.
+    """
+    def __init__(self, nick='Firefly', channels=('#firefly', '#chat', '#dev'), users=200, seed=0, mix=DEFAULT_MIX,
+                 command_prefix='@', plugins=None):
+        """
+        @type   nick:           str
+        @param  nick:           The nick of the client under test, used for mentions and queries.
+
+        @type   channels:       tuple of str
+        @param  channels:       Channels the traffic is spread across.
+
+        @type   users:          int
+        @param  users:          Size of the simulated user population.
+
+        @type   seed:           int
+        @param  seed:           Random seed. The same seed always produces the same traffic.
+
+        @type   mix:            tuple of (str, int)
+        @param  mix:            Relative weights of each line type.
+
+        @type   command_prefix: str
+        @param  command_prefix: The command prefix configured for the server under test.
+
+        @type   plugins:        list of str or None
+        @param  plugins:        Plugins commands may be issued to. None allows every plugin in COMMANDS.
+        """
+        self.nick = nick
+        self.channels = channels
+        self.command_prefix = command_prefix
+        self._random = random.Random(seed)
+
+        self.users = ['user{n}!~u{n}@host-{n}.example.org'.format(n=n) for n in range(users)]
+
+        plugins = COMMANDS.keys() if plugins is None else plugins
+        self.commands = [cmd for plugin in sorted(plugins) for cmd in COMMANDS.get(plugin, [])]
+
+        self._kinds = []
+        for kind, weight in mix:
+            # No point in generating commands nobody is listening for
+            if kind == 'command' and not self.commands:
+                continue
+            self._kinds += [kind] * weight
+
+    def _sentence(self, minimum=2, maximum=14):
+        return ' '.join(self._random.choice(WORDS) for __ in range(self._random.randint(minimum, maximum)))
+
+    def sentences(self, count):
+        """
+        Generate plain chatter messages, without any IRC framing.
+
+        @type   count:  int
+        @rtype: list of str
+        """
+        return [self._sentence() for __ in range(count)]
+
+    def welcome(self):
+        """
+        Lines sent by the server when we register and join our channels.
+
+        @rtype: list of str
+        """
+        lines = [
+            ':irc.example.org 001 {n} :Welcome to the Example IRC Network {n}'.format(n=self.nick),
+            ':irc.example.org 005 {n} CHANTYPES=# PREFIX=(ov)@+ NETWORK=Example :are supported'.format(n=self.nick),
+        ]
+        for channel in self.channels:
+            lines.append(':{n}!~firefly@firefly.example.org JOIN :{c}'.format(n=self.nick, c=channel))
+
+        return lines
+
+    def line(self):
+        """
+        Generate a single line of traffic.
+
+        @rtype: str
+        """
+        kind = self._random.choice(self._kinds)
+        user = self._random.choice(self.users)
+        channel = self._random.choice(self.channels)
+
+        if kind == 'chatter':
+            return ':{u} PRIVMSG {c} :{m}'.format(u=user, c=channel, m=self._sentence())
+
+        if kind == 'mention':
+            if self._random.random() < 0.5:
+                return ':{u} PRIVMSG {c} :{n}: {m}'.format(u=user, c=channel, n=self.nick, m=self._sentence())
+            return ':{u} PRIVMSG {n} :{m}'.format(u=user, n=self.nick, m=self._sentence())
+
+        if kind == 'command':
+            return ':{u} PRIVMSG {c} :{p}{cmd}'.format(u=user, c=channel, p=self.command_prefix,
+                                                       cmd=self._random.choice(self.commands))
+
+        if kind == 'url':
+            return ':{u} PRIVMSG {c} :{m} {url}'.format(u=user, c=channel, m=self._sentence(1, 5),
+                                                        url=self._random.choice(URLS))
+
+        if kind == 'action':
+            return ':{u} PRIVMSG {c} :\x01ACTION {m}\x01'.format(u=user, c=channel, m=self._sentence())
+
+        if kind == 'join':
+            return ':{u} JOIN :{c}'.format(u=user, c=channel)
+
+        if kind == 'part':
+            return ':{u} PART {c} :{m}'.format(u=user, c=channel, m=self._sentence(0, 4))
+
+        if kind == 'quit':
+            return ':{u} QUIT :Quit: {m}'.format(u=user, m=self._sentence(0, 4))
+
+        if kind == 'nick':
+            return ':{u} NICK :{n}_'.format(u=user, n=user.split('!')[0])
+
+        if kind == 'ctcp':
+            return ':{u} PRIVMSG {n} :\x01{q}\x01'.format(u=user, n=self.nick, q=self._random.choice(CTCPS))
+
+        raise ValueError('Unrecognized line type: {k}'.format(k=kind))
+
+    def lines(self, count):
+        """
+        Generate count lines of traffic.
+
+        @type   count:  int
+
+        @rtype: list of str
+        """
+        return [self.line() for __ in range(count)]
@@ -0,0 +1,124 @@
+"""
+Merriam-Webster response parsing benchmark.
+
+Compares parsing stored sample API responses the way the wrapper used to (reading the whole response, building the
+full element tree, then parsing every entry) against the streaming parser, both reading every entry and stopping after
+the number of definitions the dictionary plugin actually displays. Responses are served from memory, so only parsing
+is measured.
+
+Usage:
+    python -m benchmarks.webster --iterations 2000 --limit 3
+    python -m benchmarks.webster --data-dir ~/webster-samples
+"""
+import os
+import re
+from StringIO import StringIO
+
+import click
+
+from benchmarks.prefilter import time_calls, report
+from firefly.plugins.dictionary.webster import CollegiateDictionary, WordNotFoundException
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'webster')
+
+
+def load_samples(directory):
+    """
+    Load the sample responses in a directory, keyed by the word they were looked up for.
+
+    @type   directory:  str
+    @rtype: dict of (str: str)
+    """
+    samples = {}
+    for filename in sorted(os.listdir(directory)):
+        word, ext = os.path.splitext(filename)
+        if ext == '.xml':
+            with open(os.path.join(directory, filename)) as f:
+                samples[word] = f.read()
+
+    return samples
+
+
+def buffered_lookup(dictionary, word):
+    """
+    Parse a response the way the wrapper did before it streamed: read it whole and build the full element tree first.
+
+    @type   dictionary: CollegiateDictionary
+    @type   word:       str
+    @rtype: list
+    """
+    import xml.etree.cElementTree as ElementTree
+
+    data = dictionary.urlopen(dictionary.request_url(word)).read()
+    try:
+        root = ElementTree.fromstring(data)
+    except ElementTree.ParseError:
+        root = ElementTree.fromstring(re.sub(r'&(?!amp;)', '&amp;', data))
+
+    suggestions = root.findall('suggestion')
+    if suggestions:
+        raise WordNotFoundException(word, [s.text for s in suggestions])
+
+    return list(dictionary.parse_xml(root, word))
+
+
+def streaming_lookup(dictionary, word, limit=None):
+    """
+    @type   dictionary: CollegiateDictionary
+    @type   word:       str
+    @type   limit:      int or None
+    @rtype: list
+    """
+    entries = dictionary.lookup(word)
+    definitions = []
+    try:
+        for entry in entries:
+            definitions.extend(entry.senses)
+            if limit and len(definitions) >= limit:
+                break
+    finally:
+        entries.close()
+
+    return definitions
+
+
+def ignore_missing(func):
+    def wrapper(*args):
+        try:
+            func(*args)
+        except WordNotFoundException:
+            pass
+
+    return wrapper
+
+
+@click.command()
+@click.option('-n', '--iterations', default=2000, help='Number of times each sample is parsed.')
+@click.option('-l', '--limit', default=3, help='Definitions needed before the early exit parser stops.')
+@click.option('-d', '--data-dir', default=DATA_DIR, type=click.Path(exists=True, file_okay=False),
+              help='Directory of sample API responses, named <word>.xml.')
+def cli(iterations, limit, data_dir):
+    """
+    Benchmark Merriam-Webster response parsing
+    """
+    samples = load_samples(data_dir)
+    if not samples:
+        raise click.UsageError('No sample responses found in {d}'.format(d=data_dir))
+
+    # The sample being parsed; every request is answered with it
+    current = [None]
+    dictionary = CollegiateDictionary('benchmark', urlopen=lambda url: StringIO(samples[current[0]]))
+
+    for word, data in sorted(samples.items()):
+        current[0] = word
+        click.echo('{w} ({b:,d} bytes)'.format(w=word, b=len(data)))
+
+        words = [word] * iterations
+        report('buffered', time_calls(ignore_missing(lambda w: buffered_lookup(dictionary, w)), words))
+        report('streaming', time_calls(ignore_missing(lambda w: streaming_lookup(dictionary, w)), words))
+        report('streaming (limit {l})'.format(l=limit),
+               time_calls(ignore_missing(lambda w: streaming_lookup(dictionary, w, limit)), words))
+
+
+if __name__ == '__main__':
+    cli()
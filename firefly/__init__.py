@@ -1,20 +1,28 @@
+import copy
 import importlib
 import logging
 import os
 import shutil
 import sys
+import warnings
+import weakref
 from ConfigParser import ConfigParser
 
 import appdirs
-import pkg_resources
-import venusian
 from ircmessage import style
+from twisted.internet import defer
 from twisted.words.protocols.irc import IRCClient
 
 from firefly import plugins, irc
 from firefly.args import ArgumentParser
 from firefly.auth import User, Auth
+from firefly.charset import Charset
+from firefly.configuration import ConfigurationCache
+from firefly.filters import EventMatcher
 from firefly.containers import ServerInfo, Destination, Hostmask, Message, Response
+from firefly.ircv3 import Capabilities, parse_tags
+from firefly.languages.cache import LanguageCache
+from firefly.resolver import Resolver
 from errors import LanguageImportError, PluginCommandExistsError, PluginError, NoSuchPluginError, NoSuchCommandError, \
     ArgumentParserError
 
@@ -38,34 +46,83 @@ class FireflyIRC(IRCClient):
     DATA_DIR   = os.path.join(appdirs.user_data_dir('firefly'), 'irc')
     LOG_DIR    = os.path.join(appdirs.user_log_dir('firefly'), 'irc')
 
-    def __init__(self, server, language='aml'):
+    # Parsed configuration files, shared by every instance
+    config_cache = ConfigurationCache()
+
+    # Resolved hostnames, shared by every instance
+    resolver = Resolver()
+
+    def __init__(self, server, language='aml', host=None, language_workers=0):
         """
         @type   server:     firefly.containers.Server
 
         @type   language:   C{str}
         @param  language:   The language engine to use for this instance.
+
+        @type   host:       PluginHost or None
+        @param  host:       Plugin host to share with other connections. If None, a new host is created for this
+                            connection alone.
+
+        @type   language_workers:   C{int}
+        @param  language_workers:   Number of worker processes to run the language engine in. If 0, the language engine
+                                    runs in this process.
         """
         # Set up logging
         self._log = logging.getLogger('firefly')
 
-        self.language = None
-        """@type : firefly.languages.interface.LanguageInterface"""
-        self._load_language_interface(language)
-
-        # Set up our registry and server containers, then run setup
-        self.registry = _Registry(self)
+        # Set up our plugin host and server containers
+        self.host = host or PluginHost()
         self.server_info = ServerInfo()
         self.server = server
+
+        # Inbound lines are decoded once, here at the protocol boundary
+        self.charset = Charset(server.encodings)
+
+        # IRCv3 capabilities, and the message tags of the line currently being handled
+        self.capabilities = Capabilities(server.capabilities)
+        self.tags = {}
+
+        # Load our language engine, then run setup
+        self.language = None
+        """@type : firefly.languages.interface.LanguageInterface"""
+        self._load_language_interface(language, language_workers)
         self._setup()
         self.load_language_files()
 
         # Set up our authentication manager
         self.auth = Auth(self)
 
-        # Finally, now that everything is set up, load our plugins
-        self.plugins = pkg_resources.get_entry_map('firefly_irc', 'firefly.plugins')
-        scanner = venusian.Scanner(firefly=self)
-        scanner.scan(plugins)
+        # Inbound traffic recorder, see start_capture
+        self.recorder = None
+
+        # Finally, now that everything is set up, attach to our plugin host. The first connection loads the plugins.
+        self.host.attach(self)
+
+    @property
+    def registry(self):
+        """
+        The plugin registry, shared by every connection attached to the same host.
+        @rtype: _Registry
+        """
+        return self.host.registry
+
+    @property
+    def language_cache(self):
+        """
+        Compiled language data, shared by every connection attached to the same host.
+        @rtype: LanguageCache
+        """
+        return self.host.language_cache
+
+    @property
+    def plugins(self):
+        """
+        Plugin entry points registered by installed packages.
+        @rtype: dict
+        """
+        # pkg_resources scans every installed distribution when imported, so only pay for it when actually needed
+        import pkg_resources
+        return pkg_resources.get_entry_map('firefly_irc', 'firefly.plugins')
 
     @staticmethod
     def load_configuration(name, plugin=None, basedir=None, default=None, ext='.cfg'):
@@ -90,6 +147,29 @@ class FireflyIRC(IRCClient):
         @raise  ValueError: Raised if the supplied configuration file does not exist
 
         @rtype: ConfigParser
+        @return:    A cached configuration instance, shared with every other caller. Changes to the underlying files
+                    are picked up by FireflyIRC.config_cache.check(). Callers that modify it without writing it back
+                    should modify a firefly.configuration.copy_configuration() copy instead.
+        """
+        key = (FireflyIRC.CONFIG_DIR, plugin.plugin_path if plugin else None, plugin.name if plugin else None,
+               name, basedir, default, ext)
+
+        config = FireflyIRC.config_cache.get(key)
+        if config is not None:
+            return config
+
+        paths = FireflyIRC._configuration_paths(name, plugin, basedir, default, ext)
+        return FireflyIRC.config_cache.load(key, paths)
+
+    @staticmethod
+    def _configuration_paths(name, plugin=None, basedir=None, default=None, ext='.cfg'):
+        """
+        Locate the default and user paths for a configuration file, creating the user file if it does not exist yet.
+        See load_configuration for a description of the arguments.
+
+        @raise  ValueError: Raised if the supplied configuration file does not exist
+
+        @rtype: list of str
         """
         log = logging.getLogger('firefly')
         ext = ext or ''  # If None, we need to convert the extension to an empty string
@@ -141,24 +221,36 @@ class FireflyIRC(IRCClient):
             shutil.copyfile(app_path, user_path)
 
         paths.append(user_path)
+        return paths
 
-        # Load the configuration files
-        config = ConfigParser()
-        log.debug('Attempting to load configuration files: %s', str(paths))
-        result = config.read(paths)
-        log.debug('Configuration files loaded: %s', str(result))
-        return config
-
-    def _load_language_interface(self, language):
+    def _load_language_interface(self, language, workers=0):
         """
         Load and instantiate the specific language engine.
 
+        Connections that use the same identity container share a single language engine through the plugin host.
+
         @type   language:   C{str}
+
+        @type   workers:    C{int}
+        @param  workers:    Number of worker processes to run the language engine in, or 0 to run it in this process.
         """
+        key = (language, self.server.identity.container, workers)
+        if key in self.host.languages:
+            self._log.info('Sharing loaded language interface: {lang}'.format(lang=language))
+            self.language = self.host.languages[key]
+            return
+
         self._log.info('Loading language interface: {lang}'.format(lang=language))
         try:
             module = importlib.import_module('firefly.languages.{module}'.format(module=language))
-            self.language = module.__LANGUAGE_CLASS__()
+            language_class = module.__LANGUAGE_CLASS__
+            if workers:
+                from firefly.languages.pool import PooledLanguage
+                self.language = PooledLanguage(language, workers, cache_path=self.language_cache.path)
+            else:
+                self.language = language_class()
+
+            self.host.languages[key] = self.language
         except ImportError as e:
             self._log.error('ImportError raised when loading language')
             raise LanguageImportError('Unable to import language engine "{lang}": {err}'
@@ -191,7 +283,7 @@ class FireflyIRC(IRCClient):
             self._log.warn('Language directory %s does not exist', lang_path)
             return
 
-        self.language.load_directory(lang_path)
+        self.language_cache.load(self.language, lang_path)
 
     def _setup(self):
         """
@@ -200,7 +292,7 @@ class FireflyIRC(IRCClient):
         # Load language files
         lang_dir = os.path.join(self.CONFIG_DIR, 'language')
         if os.path.isdir(lang_dir):
-            self.language.load_directory(lang_dir)
+            self.language_cache.load(self.language, lang_dir)
 
         # Make sure our configuration and data directories exist
         if not os.path.isdir(self.CONFIG_DIR):
@@ -209,6 +301,26 @@ class FireflyIRC(IRCClient):
         if not os.path.isdir(self.DATA_DIR):
             os.makedirs(self.DATA_DIR, 0o755)
 
+    def start_capture(self, path):
+        """
+        Start recording raw inbound server lines to a capture file.
+
+        @type   path:   str
+        @param  path:   Path to the capture file.
+        """
+        from firefly.capture import TrafficRecorder
+
+        self.stop_capture()
+        self.recorder = TrafficRecorder(path, self.server.hostname)
+
+    def stop_capture(self):
+        """
+        Stop recording inbound server lines, if we are recording.
+        """
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+
     def _fire_event(self, event_name, has_reply=False, is_command=False, **kwargs):
         """
         Fire an IRC event.
@@ -225,7 +337,8 @@ class FireflyIRC(IRCClient):
         @param  kwargs:     Arbitrary event arguments
         """
         self._log.info('Firing event: %s', event_name)
-        events = self.registry.get_events(event_name)
+        self.host.active = self
+        events = self.registry.get_events(event_name, kwargs)
 
         for cls, func, params in events:
             # Commands ok?
@@ -269,6 +382,7 @@ class FireflyIRC(IRCClient):
         @param  message:    Command message container
         """
         self._log.info('Firing command: %s %s (%s)', plugin, name, str(cmd_args))
+        self.host.active = self
         cls, func, argparse, params = self.registry.get_command(plugin, name)
 
         # Make sure we have permission
@@ -301,8 +415,15 @@ class FireflyIRC(IRCClient):
                 self, message, message.source, message.destination if message.destination.is_channel else None
             )
 
-            func(argparse.parse_args(cmd_args), response)
-            response.send()
+            result = func(argparse.parse_args(cmd_args), response)
+
+            # Commands may return a Deferred to respond asynchronously
+            if isinstance(result, defer.Deferred):
+                result.addCallback(lambda __: response.send())
+                result.addErrback(self._log_failure, 'Exception raised while firing the command {p}.{n}'.format(
+                    p=plugin, n=name))
+            else:
+                response.send()
         except ArgumentParserError as e:
             self._log.info('Argument parser error: %s', e.message)
 
@@ -354,7 +475,7 @@ class FireflyIRC(IRCClient):
             user = user.nick
 
         self._log.debug('Delivering message to %s : %s', user, (message[:35] + '..') if len(message) > 35 else message)
-        IRCClient.msg(self, user, message.encode('utf-8'), length)
+        IRCClient.msg(self, self.charset.encode(user), self.charset.encode(message), length)
 
     def notice(self, user, message):
         """
@@ -379,7 +500,7 @@ class FireflyIRC(IRCClient):
                             repr(user), user.nick)
             user = user.nick
 
-        IRCClient.notice(self, user, message)
+        IRCClient.notice(self, self.charset.encode(user), self.charset.encode(message))
 
     def describe(self, channel, action):
         """
@@ -401,7 +522,7 @@ class FireflyIRC(IRCClient):
                             repr(channel), channel.nick)
             channel = channel.nick
 
-        IRCClient.describe(self, channel, action)
+        IRCClient.describe(self, self.charset.encode(channel), self.charset.encode(action))
 
     ################################
     # High-level IRC Events        #
@@ -515,7 +636,6 @@ class FireflyIRC(IRCClient):
         destination = Destination(self, channel)
         message     = Message(message, destination, hostmask)
         is_command  = False
-        has_reply   = False
         reply_dest  = destination
         groups = set()
 
@@ -538,26 +658,53 @@ class FireflyIRC(IRCClient):
             reply_dest = hostmask
 
         # Have we been mentioned in this message?
-        nicks = self.server.identity.nicks
-        try:
-            nick, raw_message, match = message.get_mentions(nicks)
+        mention = message.get_mention(self.server.identity.nicks)
+        if mention:
+            nick, raw_message, match = mention
             groups.add(None)
-        except TypeError:
-            self._log.debug('Message has no mentions at the beginning')
+        else:
+            self._log.debug('Message has no mentions')
+            raw_message = message.stripped
+            if message.destination.is_channel:
+                groups.add('public')
+
+        # Do we have a language response? Pooled language engines reply asynchronously
+        reply = self.language.get_reply(raw_message, self.language_client(hostmask), groups)
+        if isinstance(reply, defer.Deferred):
+            reply.addCallback(self._language_reply, message, reply_dest, is_command)
+            reply.addErrback(self._log_failure, 'Exception raised while handling a language reply')
+            return
 
-            try:
-                nick, raw_message, match = message.get_mentions(nicks, message.MENTION_END)
-                groups.add(None)
-            except TypeError:
-                self._log.debug('Message has no mentions at the end')
-                nick = self.nickname
-                raw_message = message.stripped
-                match = False
-                if message.destination.is_channel:
-                    groups.add('public')
-
-        # Do we have a language response?
-        reply = self.language.get_reply(raw_message, groups=groups)
+        self._language_reply(reply, message, reply_dest, is_command)
+
+    def language_client(self, hostmask):
+        """
+        Get the language engine client a user's conversation state is kept under.
+
+        Language engines may be shared between servers, so the server hostname is included to keep users with the
+        same hostmask on different networks apart.
+
+        @type   hostmask:   Hostmask
+        @rtype: C{str}
+        """
+        return u'{server}/{hostmask}'.format(server=self.server.hostname, hostmask=hostmask.hostmask)
+
+    def _language_reply(self, reply, message, reply_dest, is_command):
+        """
+        Send a language reply to a message, then fire the message events.
+
+        @type   reply:      C{str} or None
+        @param  reply:      The language response, if any.
+
+        @type   message:    firefly.containers.Message
+
+        @type   reply_dest: Destination or Hostmask
+        @param  reply_dest: Where to send the reply.
+
+        @type   is_command: bool
+        @param  is_command: Indicates that the message was a command
+        """
+        has_reply = False
         if reply:
             self._log.debug('Reply matched: %s', reply)
             has_reply = True
@@ -573,6 +720,15 @@ class FireflyIRC(IRCClient):
         elif message.destination.is_user:
             self.privateMessage(message, has_reply, is_command)
 
+    def _log_failure(self, failure, message):
+        """
+        Log a failed Deferred.
+
+        @type   failure:    twisted.python.failure.Failure
+        @type   message:    C{str}
+        """
+        self._log.error('%s: %s', message, failure.getTraceback())
+
     def joined(self, channel):
         """
         Called when I finish joining a channel.
@@ -659,6 +815,21 @@ class FireflyIRC(IRCClient):
         """
         self._fire_event(irc.on_pong, user=Hostmask(user), secs=secs)
 
+    def connectionMade(self):
+        """
+        Called when we connect to the server. Our factory reuses this connection when it reconnects, so it's attached
+        to our plugin host again if it was detached when the last connection was lost.
+        """
+        IRCClient.connectionMade(self)
+        self.host.attach(self)
+
+    def connectionLost(self, reason):
+        """
+        Called when the connection to the server is lost.
+        """
+        IRCClient.connectionLost(self, reason)
+        self.host.detach(self)
+
     def signedOn(self):
         """
         Called after successfully signing on to the server.
@@ -897,6 +1068,37 @@ class FireflyIRC(IRCClient):
     # Low-level IRC Events         #
     ################################
 
+    def lineReceived(self, line):
+        """
+        Called for every raw line received from the server.
+
+        @type   line:   C{str}
+        """
+        if self.recorder:
+            self.recorder.record(line)
+
+        # Message tags are always UTF-8, so they're split off before decoding the rest of the line
+        self.tags, line = parse_tags(line)
+        line = self.charset.decode(line)
+
+        try:
+            if 'account' in self.tags:
+                prefix = self.charset.source(line)
+                if prefix:
+                    self._account_changed(prefix, self.tags['account'])
+
+            IRCClient.lineReceived(self, line)
+        finally:
+            self.tags = {}
+
+    def sendLine(self, line):
+        """
+        Send a raw line to the server, encoding it if needed.
+
+        @type   line:   C{unicode} or C{str}
+        """
+        IRCClient.sendLine(self, self.charset.encode(line))
+
     def irc_ERR_NICKNAMEINUSE(self, prefix, params):
         """
         Called when we try to register or change to a nickname that is already
@@ -933,8 +1135,71 @@ class FireflyIRC(IRCClient):
         IRCClient.irc_RPL_WELCOME(self, prefix, params)
         self._fire_event(irc.on_server_welcome, prefix=prefix, params=params)
 
+    def register(self, nickname, hostname='foo', servername='bar'):
+        """
+        Register with the server, negotiating IRCv3 capabilities first.
+        """
+        if self.capabilities.wanted:
+            self.sendLine(self.capabilities.start())
+
+        IRCClient.register(self, nickname, hostname, servername)
+
+    def irc_CAP(self, prefix, params):
+        """
+        Called when the server responds to capability negotiation.
+        """
+        if len(params) < 2:
+            return
+
+        for line in self.capabilities.handle(params[1], params[2:]):
+            self.sendLine(line)
+
+    def irc_JOIN(self, prefix, params):
+        """
+        Called when a user joins a channel. With extended-join, the users services account is included.
+        """
+        if 'extended-join' in self.capabilities and len(params) >= 3:
+            self._account_changed(prefix, params[1])
+            params = params[:1]
+
+        IRCClient.irc_JOIN(self, prefix, params)
+
+    def irc_ACCOUNT(self, prefix, params):
+        """
+        Called when a user logs in to or out of their services account (account-notify).
+        """
+        if params:
+            self._account_changed(prefix, params[0])
+
+    def irc_QUIT(self, prefix, params):
+        """
+        Called when a user has quit. Their services account can no longer vouch for their host.
+        """
+        if self.auth.trust_services:
+            self.auth.services_logout(Hostmask(prefix))
+
+        IRCClient.irc_QUIT(self, prefix, params)
+
+    def _account_changed(self, prefix, account):
+        """
+        Called whenever the server tells us which services account a user is logged in to.
+
+        @type   prefix:     C{str}
+        @param  prefix:     Hostmask of the user.
+
+        @type   account:    C{str}
+        @param  account:    The services account, or * if the user is not logged in.
+        """
+        if not self.auth.trust_services or '!' not in prefix:
+            return
+
+        if account == '*':
+            self.auth.services_logout(Hostmask(prefix))
+        else:
+            self.auth.services_login(Hostmask(prefix), account)
+
     def irc_unknown(self, prefix, command, params):
-        self._log.debug('Unknown IRC event: ({pr} {c} {pa})'.format(pr=str(prefix), c=str(command), pa=str(params)))
+        self._log.debug('Unknown IRC event: (%s %s %s)', prefix, command, params)
         self._fire_event(irc.on_unknown, prefix=prefix, command=command, params=params)
 
     def ctcpQuery(self, user, channel, messages):
@@ -990,27 +1255,45 @@ class PluginAbstract(object):
     # This is the base directory for all plugin language files
     FIREFLY_IRC_PLUGIN_LANG_BASEDIR = 'lang'
 
-    # When True, the plugin class will be instantiated on demand instead of immediately on startup.
-    FIREFLY_IRC_LAZY_LOAD = False  # TODO: Currently has no effect
+    # When True, the plugin class will be instantiated on demand instead of immediately on startup. Commands and
+    # events are still registered at startup, but the plugin (along with its configuration and language files) is
+    # only loaded the first time one of them is called.
+    FIREFLY_IRC_LAZY_LOAD = False
 
     FIREFLY_STRICT = False
 
-    def __init__(self, firefly):
+    def __init__(self, host):
         """
-        @type   firefly:    firefly.FireflyIRC
+        @type   host:   firefly.PluginHost
         """
         self.name = self.FIREFLY_IRC_PLUGIN_NAME or type(self).__name__.lower()
         self._log = logging.getLogger('firefly.plugins.{0}'.format(self.name))
-        self.firefly = firefly
+        self.host = host
 
         class_path = sys.modules.get(self.__class__.__module__).__file__
         self.plugin_path = os.path.dirname(os.path.realpath(class_path))
 
         self.config = NotImplemented
         """@type: ConfigParser"""
+        self._server_configs = {}
         self._load_configuration()
+        self._subscribe_configuration()
         self._load_language()
 
+    @property
+    def firefly(self):
+        """
+        The server connection currently being handled.
+
+        Deprecated: plugin instances are shared by every server connection, so use the connection a request came from
+        (response.firefly) or every attached connection (self.host.connections) instead.
+
+        @rtype: FireflyIRC or None
+        """
+        warnings.warn('PluginAbstract.firefly is deprecated, use response.firefly instead', DeprecationWarning,
+                      stacklevel=2)
+        return self.host.current_connection
+
     # noinspection PyUnresolvedReferences
     def _load_configuration(self):
         """
@@ -1020,6 +1303,7 @@ class PluginAbstract(object):
         """
         if not self.FIREFLY_IRC_PLUGIN_CONFIG:
             self._log.info('Plugin configuration has been explicitly disabled')
+            return
 
         basedir = self.FIREFLY_IRC_PLUGIN_CONFIG_BASEDIR
         default = self.FIREFLY_IRC_PLUGIN_CONFIG_DEFAULT
@@ -1069,17 +1353,216 @@ class PluginAbstract(object):
 
             self._log.debug('Loaded plugin configuration file %s.cfg', name)
 
-    def _load_language(self):
+    def _subscribe_configuration(self):
+        """
+        Subscribe to changes in our configuration files.
+        """
+        configs = self.config.values() if isinstance(self.config, dict) else [self.config]
+        for config in configs:
+            if isinstance(config, ConfigParser):
+                FireflyIRC.config_cache.subscribe(config, self.reload_configuration)
+
+    @property
+    def data_path(self):
+        """
+        Directory the plugin can store its data (e.g. caches) in. Created on first access.
+
+        @rtype: str
+        """
+        path = os.path.join(FireflyIRC.DATA_DIR, 'plugins', self.name)
+        if not os.path.isdir(path):
+            os.makedirs(path, 0o755)
+
+        return path
+
+    def unload(self):
+        """
+        Called when the plugin is unloaded or about to be replaced by a reloaded instance. Plugins holding open files,
+        timers or other resources should override this to release them.
+        """
+        self._log.info('Unloading plugin')
+        FireflyIRC.config_cache.unsubscribe(self.reload_configuration)
+
+    def reload_configuration(self, config):
+        """
+        Called after one of our configuration files has changed on disk and been reloaded.
+
+        The reloaded values are already visible through self.config. Plugins that copy configuration values into
+        attributes when they are instantiated should override this method to refresh them.
+
+        @type   config: ConfigParser
+        @param  config: The reloaded configuration instance.
+        """
+        self._log.info('Plugin configuration reloaded')
+        self._server_configs = {}
+
+    def _load_language(self, firefly_irc=None):
         """
         Load plugin language files.
 
+        @type   firefly_irc:    FireflyIRC or None
+        @param  firefly_irc:    Connection to load the language files into. If None, loads them into every connection
+                                attached to the plugin host.
+
         @raise  ValueError: Re-raised if strict mode is enabled and a configuration file can not be loaded
         """
         if not self.FIREFLY_IRC_PLUGIN_LANG_BASEDIR:
             self._log.info('Plugin language has been explicitly disabled')
 
         basedir = self.FIREFLY_IRC_PLUGIN_LANG_BASEDIR
-        self.firefly.load_language_files(self, basedir)
+
+        if firefly_irc:
+            firefly_irc.load_language_files(self, basedir)
+            return
+
+        # Language engines can not unload files, so a reloaded plugin keeps the language files loaded the first time
+        if self.name in self.host.languages_loaded:
+            self._log.debug('Plugin language files have already been loaded')
+            return
+
+        self.host.languages_loaded.add(self.name)
+        for connection in self.host.connections:
+            connection.load_language_files(self, basedir)
+
+    def server_config(self, server):
+        """
+        Get the plugin configuration for a specific server.
+
+        Plugin instances are shared between every server connection, so per-server settings are read from override
+        files in the users plugin configuration directory, which are layered on top of the plugins own configuration:
+            config/plugins/<plugin>/servers/<hostname>.cfg      (single configuration file plugins)
+            config/plugins/<plugin>/servers/<hostname>/<name>.cfg  (plugins with multiple configuration files)
+
+        If no override file exists, the plugins own configuration is returned.
+
+        @type   server: firefly.containers.Server
+
+        @rtype: ConfigParser or dict of (str: ConfigParser)
+        """
+        if server.hostname in self._server_configs:
+            return self._server_configs[server.hostname]
+
+        path = os.path.join(FireflyIRC.CONFIG_DIR, 'config', 'plugins', self.name, 'servers')
+
+        if isinstance(self.config, ConfigParser):
+            config = self._layer_configuration(self.config, os.path.join(path, '{h}.cfg'.format(h=server.hostname)))
+        elif isinstance(self.config, dict):
+            config = {}
+            for name, base in self.config.iteritems():
+                config[name] = self._layer_configuration(base, os.path.join(path, server.hostname, name + '.cfg'))
+        else:
+            config = self.config
+
+        self._server_configs[server.hostname] = config
+        return config
+
+    def _layer_configuration(self, base, path):
+        """
+        Layer a configuration override file on top of a copy of the base configuration.
+
+        @type   base:   ConfigParser
+        @type   path:   str
+
+        @rtype: ConfigParser
+        """
+        if not os.path.isfile(path):
+            return base
+
+        self._log.info('Loading server configuration override: %s', path)
+        config = copy.deepcopy(base)
+        config.read(path)
+        return config
+
+
+class PluginHost(object):
+    """
+    Process-wide plugin host.
+
+    Plugins are scanned for and instantiated once per host, no matter how many server connections are attached to it.
+    Every attached connection shares the same registry and plugin instances; the originating connection is passed to
+    plugins through the Response container (response.firefly).
+    """
+    def __init__(self, language_cache=None):
+        """
+        @type   language_cache: LanguageCache or None
+        @param  language_cache: Compiled language data cache. Defaults to a cache in the language directory under
+                                FireflyIRC.DATA_DIR.
+        """
+        self._log = logging.getLogger('firefly.host')
+        self.registry = _Registry(self)
+        self.language_cache = language_cache or LanguageCache(os.path.join(FireflyIRC.DATA_DIR, 'language'))
+        self.connections = []
+        """@type: list of FireflyIRC"""
+        self.active = None
+        """@type: FireflyIRC or None"""
+        self._populated = weakref.WeakSet()
+        self.languages_loaded = set()
+        self.languages = {}
+        """@type: dict of (tuple: firefly.languages.interface.LanguageInterface)"""
+        self._scanned = False
+
+    @property
+    def current_connection(self):
+        """
+        The connection whose command or event is being handled, or the first attached connection if there isn't one.
+        @rtype: FireflyIRC or None
+        """
+        if self.active in self.connections:
+            return self.active
+
+        return self.connections[0] if self.connections else None
+
+    def attach(self, firefly_irc):
+        """
+        Attach a server connection to the host, loading our plugins if this is the first connection. Connections that
+        are already attached are ignored.
+
+        @type   firefly_irc:    FireflyIRC
+        """
+        if firefly_irc in self.connections:
+            return
+
+        self._log.info('Attaching connection to %s', firefly_irc.server.hostname)
+        self.connections.append(firefly_irc)
+
+        # Language engines can not unload files, so a reattached connection already has our plugins' files loaded
+        populated = firefly_irc in self._populated
+        self._populated.add(firefly_irc)
+
+        if not self._scanned:
+            self._scanned = True
+            self.scan(plugins)
+            return
+
+        if populated:
+            return
+
+        # Our plugins are already loaded, but the new connection has its own language engine to populate
+        for plugin_obj in self.registry.plugins.values():
+            plugin_obj._load_language(firefly_irc)
+
+    def scan(self, package):
+        """
+        Scan a package or module for plugin commands and events and bind them to our registry.
+
+        @type   package:    module
+        """
+        import venusian
+        scanner = venusian.Scanner(host=self)
+        scanner.scan(package)
+
+    def detach(self, firefly_irc):
+        """
+        Detach a server connection from the host.
+
+        @type   firefly_irc:    FireflyIRC
+        """
+        if firefly_irc in self.connections:
+            self._log.info('Detaching connection to %s', firefly_irc.server.hostname)
+            self.connections.remove(firefly_irc)
+
+        if self.active is firefly_irc:
+            self.active = None
 
 
 # noinspection PyMethodMayBeStatic
@@ -1089,12 +1572,18 @@ class _Registry(object):
 
     This class is used to contain bindings to plugin classes as well as command and event functions.
     """
-    def __init__(self, firefly):
-        self.firefly = firefly
+    def __init__(self, host):
+        """
+        @type   host:   PluginHost
+        """
+        self.host = host
 
         self._commands = {}
         self._events = {}
         self._plugins = {}
+        self._lazy_plugins = {}
+        self._modules = {}
+        self._matchers = {}
         self._log = logging.getLogger('firefly.registry')
 
     def _get_plugin(self, cls):
@@ -1104,7 +1593,9 @@ class _Registry(object):
         @param  cls:    The plugin class.
 
         @raise  PluginError:    Raised if the plugin class is not a sub-class of PluginAbstract.
-        @rtype: C{tuple of (str, object)}
+        @rtype:     C{tuple of (str, object or None)}
+        @return:    The plugin name and instance. The instance is None if the plugin is lazy loaded and has not been
+                    instantiated yet.
         """
         # Make sure we have a valid plugin class
         if not issubclass(cls, PluginAbstract):
@@ -1112,15 +1603,52 @@ class _Registry(object):
 
         name = cls.FIREFLY_IRC_PLUGIN_NAME or cls.__name__
         name = name.lower().strip()
+        self._modules[name] = cls.__module__
 
         if name in self._plugins:
             self._log.debug('Returning already instantiated %s plugin instance', name)
+        elif cls.FIREFLY_IRC_LAZY_LOAD:
+            self._log.debug('Deferring instantiation of the lazy loaded %s plugin', name)
+            self._lazy_plugins[name] = cls
+            return name, None
         else:
             self._log.debug('Instantiating new %s plugin instance', name)
-            self._plugins[name] = cls(self.firefly)
+            self._plugins[name] = cls(self.host)
 
         return name, self._plugins[name]
 
+    def _load_plugin(self, name):
+        """
+        Instantiate a lazy loaded plugin and attach the instance to its bound events.
+
+        @type   name:   str
+        @param  name:   Name of the plugin.
+
+        @rtype: PluginAbstract
+        """
+        if name in self._plugins:
+            return self._plugins[name]
+
+        self._log.info('Instantiating lazy loaded %s plugin instance', name)
+        plugin_obj = self._lazy_plugins.pop(name)(self.host)
+        self._plugins[name] = plugin_obj
+
+        for event_name, events in self._events.get(name, {}).iteritems():
+            self._events[name][event_name] = [(plugin_obj, func, params) for __, func, params in events]
+
+        return plugin_obj
+
+    def _build_command(self, name, plugin_obj, func, params):
+        """
+        Set up the ArgumentParser for a command and retrieve the decorated plugin function.
+
+        @rtype: tuple of (object, function, ArgumentParser, dict)
+        """
+        ap = ArgumentParser(name)
+        dec_func = func(plugin_obj, ap)
+
+        return plugin_obj, dec_func, ap, params
+
     def bind_command(self, name, cls, func, params):
         """
         Bind a command to the registry.
@@ -1149,16 +1677,15 @@ class _Registry(object):
         # Make sure this plugin has not already been mapped
         if name in self._commands[plugin_name]:
             raise PluginCommandExistsError('%s has already been bound by %s', name,
-                                           str(self._commands[plugin_name][name][0]))
+                                           str(self._commands[plugin_name][name][0] or cls))
 
-        # Set up an ArgumentParser for this command
-        ap = ArgumentParser(name)
-
-        # Get our decorated plugin function
-        dec_func = func(plugin_obj, ap)
+        # Lazy loaded plugins build their commands the first time they are called
+        if plugin_obj is None:
+            self._commands[plugin_name][name] = (None, func, None, params)
+            return
 
         # Map the command
-        self._commands[plugin_name][name] = (plugin_obj, dec_func, ap, params)
+        self._commands[plugin_name][name] = self._build_command(name, plugin_obj, func, params)
 
     def get_command(self, plugin, name):
         """
@@ -1181,11 +1708,18 @@ class _Registry(object):
         if plugin not in self._commands:
             self._log.info('Attempted to retrieve a command from a non-existent plugin: %s', plugin)
             print(str(self._commands))
-            raise NoSuchPluginError('Requested plugin {p} does not exist'.format(p=plugin))
+            raise NoSuchPluginError(u'Requested plugin {p} does not exist'.format(p=plugin))
 
         if name not in self._commands[plugin]:
             self._log.info('Attempted to retrieve a non-existent command from the %s plugin: %s', plugin, name)
-            raise NoSuchCommandError('Requested command {c} does not exist for the {p} plugin'.format(c=name, p=plugin))
+            raise NoSuchCommandError(u'Requested command {c} does not exist for the {p} plugin'
+                                     .format(c=name, p=plugin))
+
+        # Is this the first call to a lazy loaded command?
+        plugin_obj, func, ap, params = self._commands[plugin][name]
+        if plugin_obj is None:
+            self._log.debug('Building lazy loaded command %s for the %s plugin', name, plugin)
+            self._commands[plugin][name] = self._build_command(name, self._load_plugin(plugin), func, params)
 
         return self._commands[plugin][name]
 
@@ -1218,36 +1752,159 @@ class _Registry(object):
             self._log.debug('Creating new entry for event: %s', name)
             self._events[plugin_name][name] = []
 
-        # Map the command
+        # Map the command. Lazy loaded plugins are mapped without an instance until they are first needed.
         self._events[plugin_name][name].append((plugin_obj, func, params))
+        self._matchers.pop(name, None)
 
-    def get_events(self, name):
+    def get_events(self, name, kwargs=None):
         """
         Get all bound events.
 
         @type   name:   C{str}
         @param  name:   Name of the event to retrieve bindings for.
 
+        @type   kwargs: C{dict} or C{None}
+        @param  kwargs: The event arguments. If supplied, only events whose filters match them are returned.
+
         @rtype: C{list}
         """
         self._log.debug('Retrieving events: %s', name)
+        matcher = self._matchers.get(name)
+        if matcher is None:
+            matcher = self._matchers[name] = self._build_matcher(name)
+
+        handlers = matcher.match(kwargs) if kwargs is not None else [handler for handler, __ in matcher.bindings]
         all_events = []
 
-        # Iterate our plugins and search for matching events
+        for plugin, index in handlers:
+            # Lazy loaded plugins are instantiated the first time one of their events fires
+            if plugin in self._lazy_plugins:
+                self._load_plugin(plugin)
+
+            all_events.append(self._events[plugin][name][index])
+
+        self._log.debug('%d events matched', len(all_events))
+        return all_events
+
+    def _build_matcher(self, name):
+        """
+        Compile the filters of every event bound to a name.
+
+        @type   name:   C{str}
+        @rtype: EventMatcher
+        """
+        bindings = []
         for plugin, events in self._events.iteritems():
-            self._log.debug('Searching plugin %s...', plugin)
+            for index, (__, __, params) in enumerate(events.get(name, [])):
+                bindings.append(((plugin, index), params.get('filter')))
 
-            # Does this plugin have events we want?
-            if name not in events:
-                self._log.debug('No events found in the %s plugin', plugin)
-                continue
+        self._log.debug('Compiled %d filters for %d %s events', sum(1 for __, f in bindings if f), len(bindings), name)
+        return EventMatcher(bindings)
 
-            # Append our events and continue
-            self._log.debug('%d events matched', len(events[name]))
-            all_events += events[name]
+    def get_plugin(self, name):
+        """
+        Get a plugin instance, instantiating it first if it is lazy loaded.
 
-        return all_events
+        @type   name:   str
+        @param  name:   Name of the plugin.
+
+        @rtype: PluginAbstract
+
+        @raise  NoSuchPluginError:  Raised if the requested plugin does not exist.
+        """
+        name = name.lower().strip()
+
+        if name in self._plugins:
+            return self._plugins[name]
+
+        if name in self._lazy_plugins:
+            return self._load_plugin(name)
+
+        raise NoSuchPluginError(u'Requested plugin {p} does not exist'.format(p=name))
+
+    def unbind_plugin(self, name):
+        """
+        Unbind all commands and events of a plugin and unload its instance.
+
+        @type   name:   str
+        @param  name:   Name of the plugin.
+
+        @raise  NoSuchPluginError:  Raised if the requested plugin does not exist.
+        """
+        name = name.lower().strip()
+        if name not in self._commands and name not in self._events and name not in self._lazy_plugins:
+            raise NoSuchPluginError(u'Requested plugin {p} does not exist'.format(p=name))
+
+        self._log.info('Unbinding the %s plugin', name)
+        self._commands.pop(name, None)
+        self._events.pop(name, None)
+        self._matchers.clear()
+        self._lazy_plugins.pop(name, None)
+
+        plugin_obj = self._plugins.pop(name, None)
+        if plugin_obj:
+            plugin_obj.unload()
+
+    def reload_plugin(self, name):
+        """
+        Re-import a plugins module (and any of its sub-modules) and bind the reloaded plugin in place of the old one.
+        Server connections are left untouched. Unloaded plugins can be reloaded as well.
+
+        @type   name:   str
+        @param  name:   Name of the plugin.
+
+        @raise  NoSuchPluginError:  Raised if the requested plugin has never been loaded.
+        @raise  PluginError:        Raised if the plugin module could not be re-imported or its plugin could not be
+                                    bound. The existing plugin is left bound when this happens.
+        """
+        name = name.lower().strip()
+        if name not in self._modules:
+            raise NoSuchPluginError(u'Requested plugin {p} does not exist'.format(p=name))
+
+        module_name = self._modules[name]
+        self._log.info('Reloading the %s plugin from %s', name, module_name)
+
+        # Reload sub-modules before the module itself, so it picks up their new definitions when it imports them
+        prefix = module_name + '.'
+        submodules = sorted((m for m in sys.modules if m.startswith(prefix) and sys.modules[m]), reverse=True)
+        try:
+            for submodule in submodules:
+                reload(sys.modules[submodule])
+            module = reload(sys.modules[module_name])
+        except Exception as e:
+            self._log.exception('Failed to reload the %s plugin module', name)
+            raise PluginError('Unable to reload {m}: {e}'.format(m=module_name, e=e))
+
+        # Set the existing bindings aside rather than unbinding them, so they can be restored if binding fails
+        self._log.info('Unbinding the %s plugin', name)
+        bindings = (self._commands, self._events, self._plugins, self._lazy_plugins)
+        previous = [binding.pop(name, None) for binding in bindings]
+        self._matchers.clear()
+
+        try:
+            self.host.scan(module)
+        except Exception as e:
+            self._log.exception('Failed to bind the reloaded %s plugin, restoring the existing plugin', name)
+            plugin_obj = self._plugins.get(name)
+            if plugin_obj and plugin_obj is not previous[2]:
+                plugin_obj.unload()
+
+            for binding, entry in zip(bindings, previous):
+                binding.pop(name, None)
+                if entry is not None:
+                    binding[name] = entry
+
+            self._matchers.clear()
+            raise PluginError('Unable to bind {m}: {e}'.format(m=module_name, e=e))
+
+        if previous[2]:
+            previous[2].unload()
 
     @property
     def plugins(self):
+        """
+        Instantiated plugins. Lazy loaded plugins are not included until they have been loaded, use get_plugin to
+        retrieve a plugin regardless of its load state.
+        @rtype: dict of (str: PluginAbstract)
+        """
         return self._plugins
@@ -1,22 +1,196 @@
+import json
 import logging
+import os
+import re
+import time
+from datetime import timedelta
 
-import arrow
-from passlib.hash import bcrypt
+from twisted.internet import defer
 
-from firefly.errors import AuthError, AuthAlreadyLoggedInError, AuthNoSuchUserError, AuthBadLoginError
+from firefly.cache import LRUCache
+from firefly.clock import monotonic, TimerWheel
+from firefly.files import atomic_write
+from firefly.errors import AuthError, AuthAlreadyLoggedInError, AuthNoSuchUserError, AuthBadLoginError, \
+    AuthBusyError, AuthThrottledError
+from firefly.users import User, open_store
+
+
+class PasswordVerifier(object):
+    """
+    Verifies bcrypt password hashes in a small thread pool, so slow hashing never blocks the reactor.
+
+    The number of verifications queued or running at once is bounded; further attempts are rejected immediately rather
+    than queued, so a login flood can't build up an unbounded backlog.
+    """
+    def __init__(self, threads=2, max_pending=8):
+        """
+        @type   threads:        int
+        @param  threads:        Maximum number of worker threads.
+
+        @type   max_pending:    int
+        @param  max_pending:    Maximum number of verifications queued or running at once.
+        """
+        self._log = logging.getLogger('firefly.auth.verifier')
+        self.threads = threads
+        self.max_pending = max_pending
+        self.pending = 0
+        self._pool = None
+
+    def verify(self, password, pass_hash):
+        """
+        @type   password:   str
+        @type   pass_hash:  str
+
+        @rtype:     twisted.internet.defer.Deferred
+        @return:    Fires with True if the password matches the hash. Fails with AuthBusyError if too many
+                    verifications are already pending, or ValueError if the hash is invalid.
+        """
+        if self.pending >= self.max_pending:
+            self._log.warn('%d password verifications are already pending, rejecting login attempt', self.pending)
+            return defer.fail(AuthBusyError())
+
+        from twisted.internet import reactor, threads
+        if not self._pool:
+            self._start(reactor)
+
+        self.pending += 1
+        d = threads.deferToThreadPool(reactor, self._pool, self._verify, password, pass_hash)
+        d.addBoth(self._finished)
+        return d
+
+    @staticmethod
+    def _verify(password, pass_hash):
+        """
+        @rtype: bool
+        """
+        from passlib.hash import bcrypt
+        return bcrypt.verify(password, pass_hash)
+
+    def _finished(self, result):
+        self.pending -= 1
+        return result
+
+    def _start(self, reactor):
+        from twisted.python.threadpool import ThreadPool
+
+        self._pool = ThreadPool(0, self.threads, 'firefly-auth')
+        self._pool.start()
+        reactor.addSystemEventTrigger('during', 'shutdown', self.stop)
+
+    def stop(self):
+        """
+        Stop our worker threads.
+        """
+        if self._pool:
+            self._pool.stop()
+            self._pool = None
+
+
+class LoginThrottle(object):
+    """
+    Exponential backoff for failed logins.
+
+    Every consecutive failure for a key doubles how long the key is blocked for, starting at base_delay and capped at
+    max_delay. Failures are forgotten after a successful login, or once the key has been idle for forget_after seconds.
+    """
+    def __init__(self, base_delay=1.0, max_delay=15 * 60, forget_after=60 * 60, max_keys=10000, clock=time.time):
+        """
+        @type   base_delay:     float
+        @type   max_delay:      float
+        @type   forget_after:   float
+
+        @type   max_keys:       int
+        @param  max_keys:       Maximum number of keys to track failures for.
+
+        @type   clock:          callable
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._clock = clock
+        self._failures = LRUCache(max_keys, forget_after, clock=clock)
+        """@type: LRUCache of (tuple: tuple of (int, float))"""
+
+    def retry_after(self, *keys):
+        """
+        @rtype:     float
+        @return:    Seconds until every key will accept another attempt. 0 if they all accept attempts now.
+        """
+        now = self._clock()
+        blocked_until = max([self._failures.get(key, (0, now))[1] for key in keys] or [now])
+        return max(blocked_until - now, 0)
+
+    def failed(self, *keys):
+        """
+        Record a failed attempt for each key.
+        """
+        now = self._clock()
+        for key in keys:
+            failures = self._failures.get(key, (0, now))[0] + 1
+            delay = min(self.base_delay * 2 ** (failures - 1), self.max_delay)
+            self._failures.set(key, (failures, now + delay))
+
+    def succeeded(self, *keys):
+        """
+        Forget the failed attempts of each key.
+        """
+        for key in keys:
+            self._failures.pop(key)
 
 
 class Auth(object):
 
+    SESSION_LIFETIME = {'hours': 36}
+    # How often, in seconds, expired sessions are swept
+    SWEEP_INTERVAL = 60
+    # Bump this whenever the layout of saved session files changes
+    SESSIONS_VERSION = 1
+
+    # Password hashes are verified in a thread pool shared by every connection
+    verifier = PasswordVerifier()
+
     def __init__(self, firefly):
         """
         @type   firefly:    firefly.FireflyIRC
         """
         self._log = logging.getLogger('firefly.auth')
-        self._users_config = firefly.load_configuration('users')
+        self.users = open_store()
+
+        # Trust services accounts reported by the server (IRCv3 account tracking)
+        config = firefly.load_configuration('auth')
+        self.trust_services = config.has_section('Services') and config.getboolean('Services', 'TrustAccounts')
 
         self.firefly = firefly
         self._sessions = {}
+        self.throttle = LoginThrottle()
+
+        # Sessions are expired by a sweeper running while any sessions exist, so hosts that never return don't linger
+        self.expiry = TimerWheel(self.SWEEP_INTERVAL, 256, self._expired)
+        self._sweeper = None
+
+        # Where sessions are saved to, once persist() has been called
+        self.path = None
+
+        # Pick up account changes (e.g. from firefly config useradd) without restarting
+        self.users.subscribe(self.reload_users)
+
+    def reload_users(self, users):
+        """
+        Refresh logged in users after accounts have changed. Sessions belonging to accounts that no longer exist are
+        terminated.
+
+        @type   users:  firefly.users.UserStore
+        @param  users:  The changed user store.
+        """
+        for host, session in self._sessions.items():
+            email = session.user.email
+            user = users.get(email)
+
+            if not user:
+                self._log.info('The account %s no longer exists, terminating the auth session for %s', email, host)
+                self._end(host)
+                continue
+
+            session.user = user
 
     def check(self, hostmask):
         """
@@ -32,59 +206,144 @@ class Auth(object):
             return False
 
         # If it does, make sure it's active
-        if self._sessions[hostmask.host].active:
+        session = self._sessions[hostmask.host]
+        if session.active:
             self._log.info('The auth session for %s is active', hostmask.host)
-            return self._sessions[hostmask.host].user
+            if session.expires is not False:
+                self.expiry.schedule(hostmask.host, session.expires)
+            return session.user
 
         # If it's not active, remove it and return false
         self._log.info('The auth session for %s has expired', hostmask.host)
-        del self._sessions[hostmask.host]
+        self._end(hostmask.host)
         return False
 
     def attempt(self, hostmask, email, password):
         """
         Attempt to authenticate the specified hostmask.
 
+        Failed attempts throttle further attempts from the same host and for the same account, with exponential
+        backoff.
+
         @type   hostmask:   firefly.containers.Hostmask
         @param  hostmask:   The hostmask that is authenticating.
 
         @type   email:      str
-        @param  email:      The account e-mail/username.
+        @param  email:      The account e-mail/username, or the nick of the account.
 
         @type   password:   str
 
-        @raise  AuthAlreadyLoggedInError:   Raised if the specified hostmask is already logged into an account.
-        @raise  AuthNoSuchUserError:        Raised if no account for the specified e-mail exists.
-        @raise  AuthBadLoginError:          Raised if the account exists, but the supplied password was invalid.
-        @raise  AuthError:                  Raised if a configuration error occurred.
+        @rtype:     twisted.internet.defer.Deferred
+        @return:    Fires with the logged in User, or fails with one of the following errors:
+                    AuthAlreadyLoggedInError if the specified hostmask is already logged into an account.
+                    AuthThrottledError if there have been too many failed attempts from the host or for the account.
+                    AuthBusyError if too many login attempts are already being processed.
+                    AuthNoSuchUserError if no account for the specified e-mail exists.
+                    AuthBadLoginError if the account exists, but the supplied password was invalid.
+                    AuthError if a configuration error occurred.
         """
         self._log.info('Attempting to authenticate %s as %s', hostmask.nick, email)
 
         # Make sure we're not already logged in
         if self.check(hostmask):
             self._log.info('%s is already logged into an account', hostmask.nick)
-            raise AuthAlreadyLoggedInError(self._sessions[hostmask.host])
+            return defer.fail(AuthAlreadyLoggedInError(self._sessions[hostmask.host]))
+
+        user = self.users.get(email) or self.users.find(email)
+        host_key = ('host', hostmask.host)
+        keys = (host_key, ('account', user.email)) if user else (host_key,)
+
+        # Make sure we haven't had too many failed attempts
+        retry_after = self.throttle.retry_after(*keys)
+        if retry_after:
+            self._log.info('Throttling login attempt from %s as %s for %.0f seconds', hostmask.host, email, retry_after)
+            return defer.fail(AuthThrottledError(retry_after))
 
         # Make sure we actually have an account
-        if email not in self._users_config.sections():
-            self._log.info('No account under the e-mail address %s exists', email)
-            raise AuthNoSuchUserError(email)
+        if not user:
+            self._log.info('No account under the e-mail address or nick %s exists', email)
+            self.throttle.failed(host_key)
+            return defer.fail(AuthNoSuchUserError(email))
 
         # Check our password
-        pass_hash = self._users_config.get(email, 'Password')
-        try:
-            valid_login = bcrypt.verify(password, pass_hash)
-        except ValueError:
-            self._log.error('User %s has an invalid password hash', email)
-            raise AuthError('User {e} has an invalid password hash'.format(e=email))
+        d = self.verifier.verify(password, user.password or '')
+        d.addCallbacks(self._verified, self._verify_failed, (hostmask, user), errbackArgs=(user.email,))
+        return d
 
+    def _verified(self, valid_login, hostmask, user):
+        """
+        @type   valid_login:    bool
+        @type   hostmask:       firefly.containers.Hostmask
+        @type   user:           User
+
+        @rtype: User
+        """
+        keys = (('host', hostmask.host), ('account', user.email))
         if not valid_login:
-            self._log.info('Bad password provided for the account %s', email)
-            raise AuthBadLoginError(email)
+            self._log.info('Bad password provided for the account %s', user.email)
+            self.throttle.failed(*keys)
+            raise AuthBadLoginError(user.email)
 
         # If we're still here, we've successfully authenticated and we need to create a new login session
-        user = User(email, self._users_config)
-        self._sessions[hostmask.host] = AuthSession(user, hostmask, {'hours': +36})
+        self.throttle.succeeded(*keys)
+        self._start(AuthSession(user, hostmask, self.SESSION_LIFETIME))
+        return user
+
+    def _verify_failed(self, failure, email):
+        """
+        @type   failure:    twisted.python.failure.Failure
+        @type   email:      str
+        """
+        failure.trap(ValueError)
+        self._log.error('User %s has an invalid password hash', email)
+        raise AuthError('User {e} has an invalid password hash'.format(e=email))
+
+    def services_login(self, hostmask, account):
+        """
+        Log a host in to the account whose nick matches the services account the server says it's logged in to.
+
+        Sessions started by logging in with a password take precedence over services accounts.
+
+        @type   hostmask:   firefly.containers.Hostmask
+        @type   account:    str
+        @param  account:    The services account name.
+
+        @rtype:     User or None
+        @return:    The logged in User, or None if services accounts are not trusted or no account matches.
+        """
+        if not self.trust_services:
+            return None
+
+        session = self._sessions.get(hostmask.host)
+        if session and (session.account is None or session.account == account):
+            return session.user
+
+        user = self.users.find(account)
+        if not user:
+            self._log.debug('No account matches the services account %s', account)
+            if session:
+                self._end(hostmask.host)
+            return None
+
+        self._log.info('Logging %s in as %s via the services account %s', hostmask.nick, user.email, account)
+        self._start(AuthSession(user, hostmask, self.SESSION_LIFETIME, account=account))
+        return user
+
+    def services_logout(self, hostmask):
+        """
+        End the session of a host logged in via a services account. Sessions started with a password are kept.
+
+        @type   hostmask:   firefly.containers.Hostmask
+
+        @rtype: bool
+        """
+        session = self._sessions.get(hostmask.host)
+        if not session or session.account is None:
+            return False
+
+        self._log.info('%s logged out of the services account %s', hostmask.nick, session.account)
+        self._end(hostmask.host)
+        return True
 
     def logout(self, hostmask):
         """
@@ -99,17 +358,165 @@ class Auth(object):
         if hostmask.host not in self._sessions:
             return False
 
-        del self._sessions[hostmask.host]
+        self._end(hostmask.host)
         return True
 
+    def _start(self, session, save=True):
+        """
+        Start a new auth session.
+
+        @type   session:    AuthSession
+
+        @type   save:       bool
+        @param  save:       Save our sessions if they're persisted.
+        """
+        self._sessions[session.hostmask.host] = session
+        if save:
+            self.save()
+
+        if session.expires is False:
+            return
+
+        self.expiry.schedule(session.hostmask.host, session.expires)
+        if not self._sweeper:
+            from twisted.internet.task import LoopingCall
+
+            self._sweeper = LoopingCall(self.expiry.advance)
+            self._sweeper.start(self.SWEEP_INTERVAL, now=False)
+
+    def _end(self, host):
+        """
+        End an auth session.
+
+        @type   host:   str
+        """
+        del self._sessions[host]
+        self.expiry.cancel(host)
+        self._stop_sweeper()
+        self.save()
+
+    def _expired(self, host):
+        """
+        Called by the timer wheel when a session has expired.
+
+        @type   host:   str
+        """
+        self._log.info('The auth session for %s has expired', host)
+        self._sessions.pop(host, None)
+        self._stop_sweeper()
+
+    def _stop_sweeper(self):
+        if self._sweeper and not len(self.expiry):
+            if self._sweeper.running:
+                self._sweeper.stop()
+            self._sweeper = None
+
     @property
     def sessions(self):
         return self._sessions.copy()
 
+    def persist(self, path=None):
+        """
+        Restore the sessions saved by a previous run, and save our sessions whenever someone logs in or out from now on.
+
+        @type   path:   str or None
+        @param  path:   Session file. Defaults to a file named after our server in the sessions data directory.
+
+        @rtype:     int
+        @return:    The number of restored sessions.
+        """
+        self.path = path or os.path.join(self.firefly.DATA_DIR, 'sessions', '{h}.json'.format(
+            h=re.sub(r'\s', '_', self.firefly.server.hostname)))
+        return self.load(self.path)
+
+    def save(self, path=None):
+        """
+        Save our sessions.
+
+        Sessions expire on the monotonic clock, which doesn't carry over between boots, so expiry times are saved as
+        wall clock times. Sessions started via services accounts are only valid while the server reports the account,
+        so they aren't saved; services_login starts them again when the server next reports the account.
+
+        @type   path:   str or None
+        @param  path:   Session file. Defaults to the path given to persist().
+
+        @rtype:     int
+        @return:    The number of saved sessions.
+        """
+        path = path or self.path
+        if not path:
+            return 0
+
+        now, wall_now = monotonic(), time.time()
+        sessions = []
+        for host, session in self._sessions.iteritems():
+            if session.account is not None or (session.expires is not False and session.expires <= now):
+                continue
+
+            sessions.append({
+                'host': host,
+                'hostmask': session.hostmask.hostmask,
+                'email': session.user.email,
+                'expires': wall_now + (session.expires - now) if session.expires is not False else None,
+                'lifetime': session.lifetime,
+                'access_refresh': session.access_refresh,
+            })
+
+        atomic_write(path, json.dumps({'version': self.SESSIONS_VERSION, 'sessions': sessions}))
+        self._log.info('Saved %d auth sessions to %s', len(sessions), path)
+        return len(sessions)
+
+    def load(self, path):
+        """
+        Restore saved sessions. Sessions that have expired, belong to accounts that no longer exist, or were started via
+        services accounts (saved by older versions), are skipped.
+
+        @type   path:   str
+
+        @rtype:     int
+        @return:    The number of restored sessions.
+        """
+        if not os.path.isfile(path):
+            return 0
+
+        try:
+            with open(path, 'rb') as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            self._log.exception('Unable to load auth sessions from %s', path)
+            return 0
+
+        if data.get('version') != self.SESSIONS_VERSION:
+            self._log.warn('Ignoring auth sessions saved in an unsupported format: %s', path)
+            return 0
+
+        from firefly.containers import Hostmask
+
+        now, wall_now = monotonic(), time.time()
+        restored = 0
+        for saved in data.get('sessions', []):
+            if saved.get('account') or (saved['expires'] is not None and saved['expires'] <= wall_now):
+                continue
+
+            user = self.users.get(saved['email'])
+            if not user:
+                self._log.info('The account %s no longer exists, not restoring its auth session', saved['email'])
+                continue
+
+            session = AuthSession(user, Hostmask(saved['hostmask']), saved['lifetime'], saved['access_refresh'])
+            if saved['expires'] is not None:
+                session.expires = now + (saved['expires'] - wall_now)
+
+            self._start(session, save=False)
+            restored += 1
+
+        self._log.info('Restored %d auth sessions from %s', restored, path)
+        return restored
+
 
 class AuthSession(object):
 
-    def __init__(self, user, hostmask, lifetime, access_refresh=True):
+    def __init__(self, user, hostmask, lifetime, access_refresh=True, account=None, clock=monotonic):
         """
         @type   user:
         @param  user:           The account being authenticated.
@@ -117,24 +524,33 @@ class AuthSession(object):
         @type   hostmask:       firefly.containers.Hostmask
         @param  hostmask:       The authenticating client.
 
-        @type   lifetime:       dict
-        @param  lifetime:       The session lifetime in dict format (e.g. {'days': 3})
+        @type   lifetime:       dict or float
+        @param  lifetime:       The session lifetime in dict format (e.g. {'days': 3}) or in seconds.
 
         @type   access_refresh: bool
         @param  access_refresh: If true, the session lifetime will be refreshed every time the active state is checked.
+
+        @type   account:        str or None
+        @param  account:        The services account vouching for the client, or None if they logged in with a
+                                password.
+
+        @type   clock:          callable
+        @param  clock:          Returns the current monotonic time in seconds.
         """
         self.user           = user
         self.hostmask       = hostmask
-        self.lifetime       = lifetime
-        self.expires        = arrow.now().replace(**lifetime) if lifetime else False
+        self.lifetime       = timedelta(**lifetime).total_seconds() if isinstance(lifetime, dict) else lifetime
         self.access_refresh = access_refresh
+        self.account        = account
+        self._clock         = clock
+        self.expires        = clock() + self.lifetime if self.lifetime else False
 
     def refresh(self):
         """
         Refresh the sessions lifetime.
         """
         if self.lifetime:
-            self.expires = arrow.now().replace(**self.lifetime)
+            self.expires = self._clock() + self.lifetime
 
     @property
     def active(self):
@@ -142,34 +558,13 @@ class AuthSession(object):
         if self.expires is False:
             return True
 
-        active = arrow.now() < self.expires
+        now = self._clock()
+        if now >= self.expires:
+            return False
 
         # Refresh our session if needed
-        if active:
-            if self.access_refresh:
-                self.refresh()
-
-        return active
-
+        if self.access_refresh:
+            self.expires = now + self.lifetime
 
-class User(object):
-
-    def __init__(self, email, config):
-        """
-        @type   email:      str
-        @param  email:      The account e-mail/username.
-
-        @type   config:     ConfigParser.ConfigParser
-        @param  config:     Users configuration instance.
-        """
-        self._log = logging.getLogger('firefly.user')
-        self._config = config
-
-        self.email = email
-        self.group = config.get(email, 'Group').lower()
-        self.nick  = config.get(email, 'Nick')
-        self.name  = config.get(email, 'DisplayName')
+        return True
 
-    @property
-    def is_admin(self):
-        return self.group == 'admin'
@@ -0,0 +1,266 @@
+import logging
+import sys
+import time
+import types
+from collections import OrderedDict
+
+# Types deep_sizeof never descends into; they're shared rather than owned by the measured object
+_SHARED_TYPES = (types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType, type,
+                 types.ClassType, logging.Logger)
+
+
+def deep_sizeof(obj, depth=4, _seen=None):
+    """
+    Estimate the memory used by an object and everything it holds.
+
+    Containers and instance attributes are followed up to the given depth. Modules, classes, functions and loggers are
+    not followed, since they are shared rather than owned by the object.
+
+    @param  obj:    The object to measure.
+
+    @type   depth:  int
+    @param  depth:  How many levels of references to follow.
+
+    @rtype: int
+    @return:    The estimated size, in bytes.
+    """
+    _seen = set() if _seen is None else _seen
+    if id(obj) in _seen or isinstance(obj, _SHARED_TYPES):
+        return 0
+
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+    if depth <= 0:
+        return size
+
+    if isinstance(obj, dict):
+        children = obj.keys() + obj.values()
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        children = obj
+    elif hasattr(obj, '__dict__'):
+        children = [obj.__dict__]
+    else:
+        children = ()
+
+    return size + sum(deep_sizeof(child, depth - 1, _seen) for child in children)
+
+
+class LRUCache(object):
+    """
+    A bounded mapping that evicts its least recently used entries.
+
+    Entries are evicted when the cache holds more than maxsize entries, when the estimated size of its values exceeds
+    maxbytes, or when they have not been used for ttl seconds. Reading or writing an entry marks it as recently used.
+    """
+    def __init__(self, maxsize=1000, ttl=None, maxbytes=None, sizeof=None, on_evict=None, clock=time.time):
+        """
+        @type   maxsize:    int
+        @param  maxsize:    Maximum number of entries.
+
+        @type   ttl:        float or None
+        @param  ttl:        Seconds an entry may go unused before it expires, or None to never expire entries.
+
+        @type   maxbytes:   int or None
+        @param  maxbytes:   Maximum estimated size of every value combined, or None for no limit.
+
+        @type   sizeof:     callable or None
+        @param  sizeof:     Estimates the size of a value in bytes. Defaults to deep_sizeof.
+
+        @type   on_evict:   callable or None
+        @param  on_evict:   Called with the key and value of every entry that is evicted or expires.
+
+        @type   clock:      callable
+        @param  clock:      Returns the current time in seconds.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.on_evict = on_evict
+        self._sizeof = sizeof or deep_sizeof
+        self._clock = clock
+
+        self._entries = OrderedDict()
+        """@type: OrderedDict of (object: tuple of (object, float, int))"""
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return bool(entry) and not self._expired(entry)
+
+    def __iter__(self):
+        """
+        Iterate over our keys, least recently used first.
+        """
+        return iter(self._entries.keys())
+
+    @property
+    def stats(self):
+        """
+        @rtype: dict
+        """
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _expired(self, entry):
+        """
+        @type   entry:  tuple of (object, float, int)
+        @rtype: bool
+        """
+        return self.ttl is not None and self._clock() - entry[1] >= self.ttl
+
+    def get(self, key, default=None):
+        """
+        Get a value, marking it as recently used.
+
+        @param  key:        The key to look up.
+        @param  default:    Returned if the key is not cached or has expired.
+        """
+        entry = self._entries.pop(key, None)
+        if not entry or self._expired(entry):
+            if entry:
+                self._evict(key, entry)
+
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self._entries[key] = (entry[0], self._clock(), entry[2])
+        return entry[0]
+
+    def set(self, key, value):
+        """
+        Cache a value, marking it as recently used and evicting older entries as needed.
+        """
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.size -= entry[2]
+
+        size = self._sizeof(value) if self.maxbytes is not None else 0
+        self._entries[key] = (value, self._clock(), size)
+        self.size += size
+
+        self.expire()
+        while len(self._entries) > self.maxsize or (self.maxbytes is not None and self.size > self.maxbytes and
+                                                    len(self._entries) > 1):
+            old_key = next(iter(self._entries))
+            self._evict(old_key, self._entries.pop(old_key))
+
+    def pop(self, key, default=None):
+        """
+        Remove a value without calling on_evict.
+        """
+        entry = self._entries.pop(key, None)
+        if not entry:
+            return default
+
+        self.size -= entry[2]
+        return entry[0]
+
+    def items(self):
+        """
+        @rtype: list of tuple
+        @return:    (key, value) pairs, least recently used first.
+        """
+        return [(key, entry[0]) for key, entry in self._entries.iteritems()]
+
+    def expire(self):
+        """
+        Evict every expired entry.
+
+        @rtype: int
+        @return:    The number of expired entries.
+        """
+        if self.ttl is None:
+            return 0
+
+        expired = 0
+        # Entries are kept in order of use, so the expired entries are all at the front
+        while self._entries:
+            key = next(iter(self._entries))
+            if not self._expired(self._entries[key]):
+                break
+
+            self._evict(key, self._entries.pop(key))
+            expired += 1
+
+        return expired
+
+    def clear(self):
+        """
+        Evict every entry.
+        """
+        while self._entries:
+            key = next(iter(self._entries))
+            self._evict(key, self._entries.pop(key))
+
+    def _evict(self, key, entry):
+        """
+        @type   entry:  tuple of (object, float, int)
+        """
+        self.size -= entry[2]
+        self.evictions += 1
+        if self.on_evict:
+            self.on_evict(key, entry[0])
+
+
+class SingleFlight(object):
+    """
+    Deduplicates concurrent calls for the same key.
+
+    While a call for a key is in flight, further calls for that key don't call the function again; they wait for the
+    first call to finish and get its result. Every caller gets the same result object, so results should not be
+    modified.
+    """
+    def __init__(self):
+        self._waiting = {}
+        """@type: dict of (object: list of twisted.internet.defer.Deferred)"""
+
+    def __len__(self):
+        return len(self._waiting)
+
+    def __contains__(self, key):
+        return key in self._waiting
+
+    def call(self, key, func, *args, **kwargs):
+        """
+        Call a function, unless a call for the same key is already in flight.
+
+        @param  key:    Identifies the call.
+
+        @type   func:   callable
+        @param  func:   Called with the remaining arguments. May return a Deferred.
+
+        @rtype:     twisted.internet.defer.Deferred
+        @return:    Fires with the result of the call.
+        """
+        from twisted.internet import defer
+
+        d = defer.Deferred()
+        if key in self._waiting:
+            self._waiting[key].append(d)
+            return d
+
+        self._waiting[key] = [d]
+        defer.maybeDeferred(func, *args, **kwargs).addBoth(self._finished, key)
+        return d
+
+    def _finished(self, result, key):
+        from twisted.python.failure import Failure
+
+        for d in self._waiting.pop(key):
+            if isinstance(result, Failure):
+                d.errback(result)
+            else:
+                d.callback(result)
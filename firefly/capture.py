@@ -0,0 +1,264 @@
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from timeit import default_timer
+
+import firefly
+from firefly.stats import percentiles
+
+# Capture file format version
+CAPTURE_VERSION = 1
+
+# Replay speeds
+SPEED_MAX = 'max'
+
+# Auth plugin commands, whatever the command prefix is (it can't contain word characters), and their arguments
+AUTH_COMMAND = re.compile(r'^(?P<command>(?:@\S+ )?\S+ (?:PRIVMSG|NOTICE) \S+ :[^\w\s]*auth\s+\S+)\s.*$',
+                          re.IGNORECASE)
+
+
+class TrafficRecorder(object):
+    """
+    Records raw inbound server lines with their arrival times.
+
+    Capture files are gzip compressed text. The first line is a JSON header; every following line contains the
+    offset in seconds from the start of the capture and the raw server line, separated by a single tab.
+    """
+    def __init__(self, path, hostname):
+        """
+        @type   path:       str
+        @param  path:       Path to the capture file. Existing files are overwritten.
+
+        @type   hostname:   str
+        @param  hostname:   Hostname of the server being captured.
+        """
+        self._log = logging.getLogger('firefly.capture')
+        self.path = path
+        self.hostname = hostname
+        self.lines = 0
+
+        # Captures may contain private messages, so only we can read them
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)
+        self._raw = os.fdopen(fd, 'wb')
+
+        self._started = time.time()
+        self._file = gzip.GzipFile(os.path.basename(path), 'wb', fileobj=self._raw)
+        self._file.write(json.dumps({
+            'format': 'firefly-capture',
+            'version': CAPTURE_VERSION,
+            'hostname': hostname,
+            'started': self._started,
+            'firefly_version': firefly.__version__
+        }) + '\n')
+
+        self._log.info('Capturing traffic from %s to %s', hostname, path)
+
+    def record(self, line):
+        """
+        Record a single raw line. The arguments of auth commands are redacted, so passwords are never written.
+
+        @type   line:   str
+        """
+        line = AUTH_COMMAND.sub(r'\g<command> [redacted]', line)
+        self._file.write('{o:.4f}\t{l}\n'.format(o=time.time() - self._started, l=line))
+        self.lines += 1
+
+    def close(self):
+        """
+        Flush and close the capture file.
+        """
+        if self._file:
+            self._file.close()
+            self._raw.close()
+            self._file = None
+            self._log.info('Capture closed after %d lines: %s', self.lines, self.path)
+
+
+def read_capture(path):
+    """
+    Read a capture file.
+
+    @type   path:   str
+
+    @rtype:     tuple of (dict, list of (float, str))
+    @return:    The capture header and a list of (offset, line) tuples.
+
+    @raise  ValueError: Raised if the file is not a valid capture file.
+    """
+    with gzip.open(path, 'rb') as f:
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            raise ValueError('{p} is not a valid capture file'.format(p=path))
+
+        if header.get('format') != 'firefly-capture':
+            raise ValueError('{p} is not a valid capture file'.format(p=path))
+
+        if header.get('version') != CAPTURE_VERSION:
+            raise ValueError('Unsupported capture file version: {v}'.format(v=header.get('version')))
+
+        lines = []
+        for entry in f:
+            offset, line = entry.rstrip('\r\n').split('\t', 1)
+            lines.append((float(offset), line))
+
+    return header, lines
+
+
+class TemporaryDirectories(object):
+    """
+    Points FireflyIRC's configuration, data and log directories at a temporary directory, so replays never touch (or
+    depend on) the users real configuration and data.
+    """
+    def __init__(self):
+        self.path = None
+        self._saved = None
+
+    def __enter__(self):
+        from firefly import FireflyIRC
+
+        self.path = tempfile.mkdtemp(prefix='firefly-replay-')
+        self._saved = (FireflyIRC.CONFIG_DIR, FireflyIRC.DATA_DIR, FireflyIRC.LOG_DIR)
+
+        FireflyIRC.CONFIG_DIR = os.path.join(self.path, 'config')
+        FireflyIRC.DATA_DIR   = os.path.join(self.path, 'data')
+        FireflyIRC.LOG_DIR    = os.path.join(self.path, 'logs')
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        from firefly import FireflyIRC
+
+        FireflyIRC.CONFIG_DIR, FireflyIRC.DATA_DIR, FireflyIRC.LOG_DIR = self._saved
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class ReplayTransport(object):
+    """
+    Collects everything the client writes during a replay, in place of a server connection.
+    """
+    disconnecting = False
+
+    def __init__(self):
+        self._written = []
+
+    def write(self, data):
+        self._written.append(data)
+
+    def writeSequence(self, data):
+        self._written.extend(data)
+
+    def loseConnection(self):
+        self.disconnecting = True
+
+    def value(self):
+        """
+        @rtype:     str
+        @return:    Everything written since the last clear.
+        """
+        return ''.join(self._written)
+
+    def clear(self):
+        del self._written[:]
+
+
+class Replayer(object):
+    """
+    Replays a capture against a local, disconnected FireflyIRC instance.
+    """
+    def __init__(self, firefly_irc, speed=1.0):
+        """
+        @type   firefly_irc:    firefly.FireflyIRC
+        @param  firefly_irc:    The (not yet connected) client to replay against.
+
+        @type   speed:          float or str
+        @param  speed:          Playback speed multiplier, or SPEED_MAX to replay as fast as possible.
+        """
+        self._log = logging.getLogger('firefly.replay')
+        self.firefly = firefly_irc
+        self.speed = speed
+
+        # There is no running reactor to drive the heartbeat during a replay
+        self.firefly.heartbeatInterval = None
+        self.transport = ReplayTransport()
+
+    def replay(self, lines):
+        """
+        Replay the supplied lines.
+
+        @type   lines:  list of (float, str)
+        @param  lines:  (offset, line) tuples as returned by read_capture.
+
+        @rtype:     dict
+        @return:    Timing statistics and every outbound line, indexed by the inbound line that produced it.
+        """
+        self.firefly.makeConnection(self.transport)
+        self.transport.clear()
+
+        latencies = []
+        lag = []
+        outputs = []
+        errors = 0
+
+        started = default_timer()
+        for index, (offset, line) in enumerate(lines):
+            # Wait until the line is due
+            if self.speed != SPEED_MAX:
+                due = started + (offset / self.speed)
+                delay = due - default_timer()
+                if delay > 0:
+                    time.sleep(delay)
+                lag.append(max(default_timer() - due, 0.0))
+
+            line_start = default_timer()
+            try:
+                self.firefly.lineReceived(line)
+            except Exception:
+                self._log.exception('Exception raised while replaying line %d: %s', index, line)
+                errors += 1
+            latencies.append(default_timer() - line_start)
+
+            sent = self.transport.value()
+            if sent:
+                outputs.append((index, [l for l in sent.split('\r\n') if l]))
+                self.transport.clear()
+
+        elapsed = default_timer() - started
+
+        return {
+            'speed': self.speed,
+            'lines': len(lines),
+            'errors': errors,
+            'elapsed_sec': elapsed,
+            'lines_per_sec': (len(lines) / elapsed) if elapsed else None,
+            'latency_ms': dict((k, v * 1000.0) for k, v in percentiles(latencies).items()),
+            'lag_ms': dict((k, v * 1000.0) for k, v in percentiles(lag).items()),
+            'outputs': outputs,
+        }
+
+
+def compare_outputs(expected, actual):
+    """
+    Compare the outbound lines of two replays.
+
+    @type   expected:   list of (int, list of str)
+    @type   actual:     list of (int, list of str)
+
+    @rtype:     list of (int, list of str, list of str)
+    @return:    (line index, expected output, actual output) for every inbound line whose output differs.
+    """
+    expected = dict((index, list(out)) for index, out in expected)
+    actual   = dict((index, list(out)) for index, out in actual)
+
+    differences = []
+    for index in sorted(set(expected) | set(actual)):
+        if expected.get(index, []) != actual.get(index, []):
+            differences.append((index, expected.get(index, []), actual.get(index, [])))
+
+    return differences
@@ -0,0 +1,94 @@
+import codecs
+import logging
+
+from firefly.cache import LRUCache
+
+# Encodings tried, in order, when decoding inbound lines. cp1252 is tried before latin-1 since most "latin-1" IRC
+# clients are really Windows clients sending cp1252, and latin-1 never fails so anything after it is never tried.
+DEFAULT_ENCODINGS = ('utf-8', 'cp1252', 'latin-1')
+
+
+class Charset(object):
+    """
+    Decodes inbound IRC lines to unicode and encodes outbound lines.
+
+    Each line is decoded with the first encoding in the fallback chain that can decode it. When a source (the prefix of
+    the line, e.g. a users hostmask) needs an encoding other than the first, it is remembered and tried first for that
+    source's following lines, so users of legacy encodings don't cost a failed decode on every line.
+    """
+    def __init__(self, encodings=DEFAULT_ENCODINGS, output='utf-8', max_sources=4096, ttl=60 * 60):
+        """
+        @type   encodings:      list of str
+        @param  encodings:      Encodings to try when decoding, in order.
+
+        @type   output:         str
+        @param  output:         Encoding used for outbound lines.
+
+        @type   max_sources:    int
+        @param  max_sources:    Maximum number of sources to remember the encoding of.
+
+        @type   ttl:            float
+        @param  ttl:            Seconds to remember the encoding of a source for after its last line.
+        """
+        self._log = logging.getLogger('firefly.charset')
+        self.encodings = []
+        for encoding in encodings:
+            try:
+                self.encodings.append(codecs.lookup(encoding).name)
+            except LookupError:
+                self._log.error('Unknown encoding %s, removing it from the fallback chain', encoding)
+
+        self.encodings = self.encodings or list(DEFAULT_ENCODINGS)
+        self.output = codecs.lookup(output).name
+        self.sources = LRUCache(max_sources, ttl)
+
+    @staticmethod
+    def source(line):
+        """
+        Get the source prefix of a raw IRC line.
+
+        @type   line:   str
+        @rtype: str or None
+        """
+        if not line.startswith(':'):
+            return None
+
+        return line[1:line.find(' ')] if ' ' in line else line[1:]
+
+    def decode(self, line):
+        """
+        @type   line:   str or unicode
+        @rtype: unicode
+        """
+        if isinstance(line, unicode):
+            return line
+
+        source = self.source(line)
+        cached = self.sources.get(source) if source else None
+        if cached:
+            try:
+                return line.decode(cached)
+            except UnicodeDecodeError:
+                self.sources.pop(source)
+
+        for encoding in self.encodings:
+            try:
+                text = line.decode(encoding)
+            except UnicodeDecodeError:
+                continue
+
+            if source and encoding != self.encodings[0]:
+                self._log.debug('Detected %s encoding for %s', encoding, source)
+                self.sources.set(source, encoding)
+
+            return text
+
+        # None of our encodings could decode the line; salvage what we can
+        return line.decode(self.encodings[0], 'replace')
+
+    def encode(self, text):
+        """
+        @type   text:   unicode or str
+        @rtype: str
+        """
+        return text.encode(self.output) if isinstance(text, unicode) else text
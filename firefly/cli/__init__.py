@@ -37,11 +37,25 @@ class FireflyCLI(click.MultiCommand):
         return ns['cli']
 
 
+def import_report(ctx, param, value):
+    """
+    Print an import time report for the CLI and every plugin, then exit.
+    """
+    if not value or ctx.resilient_parsing:
+        return
+
+    from firefly.importtime import run_report
+    click.echo(run_report(['firefly.cli'], plugins=True), nl=False)
+    ctx.exit()
+
+
 @click.command(cls=FireflyCLI, context_settings=CONTEXT_SETTINGS)
 @click.option('-v', '--verbose', count=True, default=1,
               help='-v|vv|vvv Increase the verbosity of messages: 1 for normal output, 2 for more verbose output and '
                    '3 for debug')
 @click.version_option(__version__)
+@click.option('--import-report', is_flag=True, expose_value=False, is_eager=True, callback=import_report,
+              help='Show how long each module takes to import (self and cumulative, in milliseconds) and exit.')
 @pass_context
 def cli(ctx, verbose):
     """
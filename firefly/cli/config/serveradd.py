@@ -6,6 +6,7 @@ import os
 
 from firefly import FireflyIRC
 from firefly.cli.config import pass_context, Context
+from firefly.configuration import copy_configuration
 
 
 @click.command('serveradd')
@@ -38,7 +39,7 @@ def cli(ctx, host, port, auto, nick, username, realname, ssl, password, channels
         os.makedirs(servers_dir, 0o755)
 
     # Make sure the server doesn't already exist in our servers configuration
-    servers_config = FireflyIRC.load_configuration('servers')
+    servers_config = copy_configuration(FireflyIRC.load_configuration('servers'))
     server_cfg_path = os.path.join(config_dir, 'servers.cfg')
     if host in servers_config.sections():
         ctx.log.info('Configuration for %s already exists', host)
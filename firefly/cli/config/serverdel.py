@@ -5,6 +5,7 @@ import os
 
 from firefly import FireflyIRC
 from firefly.cli.config import pass_context, Context
+from firefly.configuration import copy_configuration
 
 
 @click.command('serverdel')
@@ -18,7 +19,7 @@ def cli(ctx, host, no_prompt):
     assert isinstance(ctx, Context)
 
     # Make sure this host actually exists in our configuration
-    servers_config = FireflyIRC.load_configuration('servers')
+    servers_config = copy_configuration(FireflyIRC.load_configuration('servers'))
     server_cfg_path = os.path.join(FireflyIRC.CONFIG_DIR, 'config', 'servers.cfg')
     if host not in servers_config.sections():
         ctx.log.error('No configuration for %s exists', host)
@@ -0,0 +1,21 @@
+import os
+
+import click
+
+from firefly.cli import pass_context
+from firefly.languages.trie import convert_directory
+
+
+@click.command('convert')
+@click.argument('source', type=click.Path(exists=True, file_okay=False))
+@click.argument('destination', type=click.Path(file_okay=False, writable=True))
+@pass_context
+def cli(ctx, source, destination):
+    """
+    Convert AgentML language files for the trie language engine
+    """
+    written = convert_directory(source, destination)
+    for path in written:
+        click.echo(os.path.relpath(path, destination))
+
+    click.echo('Converted {n} language files'.format(n=len(written)))
@@ -0,0 +1,101 @@
+import json
+
+import click
+
+from firefly import FireflyIRC
+from firefly.capture import read_capture, compare_outputs, Replayer, TemporaryDirectories, SPEED_MAX
+from firefly.cli import pass_context
+from firefly.configuration import copy_configuration
+from firefly.containers import Server
+
+
+def parse_speed(value):
+    """
+    @type   value:  str
+    @rtype: float or str
+    """
+    value = value.strip().lower()
+    if value == SPEED_MAX:
+        return SPEED_MAX
+
+    value = value.rstrip('x')
+
+    try:
+        speed = float(value)
+    except ValueError:
+        raise click.BadParameter('Speed must be a multiplier (e.g. 1x, 10x) or max')
+
+    if speed <= 0:
+        raise click.BadParameter('Speed must be greater than zero')
+
+    return speed
+
+
+@click.command('replay')
+@click.argument('capture', type=click.Path(exists=True, dir_okay=False))
+@click.option('-s', '--speed', default='1x', help='Playback speed: 1x, 10x, any other multiplier, or max.')
+@click.option('--server', 'hostname', help='Server configuration to replay against. Defaults to the captured server.')
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True),
+              help='Write timing results and all outbound lines to this JSON file.')
+@click.option('-c', '--compare', type=click.Path(exists=True, dir_okay=False),
+              help='A previous replay result to check outbound lines against.')
+@pass_context
+def cli(ctx, capture, speed, hostname, output, compare):
+    """
+    Replay captured server traffic
+
+    Plugins make their usual network requests (e.g. page titles, definitions and searches) during a replay.
+    """
+    speed = parse_speed(speed)
+    header, lines = read_capture(capture)
+    hostname = hostname or header['hostname']
+
+    # Replay with the captured server's settings, but never against the real configuration, data or logs
+    server_settings = None
+    user_config = FireflyIRC.load_configuration('servers')
+    if user_config.has_section(hostname):
+        server_settings = user_config.items(hostname, raw=True)
+    else:
+        ctx.log.warn('No configuration for %s exists, replaying against the default server configuration', hostname)
+
+    click.echo('Replaying {n} lines from {h} at {s} speed'.format(
+        n=len(lines), h=header['hostname'], s=speed if speed == SPEED_MAX else '{0:g}x'.format(speed)))
+
+    with TemporaryDirectories():
+        servers_config = copy_configuration(FireflyIRC.load_configuration('servers'))
+        servers_config.add_section(hostname)
+        for option, value in server_settings or []:
+            servers_config.set(hostname, option, value)
+
+        replayer = Replayer(FireflyIRC(Server(hostname, servers_config)), speed)
+        results = replayer.replay(lines)
+        results['capture'] = header
+
+    latency = results['latency_ms']
+    click.echo('{lps:,.0f} lines/sec  p50 {p50:.3f}ms  p99 {p99:.3f}ms  max {max:.3f}ms  errors {err}'.format(
+        lps=results['lines_per_sec'] or 0, p50=latency.get('p50', 0), p99=latency.get('p99', 0),
+        max=latency.get('max', 0), err=results['errors']))
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        click.secho('Results written to {o}'.format(o=output), bold=True)
+
+    if compare:
+        with open(compare) as f:
+            expected = json.load(f)
+
+        differences = compare_outputs(expected['outputs'], results['outputs'])
+        if not differences:
+            click.secho('Outbound lines are identical', fg='green', bold=True)
+            return
+
+        click.secho('{n} inbound lines produced different output'.format(n=len(differences)), fg='red', bold=True)
+        for index, before, after in differences[:20]:
+            click.echo('[{i}] {l}'.format(i=index, l=lines[index][1]))
+            for line in before:
+                click.echo('  - {l}'.format(l=line))
+            for line in after:
+                click.echo('  + {l}'.format(l=line))
+
+        raise click.ClickException('Replay output does not match {c}'.format(c=compare))
@@ -2,19 +2,38 @@ import logging
 
 import click
 import os
+import re
+import time
 from twisted.internet import protocol, reactor
+from twisted.internet.task import LoopingCall
 
-from firefly import FireflyIRC
+from firefly import FireflyIRC, PluginHost
 from firefly.cli import pass_context
 from firefly.containers import Server
+from firefly.users import check_stores
 
 
 @click.command('start')
+@click.option('--capture', is_flag=True, help='Record raw inbound traffic from every server for later replay.')
+@click.option('--capture-dir', type=click.Path(file_okay=False, writable=True),
+              help='Directory to write capture files to. Defaults to the captures directory in the data path.')
+@click.option('--reload-interval', default=5.0,
+              help='Seconds between checks for changed configuration files (default: 5). 0 disables reloading.')
+@click.option('--language', default='aml', help='Language engine to use (default: aml).')
+@click.option('--language-workers', default=0,
+              help='Number of worker processes to run the language engine in (default: 0, runs it in this process).')
+@click.option('--persist-sessions', default=0,
+              help='Number of the most recently used language sessions to save on shutdown and restore on start '
+                   '(default: 0, sessions are not saved).')
 @pass_context
-def cli(ctx):
+def cli(ctx, capture, capture_dir, reload_interval, language, language_workers, persist_sessions):
     """
     Start Firefly
     """
+    # Sessions live in the worker processes, which can't save or restore them
+    if persist_sessions and language_workers:
+        raise click.UsageError('--persist-sessions can not be used with --language-workers')
+
     # Make sure we don't already have a PID stored
     if not os.path.exists(FireflyIRC.DATA_DIR):
         os.makedirs(FireflyIRC.DATA_DIR)
@@ -24,15 +43,43 @@ def cli(ctx):
         raise Exception('An instance of Firefly is already running. Even if you are sure this is not the case, please '
                         'run firefly stop and try again.')
 
-    # Load our first server
+    # Load our servers. Every connection shares a single plugin host, so plugins are only loaded once.
     servers_config = FireflyIRC.load_configuration('servers')
+    host = PluginHost()
     servers = []
     hostnames = servers_config.sections()
     for hostname in hostnames:
         if servers_config.getboolean(hostname, 'Enabled'):
-            factory = FireflyFactory(Server(hostname, servers_config))
+            factory = FireflyFactory(Server(hostname, servers_config), host, language, language_workers)
             servers.append(factory)
-            reactor.connectTCP(factory.firefly.server.hostname, factory.firefly.server.port, factory)
+
+            if capture:
+                factory.firefly.start_capture(capture_path(hostname, capture_dir))
+
+            # Restore the auth sessions from our last run, so restarting doesn't log everyone out
+            factory.firefly.auth.persist()
+            reactor.addSystemEventTrigger('before', 'shutdown', factory.firefly.auth.save)
+
+    # Fork our language workers before we open any connections, so they don't inherit them
+    if language_workers:
+        for engine in host.languages.values():
+            engine.start()
+
+    for factory in servers:
+        reactor.connectTCP(factory.firefly.server.hostname, factory.firefly.server.port, factory)
+
+    # Restore our language sessions, and save them again when we shut down
+    if persist_sessions:
+        for (language_name, container, workers), engine in host.languages.iteritems():
+            path = os.path.join(FireflyIRC.DATA_DIR, 'language-sessions', '{l}-{c}.pickle'
+                                .format(l=language_name, c=container))
+            engine.load_sessions(path)
+            reactor.addSystemEventTrigger('before', 'shutdown', engine.save_sessions, path, persist_sessions)
+
+    # Reload configuration files and user accounts when they change
+    if reload_interval > 0:
+        FireflyIRC.config_cache.watch(reload_interval)
+        LoopingCall(check_stores).start(reload_interval, now=False)
 
     # Write our PID file
     with open(pid_file, "w") as f:
@@ -45,11 +92,31 @@ def cli(ctx):
         if os.path.exists(pid_file):
             os.remove(pid_file)
         raise
+    finally:
+        for factory in servers:
+            factory.firefly.stop_capture()
 
     if os.path.exists(pid_file):
         os.remove(pid_file)
 
 
+def capture_path(hostname, capture_dir=None):
+    """
+    Get the path to a new capture file for the specified server.
+
+    @type   hostname:       str
+    @type   capture_dir:    str or None
+
+    @rtype: str
+    """
+    capture_dir = capture_dir or os.path.join(FireflyIRC.DATA_DIR, 'captures')
+    if not os.path.exists(capture_dir):
+        os.makedirs(capture_dir, 0o755)
+
+    filename = '{h}-{t}.cap.gz'.format(h=re.sub(r'\s', '_', hostname), t=time.strftime('%Y%m%d-%H%M%S'))
+    return os.path.join(capture_dir, filename)
+
+
 class FireflyFactory(protocol.ClientFactory):
     """
     A factory for generating Firefly connections.
@@ -57,8 +124,20 @@ class FireflyFactory(protocol.ClientFactory):
     A new protocol instance will be created each time we connect to the server.
     """
 
-    def __init__(self, server):
-        self.firefly = FireflyIRC(server)
+    def __init__(self, server, host=None, language='aml', language_workers=0):
+        """
+        @type   server: Server
+
+        @type   host:   firefly.PluginHost or None
+        @param  host:   Plugin host shared with the other server connections.
+
+        @type   language:   str
+        @param  language:   Language engine to use.
+
+        @type   language_workers:   int
+        @param  language_workers:   Number of worker processes to run the language engine in.
+        """
+        self.firefly = FireflyIRC(server, language, host, language_workers)
 
     def buildProtocol(self, addr):
         self.firefly.factory = self
@@ -0,0 +1,181 @@
+import logging
+import os
+import time
+
+_log = logging.getLogger('firefly.clock')
+
+# clock_gettime clock ids
+_CLOCK_MONOTONIC = {'linux2': 1, 'linux': 1, 'darwin': 6}
+
+
+def _clock_gettime():
+    """
+    Get a monotonic clock backed by clock_gettime(2), for Python versions without time.monotonic.
+
+    @rtype:     callable or None
+    @return:    None if clock_gettime or CLOCK_MONOTONIC is not available on this platform.
+    """
+    import ctypes
+    import ctypes.util
+    import sys
+
+    clock_id = _CLOCK_MONOTONIC.get(sys.platform)
+    library = ctypes.util.find_library('rt') or ctypes.util.find_library('c')
+    if clock_id is None or not library:
+        return None
+
+    class Timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    try:
+        clock_gettime = ctypes.CDLL(library, use_errno=True).clock_gettime
+    except (OSError, AttributeError):
+        return None
+
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+
+    def monotonic():
+        """
+        @rtype: float
+        """
+        ts = Timespec()
+        if clock_gettime(clock_id, ctypes.byref(ts)):
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        return ts.tv_sec + ts.tv_nsec * 1e-9
+
+    return monotonic
+
+
+try:
+    from time import monotonic
+except ImportError:
+    monotonic = _clock_gettime()
+    if not monotonic:
+        _log.warn('No monotonic clock is available on this platform, falling back to the system clock')
+        monotonic = time.time
+
+
+class TimerWheel(object):
+    """
+    A hashed timer wheel.
+
+    Keys are hashed into a ring of slots by their deadline, each slot covering one tick. Advancing the wheel only visits
+    the slots whose ticks have passed, so expiring keys costs nothing for keys that are not yet due, no matter how many
+    are scheduled.
+
+    Postponing a deadline is O(1): only the deadline is updated, and the key is moved to its new slot when its old slot
+    comes around. Keys due more than one rotation away are likewise carried over until their deadline passes.
+    """
+    def __init__(self, tick=1.0, slots=512, on_expire=None, clock=monotonic):
+        """
+        @type   tick:       float
+        @param  tick:       Seconds covered by each slot.
+
+        @type   slots:      int
+        @param  slots:      Number of slots in the wheel.
+
+        @type   on_expire:  callable or None
+        @param  on_expire:  Called with every key whose deadline passes.
+
+        @type   clock:      callable
+        @param  clock:      Returns the current time in seconds.
+        """
+        self.tick = tick
+        self.on_expire = on_expire
+        self._clock = clock
+
+        self._slots = [set() for __ in xrange(slots)]
+        self._deadlines = {}
+        self._slot_of = {}
+        self._current = int(clock() // tick)
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, key):
+        return key in self._deadlines
+
+    def _insert(self, key, deadline):
+        """
+        @type   deadline:   float
+        """
+        # Anything due in a tick we've already passed goes in the next slot to be visited
+        index = max(int(deadline // self.tick), self._current + 1) % len(self._slots)
+        self._slots[index].add(key)
+        self._slot_of[key] = index
+
+    def schedule(self, key, deadline):
+        """
+        Schedule a key to expire, replacing any existing deadline.
+
+        @type   deadline:   float
+        @param  deadline:   When the key expires, in the time of our clock.
+        """
+        previous = self._deadlines.get(key)
+        self._deadlines[key] = deadline
+        if previous is None:
+            self._insert(key, deadline)
+        elif deadline < previous:
+            self._slots[self._slot_of[key]].discard(key)
+            self._insert(key, deadline)
+
+    def deadline(self, key):
+        """
+        @rtype: float or None
+        """
+        return self._deadlines.get(key)
+
+    def cancel(self, key):
+        """
+        Remove a key without expiring it.
+
+        @rtype: bool
+        """
+        if key not in self._deadlines:
+            return False
+
+        del self._deadlines[key]
+        self._slots[self._slot_of.pop(key)].discard(key)
+        return True
+
+    def advance(self, now=None):
+        """
+        Expire every key whose deadline has passed.
+
+        @type   now:    float or None
+        @param  now:    The current time. Defaults to the time of our clock.
+
+        @rtype: list
+        @return:    The expired keys.
+        """
+        now = self._clock() if now is None else now
+        target = int(now // self.tick)
+        if target <= self._current:
+            return []
+
+        # Visit each slot at most once, even if we've fallen more than a whole rotation behind
+        first = max(self._current + 1, target - len(self._slots) + 1)
+        self._current = target
+
+        expired = []
+        for tick in xrange(first, target + 1):
+            index = tick % len(self._slots)
+            keys, self._slots[index] = self._slots[index], set()
+
+            for key in keys:
+                deadline = self._deadlines[key]
+                if deadline > now:
+                    self._insert(key, deadline)
+                    continue
+
+                del self._deadlines[key]
+                del self._slot_of[key]
+                expired.append(key)
+
+        if self.on_expire:
+            for key in expired:
+                self.on_expire(key)
+
+        return expired
@@ -0,0 +1,194 @@
+import logging
+import os
+from ConfigParser import ConfigParser, Error as ConfigParserError
+
+
+class _CacheEntry(object):
+    """
+    A cached configuration instance along with the files it was read from.
+    """
+    def __init__(self, paths, config):
+        """
+        @type   paths:  list of str
+        @type   config: ConfigParser
+        """
+        self.paths = paths
+        self.config = config
+        self.mtimes = _mtimes(paths)
+        self.subscribers = []
+
+
+def _mtimes(paths):
+    """
+    Get the modification times of the supplied paths. Missing files have a modification time of None.
+
+    @type   paths:  list of str
+    @rtype: list of float or None
+    """
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except OSError:
+            mtimes.append(None)
+
+    return mtimes
+
+
+def copy_configuration(config):
+    """
+    Copy a configuration, so it can be modified without changing the instance shared by every other caller.
+
+    @type   config: ConfigParser
+    @rtype: ConfigParser
+    """
+    duplicate = ConfigParser(dict_type=config._dict)
+    duplicate._defaults = config._dict(config._defaults)
+    duplicate._sections = config._dict((name, config._dict(section)) for name, section in config._sections.items())
+    return duplicate
+
+
+class ConfigurationCache(object):
+    """
+    Parsed configuration cache.
+
+    Every configuration file is parsed once and the same ConfigParser instance is returned to every caller. When one of
+    the underlying files changes, check() re-reads it into that same instance, so anything holding a reference sees the
+    new values, and notifies subscribers so they can refresh any values they derived from it.
+    """
+    # Default interval, in seconds, to poll for configuration file changes at
+    POLL_INTERVAL = 5.0
+
+    def __init__(self):
+        self._log = logging.getLogger('firefly.configuration')
+        self._entries = {}
+        """@type: dict of (tuple: _CacheEntry)"""
+        self._poller = None
+
+    def get(self, key):
+        """
+        Get a cached configuration.
+
+        @type   key:    tuple
+        @rtype: ConfigParser or None
+        """
+        entry = self._entries.get(key)
+        return entry.config if entry else None
+
+    def load(self, key, paths):
+        """
+        Parse and cache a configuration.
+
+        @type   key:    tuple
+        @param  key:    Cache key.
+
+        @type   paths:  list of str
+        @param  paths:  Configuration files to read, in order of precedence (lowest first).
+
+        @rtype: ConfigParser
+        """
+        config = ConfigParser()
+        self._log.debug('Attempting to load configuration files: %s', str(paths))
+        result = config.read(paths)
+        self._log.debug('Configuration files loaded: %s', str(result))
+
+        self._entries[key] = _CacheEntry(paths, config)
+        return config
+
+    def subscribe(self, config, callback):
+        """
+        Subscribe to reloads of a cached configuration.
+
+        @type   config:     ConfigParser
+        @param  config:     A configuration instance returned by load().
+
+        @type   callback:   callable
+        @param  callback:   Called with the configuration instance after it has been reloaded.
+
+        @rtype:     bool
+        @return:    False if the configuration instance is not cached, and so will never be reloaded.
+        """
+        for entry in self._entries.itervalues():
+            if entry.config is config:
+                entry.subscribers.append(callback)
+                return True
+
+        self._log.debug('Not subscribing %s to an uncached configuration instance', repr(callback))
+        return False
+
+    def unsubscribe(self, callback):
+        """
+        Remove a callback from every configuration it is subscribed to.
+
+        @type   callback:   callable
+        """
+        for entry in self._entries.itervalues():
+            if callback in entry.subscribers:
+                entry.subscribers.remove(callback)
+
+    def check(self):
+        """
+        Reload every cached configuration whose files have changed since they were last read.
+
+        @rtype: list of ConfigParser
+        @return:    The reloaded configurations.
+        """
+        reloaded = []
+
+        for key, entry in self._entries.items():
+            mtimes = _mtimes(entry.paths)
+            if mtimes == entry.mtimes:
+                continue
+
+            self._log.info('Configuration files changed, reloading: %s', str(entry.paths))
+
+            # Keep the values we have until the files can be parsed again; they're retried on every check until then
+            fresh = ConfigParser()
+            try:
+                fresh.read(entry.paths)
+            except ConfigParserError as e:
+                self._log.error('Unable to reload configuration files %s, keeping the current values: %s',
+                                str(entry.paths), e)
+                continue
+
+            # Re-read into the existing instance so every holder of a reference sees the new values
+            entry.mtimes = mtimes
+            entry.config._defaults = fresh._defaults
+            entry.config._sections = fresh._sections
+            reloaded.append(entry.config)
+
+            for callback in list(entry.subscribers):
+                try:
+                    callback(entry.config)
+                except Exception:
+                    self._log.exception('Exception raised by configuration reload subscriber %s', repr(callback))
+
+        return reloaded
+
+    def clear(self):
+        """
+        Drop every cached configuration.
+        """
+        self._entries.clear()
+
+    def watch(self, interval=None):
+        """
+        Start polling for configuration file changes on the reactor.
+
+        @type   interval:   float or None
+        @param  interval:   Poll interval in seconds. Defaults to POLL_INTERVAL.
+        """
+        from twisted.internet.task import LoopingCall
+
+        self.stop()
+        self._poller = LoopingCall(self.check)
+        self._poller.start(interval or self.POLL_INTERVAL, now=False)
+
+    def stop(self):
+        """
+        Stop polling for configuration file changes.
+        """
+        if self._poller and self._poller.running:
+            self._poller.stop()
+
+        self._poller = None
@@ -2,15 +2,17 @@ import shlex
 from collections import deque
 from time import time
 
-import arrow
 import itertools
 
 import firefly
 import logging
-import socket
 import re
 from ircmessage import unstyle
 
+from firefly.cache import LRUCache
+from firefly.charset import DEFAULT_ENCODINGS
+from firefly.ircv3 import DEFAULT_CAPABILITIES
+
 
 class Server(object):
 
@@ -42,6 +44,16 @@ class Server(object):
         self.command_prefix = self._parse_command_prefix(config.get(hostname, 'CommandPrefix'))
         self.public_errors  = config.getboolean(hostname, 'PublicErrors')
 
+        # Inbound text encoding fallback chain
+        self.encodings = DEFAULT_ENCODINGS
+        if config.has_option(hostname, 'Encodings'):
+            self.encodings = [e.strip() for e in config.get(hostname, 'Encodings').split(',') if e.strip()]
+
+        # IRCv3 capabilities to request
+        self.capabilities = DEFAULT_CAPABILITIES
+        if config.has_option(hostname, 'Capabilities'):
+            self.capabilities = [c.strip() for c in config.get(hostname, 'Capabilities').split(',') if c.strip()]
+
         self._load_server_config()
         self._load_identity()
         self.channels = {}
@@ -188,9 +200,18 @@ class Identity(object):
         else:
             self.aliases = []
 
-        self.epoch  = arrow.get(config.getint(identity, 'Epoch'))
+        self._epoch = config.getint(identity, 'Epoch')
         self.gender = config.get(identity, 'Gender')
 
+    @property
+    def epoch(self):
+        """
+        @rtype: arrow.Arrow
+        """
+        # arrow takes longer to import than the rest of this module, and only the age is ever formatted with it
+        import arrow
+        return arrow.get(self._epoch)
+
     @property
     def age(self):
         return self.epoch.humanize(only_distance=True)
@@ -563,10 +584,13 @@ class Destination(object):
         return self.type == self.USER
 
     def __repr__(self):
-        return '<FireflyIRC Container: Destination(firefly, {d})>'.format(d=self.raw)
+        return u'<FireflyIRC Container: Destination(firefly, {d})>'.format(d=self.raw).encode('utf-8')
 
     def __str__(self):
-        return self.raw
+        return self.raw.encode('utf-8') if isinstance(self.raw, unicode) else self.raw
+
+    def __unicode__(self):
+        return self.raw if isinstance(self.raw, unicode) else self.raw.decode('utf-8', 'replace')
 
 
 class Hostmask(object):
@@ -584,7 +608,6 @@ class Hostmask(object):
         self.nick     = None
         self.username = None
         self.host     = None
-        self._ip      = None
 
         self._parse_hostmask()
 
@@ -608,52 +631,47 @@ class Hostmask(object):
 
     def resolve_host(self, ignore_errors=True, ignore_cache=False):
         """
-        Attempt to resolve the clients hostname.
+        Attempt to resolve the clients hostname, without blocking.
         Obviously, this won't work if the host is masked.
 
+        Resolutions (including failures) are cached by FireflyIRC.resolver, and shared by every hostmask with the same
+        host.
+
         @type   ignore_errors:  C{bool}
-        @param  ignore_errors:  If True, False will be returned if resolution fails, otherwise expect a socket.error
+        @param  ignore_errors:  If True, the result will be False if resolution fails, otherwise the Deferred fails
+                                with a twisted.internet.error.DNSLookupError
 
         @type   ignore_cache:   C{bool}
         @param  ignore_cache:   Force resolution even if a cached result is available
 
-        @raise  socket.error:   Thrown if name resolution fails and ignore_errors is False.
-
-        @rtype: C{str or bool}
+        @rtype:     twisted.internet.defer.Deferred
+        @return:    Fires with the resolved address C{str}, or False.
         """
+        from twisted.internet import defer
+        from twisted.internet.error import DNSLookupError
+
         if not self.host:
             self._log.warn('No host set, unable to resolve')
+            return defer.fail(DNSLookupError(self.hostmask)) if not ignore_errors else defer.succeed(False)
 
-        # Check if we've already resolved this host before
-        if self._ip and not ignore_cache:
-            self._log.debug('Returning cached host resolution: %s', self._ip)
-            return self._ip
-        # Check if we've previously failed to resolve this host
-        elif self._ip is False and not ignore_cache:
-            self._log.debug('Previously failed to resolve this host, returning None')
-            return self._ip
-
-        try:
-            self._ip = socket.gethostbyname(self.host)
-        except socket.error as e:
-            self._log.info('Could not resolve host %s (%s)', self.host, e.message)
-            self._ip = False
-
-            if not ignore_errors:
-                raise
+        def unresolved(failure):
+            failure.trap(DNSLookupError)
+            return False
 
-        if self._ip:
-            self._log.debug('Host successfully resolved: %s', self._ip)
-        else:
-            self._log.debug('Unable to resolve host')
+        d = firefly.FireflyIRC.resolver.resolve(self.host, ignore_cache)
+        if ignore_errors:
+            d.addErrback(unresolved)
 
-        return self._ip
+        return d
 
     def __repr__(self):
-        return '<FireflyIRC Container: Hostmask("{h}")>'.format(h=self.hostmask)
+        return u'<FireflyIRC Container: Hostmask("{h}")>'.format(h=self.hostmask).encode('utf-8')
 
     def __str__(self):
-        return self.hostmask
+        return self.hostmask.encode('utf-8') if isinstance(self.hostmask, unicode) else self.hostmask
+
+    def __unicode__(self):
+        return self.hostmask if isinstance(self.hostmask, unicode) else self.hostmask.decode('utf-8', 'replace')
 
 
 class Message(object):
@@ -668,6 +686,12 @@ class Message(object):
     MENTION_END       = r'^(?P<message>.+?)(?:(?P<separator>[^\w\s])\s*)*?(?P<nick>{nicks})(?P<ender>[^\w\s])?$'
     MENTION_ANYWHERE  = r'(?P<message>.*\s(?P<nick>{nicks})\W.*)'
 
+    # IRC formatting control codes: bold, color, reset, reverse, italic, strikethrough, underline and monospace
+    FORMATTING = re.compile('[\x02\x03\x0f\x16\x1d\x1e\x1f\x11]')
+
+    # Compiled mention regexes, keyed by nicks and location. Bounded, since every nick we've seen may end up in a key.
+    _mention_regexes = LRUCache(256)
+
     def __init__(self, message, destination, source, message_type=MESSAGE):
         """
         @type   message:        str
@@ -683,12 +707,31 @@ class Message(object):
         """
         self._log        = logging.getLogger('firefly.message')
         self.raw         = message.strip()
-        self.stripped    = unstyle(message).strip()
         self.destination = destination
         self.source      = source
         self.type        = message_type
 
-        self._command = []
+        # Lazily computed and memoized, see the matching properties
+        self._message  = message
+        self._stripped = None
+        self._is_command = None
+        self._command_parts = None
+        self._mentions = {}
+
+    @property
+    def stripped(self):
+        """
+        The message with IRC formatting removed.
+        @rtype: C{str}
+        """
+        if self._stripped is None:
+            # Most messages contain no formatting at all, so skip unstyling them
+            if self.FORMATTING.search(self._message):
+                self._stripped = unstyle(self._message).strip()
+            else:
+                self._stripped = self.raw
+
+        return self._stripped
 
     def get_mentions(self, nicks, location=MENTION_START):
         """
@@ -703,17 +746,33 @@ class Message(object):
         @rtype:     tuple of (str, str, re._sre.SRE_Match) or None
         @return:    Tuple of nick, message, match on success, None on failure
         """
-        # Format our regex
-        nicks = [re.escape(nick) for nick in nicks]
-        regex = location.format(nicks='|'.join(nicks))
+        key = (tuple(nicks), location)
+        if key in self._mentions:
+            return self._mentions[key]
+
+        # Format and compile our regex
+        regex = self._mention_regexes.get(key)
+        if not regex:
+            regex = location.format(nicks='|'.join(re.escape(nick) for nick in nicks))
+            regex = re.compile(regex, re.IGNORECASE)
+            self._mention_regexes.set(key, regex)
 
         # Test for a match
-        match = re.match(regex, self.stripped, re.IGNORECASE)
-        if not match:
-            return None
+        match = regex.match(self.stripped)
+        self._mentions[key] = (match.group('nick'), match.group('message'), match) if match else None
+        return self._mentions[key]
+
+    def get_mention(self, nicks):
+        """
+        Test to see if someone has been mentioned at the beginning or end of this message.
 
-        # Return the parts
-        return match.group('nick'), match.group('message'), match
+        @type   nicks:  list or tuple
+        @param  nicks:  The nicks to match against
+
+        @rtype:     tuple of (str, str, re._sre.SRE_Match) or None
+        @return:    Tuple of nick, message, match on success, None on failure
+        """
+        return self.get_mentions(nicks) or self.get_mentions(nicks, self.MENTION_END)
 
     @property
     def is_command(self):
@@ -721,23 +780,33 @@ class Message(object):
         Message is calling a command
         @type: C{bool}
         """
-        # Make sure we actually have a command prefix set
-        command_prefix = self.destination.firefly.server.command_prefix
-        if not command_prefix:
-            self._log.debug('Server has no command prefix defined, unable to check for command status')
-            return False
+        if self._is_command is None:
+            # Make sure we actually have a command prefix set
+            command_prefix = self.destination.firefly.server.command_prefix
+            if not command_prefix:
+                self._log.debug('Server has no command prefix defined, unable to check for command status')
+                self._is_command = False
+            else:
+                self._is_command = self.stripped.startswith(command_prefix)
 
-        return self.stripped.startswith(command_prefix)
+        return self._is_command
 
     @property
     def command_parts(self):
         if not self.is_command:
             raise ValueError('Message does not contain a valid command')
 
-        command_prefix = self.destination.firefly.server.command_prefix
-        command = self.stripped[len(command_prefix):].strip()
-        parts = shlex.split(command)
+        if self._command_parts is None:
+            command_prefix = self.destination.firefly.server.command_prefix
+            command = self.stripped[len(command_prefix):].strip()
+
+            # shlex can't split unicode strings in Python 2
+            if isinstance(command, unicode):
+                self._command_parts = [p.decode('utf-8') for p in shlex.split(command.encode('utf-8'))]
+            else:
+                self._command_parts = shlex.split(command)
 
+        parts = self._command_parts
         if len(parts) < 2:
             raise TypeError('Command strings must contain at least a plugin name and command name')
 
@@ -769,15 +838,18 @@ class Message(object):
         return self.type == self.ACTION
 
     def __repr__(self):
-        return '<FireflyIRC Container: Message("{m}", Destination(firefly, "{d}"), Hostmask("{h}"), "{t}")>'.format(
+        return u'<FireflyIRC Container: Message("{m}", Destination(firefly, "{d}"), Hostmask("{h}"), "{t}")>'.format(
             m=self.stripped.replace('"', '\\"'),
             d=self.destination.raw,
             h=self.source.hostmask,
             t=self.type
-        )
+        ).encode('utf-8')
 
     def __str__(self):
-        return self.stripped
+        return self.stripped.encode('utf-8') if isinstance(self.stripped, unicode) else self.stripped
+
+    def __unicode__(self):
+        return self.stripped if isinstance(self.stripped, unicode) else self.stripped.decode('utf-8', 'replace')
 
 
 class Response(object):
@@ -807,13 +879,26 @@ class Response(object):
         self.channel      = channel
         self.user         = user
         self._messages    = []
-        self._delivered   = []
+        self._deliveries  = []
         self._destination = destination or (
             self.DEST_CHANNEL if self.request and self.request.destination.is_channel else self.DEST_USER
         )
         self.block        = False  # Set to True to stop any further event calls, this should be used with great care.
         self.sent         = False  # Becomes True after all messages in the queue have been delivered.
 
+    @property
+    def _delivered(self):
+        """
+        Delivered messages and when they were delivered.
+
+        Only delivery times are recorded while sending, since arrow is comparatively slow to import and to get the
+        local time with.
+
+        @rtype: list of (str, str, arrow.Arrow)
+        """
+        import arrow
+        return [(msg_type, msg, arrow.Arrow.fromtimestamp(delivered)) for msg_type, msg, delivered in self._deliveries]
+
     def add_message(self, message, destination=None):
         """
         Add a message to the queue
@@ -861,19 +946,19 @@ class Response(object):
                 if msg_type == 'message':
                     self._log.info('Delivering message')
                     self.firefly.msg(self.get_destination(dest) if dest else self.destination, msg)
-                    self._delivered.append((msg_type, msg, arrow.now()))
+                    self._deliveries.append((msg_type, msg, time()))
                     continue
 
                 if msg_type == 'action':
                     self._log.info('Performing action')
                     self.firefly.describe(self.get_destination(dest) if dest else self.destination, msg)
-                    self._delivered.append((msg_type, msg, arrow.now()))
+                    self._deliveries.append((msg_type, msg, time()))
                     continue
 
                 if msg_type == 'notice':
                     self._log.info('Delivering notice')
                     self.firefly.notice(self.get_destination(dest) if dest else self.destination, msg)
-                    self._delivered.append((msg_type, msg, arrow.now()))
+                    self._deliveries.append((msg_type, msg, time()))
                     continue
             except ValueError:
                 self._log.exception('An error occurred while attempting to process a message for delivery')
@@ -948,7 +1033,8 @@ class Response(object):
         self._destination = value
 
     def __repr__(self):
-        return '<FireflyIRC Container: Response(firefly, Destination(firefly, "{d}"))>'.format(d=self.destination.raw)
+        return u'<FireflyIRC Container: Response(firefly, Destination(firefly, "{d}"))>'.format(
+            d=self.destination.raw).encode('utf-8')
 
 
 class ChannelLog(object):
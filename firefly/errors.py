@@ -10,6 +10,17 @@ class NoSuchCommandError(Exception):
     pass
 
 
+class RateLimitedError(Exception):
+
+    def __init__(self, retry_after):
+        """
+        @type   retry_after:    float
+        @param  retry_after:    Seconds until the request would be accepted.
+        """
+        self.retry_after = retry_after
+        Exception.__init__(self, 'Rate limit exceeded, retry in {s:.0f} seconds'.format(s=retry_after))
+
+
 ###############################
 # Argument Parser Errors      #
 ###############################
@@ -68,6 +79,23 @@ class AuthBadLoginError(AuthError):
         Exception.__init__(self, 'Invalid password supplied for the account %s'.format(e=email))
 
 
+class AuthBusyError(AuthError):
+
+    def __init__(self):
+        Exception.__init__(self, 'Too many login attempts are already being processed')
+
+
+class AuthThrottledError(AuthError):
+
+    def __init__(self, retry_after):
+        """
+        @type   retry_after:    float
+        @param  retry_after:    Seconds until another login attempt will be accepted.
+        """
+        self.retry_after = retry_after
+        Exception.__init__(self, 'Too many failed login attempts, retry in {s:.0f} seconds'.format(s=retry_after))
+
+
 ###############################
 # Plugin Errors               #
 ###############################
@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+
+def atomic_write(path, data):
+    """
+    Write a file atomically, so readers (including a concurrent start) only ever see the old or the new contents.
+
+    The data is written to a temporary file in the same directory, which is then renamed over the path. Missing parent
+    directories are created.
+
+    @type   path:   str
+    @type   data:   str
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, 0o755)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory or None)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
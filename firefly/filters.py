@@ -0,0 +1,257 @@
+import re
+from collections import deque
+
+# Event arguments holding the message an event is about, in order of preference
+MESSAGE_ARGUMENTS = ('message', 'action', 'notice')
+
+# Keyword sets up to this size are searched for with plain substring checks. They run in C, so they beat the pure
+# Python automaton until there are roughly 130 to 190 keywords; measured on Python 2.7 with chat lines of 4 to 40
+# words, the automaton took twice as long at 64 keywords and broke even between 128 and 160. The threshold sits at
+# the bottom of that range, where the two are within about 10% of each other, so neither choice is ever much slower.
+AUTOMATON_THRESHOLD = 128
+
+
+class AhoCorasick(object):
+    """
+    Finds every occurrence of a set of keywords in a single pass over the text, however many keywords there are.
+    """
+    def __init__(self, keywords):
+        """
+        @type   keywords:   iterable of str or unicode
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [frozenset()]
+
+        for keyword in set(keywords):
+            if keyword:
+                self._add(keyword)
+
+        self._link()
+
+    def _add(self, keyword):
+        state = 0
+        for char in keyword:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(frozenset())
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+
+        self._output[state] |= frozenset([keyword])
+
+    def _link(self):
+        """
+        Build the failure links breadth first, so each state's links are known before its children's.
+        """
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].iteritems():
+                queue.append(child)
+
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] |= self._output[self._fail[child]]
+
+    def search(self, text):
+        """
+        @type   text:   str or unicode
+
+        @rtype:     frozenset
+        @return:    Every keyword found in the text.
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        found = frozenset()
+        state = 0
+
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+
+        return found
+
+
+class KeywordSearch(object):
+    """
+    Finds which of a set of keywords appear in a text, ignoring case.
+    """
+    def __init__(self, keywords):
+        """
+        @type   keywords:   iterable of str or unicode
+        """
+        self.keywords = frozenset(keyword.lower() for keyword in keywords if keyword)
+        self._automaton = AhoCorasick(self.keywords) if len(self.keywords) > AUTOMATON_THRESHOLD else None
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def search(self, text):
+        """
+        @type   text:   str or unicode
+        @rtype: frozenset
+        """
+        text = text.lower()
+        if self._automaton:
+            return self._automaton.search(text)
+
+        return frozenset(keyword for keyword in self.keywords if keyword in text)
+
+
+class EventFilter(object):
+    """
+    Declares which events an event handler is interested in, so it's only called for those.
+
+    Every given condition must match. Conditions on the message only match events about a message.
+    """
+    def __init__(self, keywords=None, regex=None, channels=None, exclude_channels=None, message_types=None):
+        """
+        @type   keywords:           list of str or None
+        @param  keywords:           The message must contain at least one of these substrings, ignoring case.
+
+        @type   regex:              str or re.RegexObject or None
+        @param  regex:              The message must match this regular expression (anywhere, as with re.search).
+
+        @type   channels:           list of str or None
+        @param  channels:           The event must be in one of these channels.
+
+        @type   exclude_channels:   list of str or None
+        @param  exclude_channels:   The event must not be in any of these channels.
+
+        @type   message_types:      list of str or None
+        @param  message_types:      The message must be one of these types (see firefly.containers.Message).
+        """
+        self.keywords = frozenset(k.lower() for k in keywords if k) if keywords else None
+        self.regex = re.compile(regex) if isinstance(regex, basestring) else regex
+        self.channels = frozenset(c.lower() for c in channels) if channels else None
+        self.exclude_channels = frozenset(c.lower() for c in exclude_channels) if exclude_channels else frozenset()
+        self.message_types = frozenset(message_types) if message_types else None
+
+    @classmethod
+    def from_params(cls, **kwargs):
+        """
+        @rtype:     EventFilter or None
+        @return:    None if no conditions were given, since every event would match.
+        """
+        if not any(kwargs.values()):
+            return None
+
+        return cls(**kwargs)
+
+    def matches(self, event):
+        """
+        @type   event:  EventSubject
+        @rtype: bool
+        """
+        if self.message_types is not None and event.type not in self.message_types:
+            return False
+
+        if self.channels is not None and event.channel not in self.channels:
+            return False
+
+        if event.channel in self.exclude_channels:
+            return False
+
+        if self.keywords is not None and (event.text is None or not self.keywords & event.keywords()):
+            return False
+
+        if self.regex is not None and (event.text is None or not self.regex.search(event.text)):
+            return False
+
+        return True
+
+    def __repr__(self):
+        conditions = ('keywords', 'regex', 'channels', 'exclude_channels', 'message_types')
+        return '<EventFilter {c}>'.format(c=' '.join('{n}={v!r}'.format(n=name, v=getattr(self, name))
+                                                      for name in conditions if getattr(self, name)))
+
+
+class EventSubject(object):
+    """
+    The parts of an event's arguments that filters are matched against, extracted once per event.
+    """
+    def __init__(self, kwargs, keyword_search=None):
+        """
+        @type   kwargs:         dict
+        @param  kwargs:         The event arguments.
+
+        @type   keyword_search: KeywordSearch or None
+        @param  keyword_search: Every keyword the event's filters look for, searched for at most once per event.
+        """
+        self.text = None
+        self.type = None
+        self.channel = None
+        self._keyword_search = keyword_search
+        self._keywords = None
+
+        message = None
+        for name in MESSAGE_ARGUMENTS:
+            message = kwargs.get(name)
+            if message is not None:
+                break
+
+        if isinstance(message, basestring):
+            self.text = message
+        elif message is not None:
+            self.text = message.stripped
+            self.type = message.type
+            if message.destination.is_channel:
+                self.channel = message.destination.raw.lower()
+
+        channel = kwargs.get('channel')
+        if self.channel is None and channel is not None:
+            self.channel = unicode(channel).lower()
+
+    def keywords(self):
+        """
+        @rtype:     frozenset
+        @return:    Every filter keyword found in the message.
+        """
+        if self._keywords is None:
+            self._keywords = self._keyword_search.search(self.text) if self._keyword_search else frozenset()
+
+        return self._keywords
+
+
+class EventMatcher(object):
+    """
+    Matches an event against the filters of every handler bound to it.
+
+    The keywords of every filter are combined into a single search, so a message is searched once no matter how many
+    handlers filter on keywords.
+    """
+    def __init__(self, bindings):
+        """
+        @type   bindings:   list of tuple of (object, EventFilter or None)
+        @param  bindings:   Handler identifiers and their filters, in the order they should be returned.
+        """
+        self.bindings = bindings
+        self.filtered = any(event_filter for __, event_filter in bindings)
+
+        keywords = set()
+        for __, event_filter in bindings:
+            if event_filter and event_filter.keywords:
+                keywords |= event_filter.keywords
+
+        self.keyword_search = KeywordSearch(keywords) if keywords else None
+
+    def match(self, kwargs):
+        """
+        @type   kwargs: dict
+        @param  kwargs: The event arguments.
+
+        @rtype:     list
+        @return:    The identifiers of the handlers whose filters match the event.
+        """
+        if not self.filtered:
+            return [handler for handler, __ in self.bindings]
+
+        event = EventSubject(kwargs, self.keyword_search)
+        return [handler for handler, event_filter in self.bindings
+                if event_filter is None or event_filter.matches(event)]
@@ -0,0 +1,182 @@
+"""
+Import time profiling.
+
+Reports how long each module takes to import, both on its own (self) and including everything it imports
+(cumulative). Reports are always generated in a fresh interpreter, since by the time the CLI is running most of the
+interesting imports have already happened.
+
+This module deliberately avoids importing anything from the firefly package so that it can be executed directly as a
+script before the package is imported.
+"""
+import os
+import subprocess
+import sys
+from timeit import default_timer
+
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+
+class ImportTimer(object):
+    """
+    Wraps __import__ and records the time spent importing every newly loaded module.
+    """
+    def __init__(self):
+        self.records = []
+        """@type: list of (int, str, float, float)"""
+        self._stack = []
+        self._original = None
+
+    def install(self):
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, *args, **kwargs):
+        loaded = len(sys.modules)
+
+        # Time spent in nested imports, accumulated by our children
+        frame = [0.0]
+        self._stack.append(frame)
+        index = len(self.records)
+        self.records.append(None)
+
+        started = default_timer()
+        try:
+            return self._original(name, *args, **kwargs)
+        finally:
+            elapsed = default_timer() - started
+            self._stack.pop()
+
+            if self._stack:
+                self._stack[-1][0] += elapsed
+
+            # Only record calls that actually loaded something; everything else is a sys.modules lookup
+            if len(sys.modules) > loaded:
+                # Explicit relative imports (from . import foo) have no module name of their own
+                if not name:
+                    fromlist = args[2] if len(args) > 2 else kwargs.get('fromlist')
+                    name = '.' + ','.join(fromlist or ())
+
+                self.records[index] = (len(self._stack), name, elapsed - frame[0], elapsed)
+            else:
+                self.records[index] = False
+
+    @property
+    def imports(self):
+        """
+        Recorded imports in the order they were started.
+        @rtype: list of (int, str, float, float)
+        @return:    (depth, module, self seconds, cumulative seconds) tuples.
+        """
+        return [record for record in self.records if record]
+
+
+def format_report(imports, threshold=0.0, top=25):
+    """
+    Format recorded imports as a human readable report.
+
+    @type   imports:    list of (int, str, float, float)
+
+    @type   threshold:  float
+    @param  threshold:  Omit imports with a cumulative time (in milliseconds) below this from the tree.
+
+    @type   top:        int
+    @param  top:        Number of slowest modules to summarize.
+
+    @rtype: str
+    """
+    lines = ['{s:>10} | {c:>10} | module'.format(s='self (ms)', c='cumul (ms)')]
+    for depth, name, self_time, cumulative in imports:
+        if cumulative * 1000.0 < threshold:
+            continue
+        lines.append('{s:>10.2f} | {c:>10.2f} | {i}{n}'.format(s=self_time * 1000.0, c=cumulative * 1000.0,
+                                                                 i='  ' * depth, n=name))
+
+    lines.append('')
+    lines.append('Slowest top-level imports:')
+    roots = sorted((record for record in imports if record[0] == 0), key=lambda r: r[3], reverse=True)
+    for depth, name, self_time, cumulative in roots[:top]:
+        lines.append('{c:>10.2f} ms  {n}'.format(c=cumulative * 1000.0, n=name))
+
+    lines.append('')
+    lines.append('Total: {t:.2f} ms'.format(t=sum(record[3] for record in roots) * 1000.0))
+    return '\n'.join(lines)
+
+
+def profile(modules, plugins=False):
+    """
+    Import the specified modules in the current interpreter and record the import times.
+
+    @type   modules:    list of str
+
+    @type   plugins:    bool
+    @param  plugins:    Also import every plugin module, as FireflyIRC does on startup.
+
+    @rtype: list of (int, str, float, float)
+    """
+    timer = ImportTimer()
+    timer.install()
+    try:
+        for module in modules:
+            __import__(module)
+
+        if plugins:
+            import pkgutil
+            import firefly.plugins
+            for __, name, __ in pkgutil.walk_packages(firefly.plugins.__path__, 'firefly.plugins.'):
+                __import__(name)
+    finally:
+        timer.uninstall()
+
+    return timer.imports
+
+
+def run_report(modules, plugins=False, threshold=1.0):
+    """
+    Generate an import time report in a fresh interpreter.
+
+    @type   modules:    list of str
+    @type   plugins:    bool
+    @type   threshold:  float
+
+    @rtype: str
+    """
+    script = os.path.abspath(__file__)
+    if script.endswith(('.pyc', '.pyo')):
+        script = script[:-1]
+
+    args = [sys.executable, script, '--threshold', str(threshold)]
+    if plugins:
+        args.append('--plugins')
+
+    return subprocess.check_output(args + list(modules))
+
+
+def main(argv):
+    plugins = '--plugins' in argv
+    argv = [arg for arg in argv if arg != '--plugins']
+
+    threshold = 0.0
+    if '--threshold' in argv:
+        index = argv.index('--threshold')
+        threshold = float(argv[index + 1])
+        del argv[index:index + 2]
+
+    sys.stdout.write(format_report(profile(argv, plugins), threshold) + '\n')
+
+
+if __name__ == '__main__':
+    # Import the firefly package this script belongs to, and don't let the package directory itself shadow
+    # top-level modules (e.g. our own errors.py)
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    if sys.path and os.path.abspath(sys.path[0]) == package_dir:
+        sys.path[0] = os.path.dirname(package_dir)
+
+    main(sys.argv[1:])
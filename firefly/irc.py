@@ -1,6 +1,8 @@
 import venusian
 import logging
 
+from firefly.filters import EventFilter
+
 
 ################################
 # Event constants              #
@@ -71,11 +73,33 @@ class event(object):
 
         @type   permission: C{str} or C{None}
         @param  permission: The minimum user permission level required to trigger this event.
+
+        The event function is only called for events matching every filter given below, so plugins aren't called (or
+        lazy loaded) for events they'd ignore anyway. See firefly.filters.EventFilter.
+
+        @type   keywords:           C{list of str} or C{None}
+        @param  keywords:           The message must contain at least one of these substrings, ignoring case.
+
+        @type   regex:              C{str} or C{None}
+        @param  regex:              The message must match this regular expression.
+
+        @type   channels:           C{list of str} or C{None}
+        @param  channels:           Only call the event function for events in these channels.
+
+        @type   exclude_channels:   C{list of str} or C{None}
+        @param  exclude_channels:   Never call the event function for events in these channels.
+
+        @type   message_types:      C{list of str} or C{None}
+        @param  message_types:      Only call the event function for these message types (message, notice or action).
         """
         self.event_name = event_name
         self.permission = permission.strip().lower() if permission else 'guest'
         self.command_ok = kwargs.get('command_ok', False)
         self.reply_ok   = kwargs.get('reply_ok', False)
+        self.filter     = EventFilter.from_params(
+            keywords=kwargs.get('keywords'), regex=kwargs.get('regex'), channels=kwargs.get('channels'),
+            exclude_channels=kwargs.get('exclude_channels'), message_types=kwargs.get('message_types')
+        )
 
     def __call__(self, func):
         """
@@ -91,10 +115,11 @@ class event(object):
                 'name': event_name,
                 'permission': self.permission,
                 'command_ok': self.command_ok,
-                'reply_ok': self.reply_ok
+                'reply_ok': self.reply_ok,
+                'filter': self.filter
             }
 
-            scanner.firefly.registry.bind_event(event_name, ob, func, params)
+            scanner.host.registry.bind_event(event_name, ob, func, params)
             return func
 
         venusian.attach(func, callback, category='events')
@@ -130,7 +155,7 @@ class command(object):
             command_name = command_name.lower().strip().replace(' ', '_')
             params = {'name': command_name, 'permission': self.permission}
 
-            scanner.firefly.registry.bind_command(command_name, ob, func, params)
+            scanner.host.registry.bind_command(command_name, ob, func, params)
             return func
 
         venusian.attach(func, callback, category='commands')
@@ -0,0 +1,165 @@
+import logging
+
+# Capabilities requested by default
+DEFAULT_CAPABILITIES = ('account-notify', 'extended-join', 'account-tag')
+
+_TAG_ESCAPES = {':': ';', 's': ' ', '\\': '\\', 'r': '\r', 'n': '\n'}
+
+
+def unescape_tag_value(value):
+    """
+    Unescape an IRCv3 message tag value.
+
+    @type   value:  str
+    @rtype: str
+    """
+    if '\\' not in value:
+        return value
+
+    unescaped = []
+    chars = iter(value)
+    for char in chars:
+        if char != '\\':
+            unescaped.append(char)
+            continue
+
+        # Unknown escapes drop the backslash, and a trailing backslash is dropped entirely
+        escaped = next(chars, '')
+        unescaped.append(_TAG_ESCAPES.get(escaped, escaped))
+
+    return ''.join(unescaped)
+
+
+def parse_tags(line):
+    """
+    Split the IRCv3 message tags off of a raw IRC line.
+
+    @type   line:   str
+    @param  line:   The raw line, which may or may not have tags.
+
+    @rtype:     tuple of (dict, str)
+    @return:    The tags, with UTF-8 decoded values (True for tags without a value), and the rest of the line.
+    """
+    if not line.startswith('@'):
+        return {}, line
+
+    raw_tags, __, line = line[1:].partition(' ')
+    tags = {}
+    for tag in raw_tags.split(';'):
+        if not tag:
+            continue
+
+        key, has_value, value = tag.partition('=')
+        tags[key] = unescape_tag_value(value).decode('utf-8', 'replace') if has_value and value else True
+
+    return tags, line.lstrip(' ')
+
+
+class Capabilities(object):
+    """
+    IRCv3 client capability negotiation.
+
+    This only tracks the state of the negotiation; handle() returns the lines to send to the server in response to each
+    CAP message. Negotiation is started before registering, and ended once the server has acknowledged or rejected our
+    request, or has none of the capabilities we want.
+    """
+    def __init__(self, wanted=DEFAULT_CAPABILITIES):
+        """
+        @type   wanted: list of str
+        @param  wanted: The capabilities to request, if the server supports them.
+        """
+        self._log = logging.getLogger('firefly.ircv3')
+        self.wanted = set(wanted)
+        self.available = {}
+        """@type: dict of (str: str or None)"""
+        self.enabled = set()
+        self.negotiating = False
+
+    def __contains__(self, capability):
+        return capability in self.enabled
+
+    def start(self):
+        """
+        Start negotiating.
+
+        @rtype:     str
+        @return:    The line to send to the server.
+        """
+        self.available.clear()
+        self.enabled.clear()
+        self.negotiating = True
+        return 'CAP LS 302'
+
+    def handle(self, subcommand, args):
+        """
+        Handle a CAP message from the server.
+
+        @type   subcommand: str
+        @param  subcommand: The CAP subcommand (e.g. LS or ACK).
+
+        @type   args:       list of str
+        @param  args:       The parameters after the subcommand.
+
+        @rtype:     list of str
+        @return:    Lines to send to the server in response.
+        """
+        subcommand = subcommand.upper()
+        if not args:
+            return []
+
+        # Multiline replies mark every line but the last with an asterisk
+        more = len(args) > 1 and args[0] == '*'
+        capabilities = args[-1].split()
+
+        if subcommand in ('LS', 'NEW'):
+            for capability in capabilities:
+                name, __, value = capability.partition('=')
+                self.available[name] = value or None
+
+            if more:
+                return []
+
+            return self._request()
+
+        if subcommand == 'ACK':
+            for capability in capabilities:
+                if capability.startswith('-'):
+                    self.enabled.discard(capability[1:])
+                else:
+                    self.enabled.add(capability)
+
+            self._log.info('Enabled capabilities: %s', ', '.join(sorted(self.enabled)) or 'none')
+            return self._end()
+
+        if subcommand == 'NAK':
+            self._log.warn('Server rejected our capability request: %s', ' '.join(capabilities))
+            return self._end()
+
+        if subcommand == 'DEL':
+            for capability in capabilities:
+                self.available.pop(capability, None)
+                self.enabled.discard(capability)
+            return []
+
+        return []
+
+    def _request(self):
+        """
+        @rtype: list of str
+        """
+        request = sorted((self.wanted & set(self.available)) - self.enabled)
+        if not request:
+            return self._end()
+
+        self._log.info('Requesting capabilities: %s', ', '.join(request))
+        return ['CAP REQ :{c}'.format(c=' '.join(request))]
+
+    def _end(self):
+        """
+        @rtype: list of str
+        """
+        if not self.negotiating:
+            return []
+
+        self.negotiating = False
+        return ['CAP END']
@@ -1,29 +1,121 @@
+import cPickle as pickle
 import logging
+import os
+
 from agentml import AgentML, errors
+from firefly.cache import LRUCache
+from firefly.files import atomic_write
 from .interface import LanguageInterface
+from .prefilter import KeywordPrefilter
 
 
 class AgentMLLanguage(LanguageInterface):
 
+    # Bounds on the conversation state kept for each client. Evicted clients simply start a new conversation.
+    MAX_SESSIONS = 1000
+    SESSION_TTL = 6 * 60 * 60
+    SESSION_BYTES = 32 * 1024 * 1024
+
+    # Measuring a session walks everything it holds, so sessions are measured when they're created and then re-measured
+    # every this many replies as they grow
+    SESSION_MEASURE_INTERVAL = 50
+
     def __init__(self):
         self._log = logging.getLogger('firefly.language.aml')
         self.aml = AgentML()
+        self.prefilter = KeywordPrefilter()
+        self.sessions = LRUCache(self.MAX_SESSIONS, self.SESSION_TTL, self.SESSION_BYTES, on_evict=self._end_session)
+        self._unmeasured = {}
+        """@type: dict of (str: int)"""
         super(AgentMLLanguage, self).__init__()
 
+        if not hasattr(self.aml, '_users'):
+            self._log.warn('AgentML does not expose its client sessions, their memory can not be reclaimed')
+
+    @property
+    def _users(self):
+        """
+        AgentML's per client conversation state.
+        @rtype: dict
+        """
+        return getattr(self.aml, '_users', {})
+
+    def _end_session(self, client, user):
+        self._log.debug('Ending language session: %s', client)
+        self._users.pop(client, None)
+        self._unmeasured.pop(client, None)
+
+    def _touch_session(self, client):
+        """
+        Mark a client's session as recently used.
+
+        @type   client: str
+        """
+        unmeasured = self._unmeasured.get(client, 0)
+        if client in self.sessions and unmeasured < self.SESSION_MEASURE_INTERVAL:
+            self._unmeasured[client] = unmeasured + 1
+            self.sessions.get(client)
+            return
+
+        self._unmeasured[client] = 0
+        self.sessions.set(client, self._users.get(client))
+
     def get_reply(self, message, client='localhost', groups=None):
-        message = unicode(message, 'utf-8')
+        # Don't bother the engine with messages that can't match any of our triggers
+        if not self.prefilter.check(message):
+            return
+
+        if isinstance(message, str):
+            message = unicode(message, 'utf-8')
+
         try:
             return self.aml.get_reply(client, message, groups)
         except errors.AgentMLError as e:
             self._log.info(e.message)
+        finally:
+            self._touch_session(client)
 
     def load_file(self, file_path):
         self._log.debug('Loading file: %s', file_path)
         self.aml.load_file(file_path)
+        self.prefilter.load_file(file_path, self.language_cache)
 
     def load_directory(self, dir_path):
         self._log.debug('Loading directory: %s', dir_path)
         self.aml.load_directory(dir_path)
+        self.prefilter.load_directory(dir_path, self.language_cache)
+
+    def save_sessions(self, path, limit):
+        # Only the most recently used sessions are worth keeping
+        sessions = dict((c, u) for c, u in self.sessions.items()[-limit:] if u is not None) if limit else {}
+        try:
+            data = pickle.dumps(sessions, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError) as e:
+            self._log.warn('Language sessions can not be pickled, not saving them: %s', e)
+            return 0
+
+        atomic_write(path, data)
+
+        self._log.info('Saved %d language sessions to %s', len(sessions), path)
+        return len(sessions)
+
+    def load_sessions(self, path):
+        if not os.path.isfile(path):
+            return 0
+
+        try:
+            with open(path, 'rb') as f:
+                sessions = pickle.load(f)
+        except Exception:
+            self._log.exception('Unable to load language sessions from %s', path)
+            return 0
+
+        for client, user in sessions.iteritems():
+            self._users[client] = user
+            self.sessions.set(client, user)
+
+        self._log.info('Loaded %d language sessions from %s', len(sessions), path)
+        return len(sessions)
 
 
 __LANGUAGE_CLASS__ = AgentMLLanguage
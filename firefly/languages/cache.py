@@ -0,0 +1,201 @@
+import cPickle as pickle
+import hashlib
+import logging
+import os
+import weakref
+
+from firefly.files import atomic_write
+
+# Bump this whenever the layout of cache files changes
+CACHE_VERSION = 1
+
+
+class _Chain(object):
+    """
+    The load history of a language engine.
+    """
+    def __init__(self, engine):
+        """
+        @type   engine: firefly.languages.interface.LanguageInterface
+        """
+        self.key = hashlib.sha1('{c}:{e}.{n}:{v}'.format(
+            c=CACHE_VERSION, e=type(engine).__module__, n=type(engine).__name__, v=engine.version)).hexdigest()
+        self.loaded = set()
+        self.cacheable = engine.version is not None
+
+
+def fingerprint(path):
+    """
+    Get a fingerprint of a language file or directory that changes whenever any of the files in it do.
+
+    @type   path:   str
+    @rtype: str
+    """
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return '{m}:{s}'.format(m=stat.st_mtime, s=stat.st_size)
+
+    entries = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            file_path = os.path.join(root, filename)
+            stat = os.stat(file_path)
+            entries.append('{p}:{m}:{s}'.format(p=os.path.relpath(file_path, path), m=stat.st_mtime, s=stat.st_size))
+
+    return '\n'.join(entries)
+
+
+class LanguageCache(object):
+    """
+    Compiled language file cache.
+
+    Loading language files into an engine is deterministic, so the engines state after a sequence of loads depends only
+    on the engine version and the contents of the loaded files. Each load extends a key built from the previous key and
+    the fingerprint of the loaded path; if a snapshot of the engine state is cached under the new key it is restored
+    instead of parsing the files again, otherwise the files are loaded and a snapshot is written for next time.
+
+    Only engines with a version can be snapshotted. Other engines (e.g. AgentML) always load the files themselves,
+    though they may still cache data derived from them (see memoize).
+
+    Paths that have already been loaded into an engine are skipped, so an engine can be shared by several server
+    connections that each load the same language files.
+    """
+    def __init__(self, path):
+        """
+        @type   path:   str
+        @param  path:   Directory to store compiled language data in.
+        """
+        self._log = logging.getLogger('firefly.language.cache')
+        self.path = path
+        self._chains = weakref.WeakKeyDictionary()
+
+    def _chain(self, engine):
+        """
+        @type   engine: firefly.languages.interface.LanguageInterface
+        @rtype: _Chain
+        """
+        if engine not in self._chains:
+            self._chains[engine] = _Chain(engine)
+            engine.language_cache = self
+
+        return self._chains[engine]
+
+    def load(self, engine, path):
+        """
+        Load a language file or directory into an engine.
+
+        @type   engine: firefly.languages.interface.LanguageInterface
+
+        @type   path:   str
+        @param  path:   Path to a language file or directory.
+
+        @rtype:     bool
+        @return:    False if the path had already been loaded into the engine.
+        """
+        path = os.path.realpath(path)
+        chain = self._chain(engine)
+        if path in chain.loaded:
+            self._log.debug('Language path has already been loaded, skipping: %s', path)
+            return False
+
+        chain.loaded.add(path)
+        load = engine.load_directory if os.path.isdir(path) else engine.load_file
+
+        if not chain.cacheable:
+            load(path)
+            return True
+
+        chain.key = hashlib.sha1('{k}\n{p}\n{f}'.format(k=chain.key, p=path, f=fingerprint(path))).hexdigest()
+        cache_path = os.path.join(self.path, '{k}.pickle'.format(k=chain.key))
+
+        if self._restore(engine, cache_path):
+            self._log.info('Loaded compiled language data for %s', path)
+            return True
+
+        load(path)
+        self._save(engine, chain, cache_path)
+        return True
+
+    def memoize(self, name, path, compute):
+        """
+        Get data derived from a language file, only computing it again when the file changes.
+
+        @type   name:       str
+        @param  name:       Name of the derived data, including its version.
+
+        @type   path:       str
+        @param  path:       Path to a language file.
+
+        @type   compute:    callable
+        @param  compute:    Called with the path to compute the data. The data must be picklable.
+        """
+        path = os.path.realpath(path)
+        key = hashlib.sha1('{c}:{n}\n{p}\n{f}'.format(c=CACHE_VERSION, n=name, p=path, f=fingerprint(path))).hexdigest()
+        cache_path = os.path.join(self.path, '{k}.pickle'.format(k=key))
+
+        if os.path.isfile(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    return pickle.load(f)
+            except Exception:
+                self._log.exception('Unable to read cached %s data from %s, discarding it', name, cache_path)
+                os.remove(cache_path)
+
+        data = compute(path)
+        try:
+            atomic_write(cache_path, pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, TypeError, IOError, OSError) as e:
+            self._log.warn('Unable to cache %s data for %s: %s', name, path, e)
+
+        return data
+
+    def _restore(self, engine, cache_path):
+        """
+        @type   engine:     firefly.languages.interface.LanguageInterface
+        @type   cache_path: str
+        @rtype: bool
+        """
+        if not os.path.isfile(cache_path):
+            return False
+
+        try:
+            with open(cache_path, 'rb') as f:
+                engine.set_state(pickle.load(f))
+        except Exception:
+            self._log.exception('Unable to restore compiled language data from %s, discarding it', cache_path)
+            os.remove(cache_path)
+            return False
+
+        return True
+
+    def _save(self, engine, chain, cache_path):
+        """
+        @type   engine:     firefly.languages.interface.LanguageInterface
+        @type   chain:      _Chain
+        @type   cache_path: str
+        """
+        state = engine.get_state()
+        try:
+            data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL) if state is not None else None
+        except (pickle.PicklingError, TypeError) as e:
+            self._log.info('Language engine state can not be pickled, not caching it: %s', e)
+            data = None
+
+        if data is None:
+            chain.cacheable = False
+            return
+
+        # Write atomically, so a concurrent start never reads a partial file
+        atomic_write(cache_path, data)
+
+    def clear(self):
+        """
+        Delete every cached compiled language file.
+        """
+        if not os.path.isdir(self.path):
+            return
+
+        for filename in os.listdir(self.path):
+            if filename.endswith('.pickle'):
+                os.remove(os.path.join(self.path, filename))
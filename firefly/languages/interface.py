@@ -5,6 +5,14 @@ class LanguageInterface(object):
 
     __metaclass__ = ABCMeta
 
+    # Version of the engines loaded language data. Compiled language caches are discarded when it changes. Engines that
+    # can't snapshot their loaded data (see get_state) leave it None, and always parse their language files.
+    version = None
+
+    # The LanguageCache language files are being loaded through, if any. Engines may use it to cache data they derive
+    # from their language files.
+    language_cache = None
+
     def __init__(self):
         pass
 
@@ -20,3 +28,40 @@ class LanguageInterface(object):
     def load_directory(self, dir_path):
         pass
 
+    def get_state(self):
+        """
+        Get a picklable snapshot of the loaded language data.
+
+        @return:    The snapshot, or None if the engine can not be snapshotted.
+        """
+        return None
+
+    def set_state(self, state):
+        """
+        Replace the loaded language data with a snapshot returned by get_state. Engines that can't be snapshotted
+        never return one, so there's nothing to restore.
+        """
+        pass
+
+    def save_sessions(self, path, limit):
+        """
+        Save the most recently used client conversation sessions.
+
+        @type   path:   str
+        @type   limit:  int
+        @param  limit:  Maximum number of sessions to save.
+
+        @rtype: int
+        @return:    The number of saved sessions.
+        """
+        return 0
+
+    def load_sessions(self, path):
+        """
+        Restore client conversation sessions saved by save_sessions.
+
+        @type   path:   str
+        @rtype: int
+        @return:    The number of restored sessions.
+        """
+        return 0
@@ -0,0 +1,293 @@
+import importlib
+import logging
+import multiprocessing
+from collections import deque
+
+from .cache import LanguageCache
+from .interface import LanguageInterface
+from .prefilter import KeywordPrefilter
+
+# The language engine loaded in each worker process, the cache it loads language files through, and the number of
+# load calls it has made
+_engine = None
+_cache = None
+_loaded = 0
+
+
+def _init_worker(language, loads, cache_path=None):
+    """
+    Load a language engine in a worker process.
+
+    @type   language:   str
+    @param  language:   Name of the language module, e.g. aml
+
+    @type   loads:      list of (str, str)
+    @param  loads:      (method, path) load calls to replay, in order. This is the pool's own list, so workers the
+                        pool starts to replace ones that died replay every load call made up until then.
+
+    @type   cache_path: str or None
+    @param  cache_path: Compiled language cache directory, or None to always parse the language files.
+    """
+    global _engine, _cache
+    module = importlib.import_module('firefly.languages.{module}'.format(module=language))
+    _engine = module.__LANGUAGE_CLASS__()
+
+    _cache = LanguageCache(cache_path) if cache_path else None
+    for index, (method, path) in enumerate(list(loads)):
+        _load_worker(method, path, index)
+
+
+def _load_worker(method, path, index):
+    """
+    Load a language file or directory into the engine of a worker process.
+
+    @type   method: str
+    @param  method: load_file or load_directory
+
+    @type   path:   str
+
+    @type   index:  int
+    @param  index:  Position of the call in the pool's load calls. Calls the worker already made when it started are
+                    skipped.
+    """
+    global _loaded
+    if index < _loaded:
+        return
+
+    _loaded = index + 1
+    try:
+        if _cache:
+            _cache.load(_engine, path)
+        else:
+            getattr(_engine, method)(path)
+    except Exception:
+        logging.getLogger('firefly.language.pool').exception('Exception raised while loading %s', path)
+
+
+def _reply_batch(requests):
+    """
+    Get replies for a batch of requests in a worker process.
+
+    @type   requests:   list of (str, str, set)
+    @param  requests:   (message, client, groups) tuples.
+
+    @rtype: list of str or None
+    """
+    replies = []
+    for message, client, groups in requests:
+        try:
+            replies.append(_engine.get_reply(message, client, groups))
+        except Exception:
+            logging.getLogger('firefly.language.pool').exception('Exception raised while getting a reply')
+            replies.append(None)
+
+    return replies
+
+
+class _Request(object):
+    """
+    A pending reply request.
+    """
+    def __init__(self, message, client, groups, deferred):
+        self.message = message
+        self.client = client
+        self.groups = groups
+        self.deferred = deferred
+        self.reply = None
+        self.done = False
+        self.timeout = None
+
+
+class PooledLanguage(LanguageInterface):
+    """
+    Runs a language engine in a pool of worker processes.
+
+    Each worker holds its own copy of the engine with every language file loaded. Requests are sharded by client, so
+    a clients conversation state always lives in the same worker, and requests made during the same reactor iteration
+    are sent to each worker as a single batch. get_reply returns a Deferred; replies to each client are delivered in
+    the order the client's requests were made, and requests that take longer than the timeout are answered with None.
+
+    Workers are forked from this process, so they should be started (see start) before the reactor runs and any
+    connections are made; otherwise every worker inherits our sockets and threads. Language files loaded once the
+    workers are running are loaded into the running workers, rather than forking new ones.
+    """
+    def __init__(self, language='aml', workers=None, timeout=2.0, reactor=None, cache_path=None):
+        """
+        @type   language:   str
+        @param  language:   Name of the language module to run in the workers.
+
+        @type   workers:    int or None
+        @param  workers:    Number of worker processes. Defaults to the number of CPUs.
+
+        @type   timeout:    float
+        @param  timeout:    Seconds to wait for a reply before giving up.
+
+        @param  reactor:    The reactor to schedule batches and timeouts on. Defaults to the global reactor.
+
+        @type   cache_path: str or None
+        @param  cache_path: Compiled language cache directory for the workers to load language files through.
+        """
+        self._log = logging.getLogger('firefly.language.pool')
+        super(PooledLanguage, self).__init__()
+
+        self.language = language
+        self.workers = workers or multiprocessing.cpu_count()
+        self.timeout = timeout
+        self.cache_path = cache_path
+
+        if reactor is None:
+            from twisted.internet import reactor
+        self._reactor = reactor
+
+        # The AgentML prefilter is cheap enough to run locally, saving a round trip for messages that can't match
+        self.prefilter = KeywordPrefilter() if language == 'aml' else None
+
+        self._loads = []
+        self._pools = []
+        self._pending = {}
+        """@type: dict of (str: deque of _Request)"""
+        self._batches = {}
+        self._flush_call = None
+        self._shutdown_trigger = None
+
+    def load_file(self, file_path):
+        self._log.debug('Loading file: %s', file_path)
+        self._load('load_file', file_path)
+
+        if self.prefilter:
+            self.prefilter.load_file(file_path, self.language_cache)
+
+    def load_directory(self, dir_path):
+        self._log.debug('Loading directory: %s', dir_path)
+        self._load('load_directory', dir_path)
+
+        if self.prefilter:
+            self.prefilter.load_directory(dir_path, self.language_cache)
+
+    def _load(self, method, path):
+        """
+        Record a load call to replay in new workers, and make it in our running workers.
+        """
+        self._loads.append((method, path))
+
+        # Each pool has a single worker, which handles this before any requests made after it
+        for pool in self._pools:
+            pool.apply_async(_load_worker, (method, path, len(self._loads) - 1))
+
+    def start(self):
+        """
+        Start our worker processes, if they aren't already running.
+        """
+        if self._pools:
+            return
+
+        self._log.info('Starting %d language workers', self.workers)
+        # Pass our own list of load calls, rather than a copy, so workers replacing ones that die are up to date
+        init_args = (self.language, self._loads, self.cache_path)
+        for __ in range(self.workers):
+            self._pools.append(multiprocessing.Pool(1, _init_worker, init_args))
+
+        # Workers are restarted whenever the language files change, but only need to be closed once on shutdown
+        if not self._shutdown_trigger:
+            self._shutdown_trigger = self._reactor.addSystemEventTrigger('before', 'shutdown', self.close)
+
+    def close(self):
+        """
+        Terminate our worker processes. They are started again on the next request, if there is one.
+        """
+        for pool in self._pools:
+            pool.terminate()
+
+        self._pools = []
+
+    def get_reply(self, message, client='localhost', groups=None):
+        """
+        @rtype: twisted.internet.defer.Deferred
+        """
+        from twisted.internet import defer
+
+        request = _Request(message, client, groups, defer.Deferred())
+
+        # Messages the prefilter rejects are answered straight away, but still after the client's earlier requests
+        if self.prefilter and not self.prefilter.check(message):
+            request.done = True
+            self._pending.setdefault(client, deque()).append(request)
+            self._release(client)
+            return request.deferred
+
+        request.timeout = self._reactor.callLater(self.timeout, self._timed_out, request)
+        self._pending.setdefault(client, deque()).append(request)
+
+        # Batch every request made during this reactor iteration
+        self._batches.setdefault(hash(client) % self.workers, []).append(request)
+        if not self._flush_call:
+            self._flush_call = self._reactor.callLater(0, self._flush)
+
+        return request.deferred
+
+    def _flush(self):
+        """
+        Send our queued requests to the workers.
+        """
+        self._flush_call = None
+        batches, self._batches = self._batches, {}
+
+        if not self._pools:
+            self._log.warn('Language workers were not started before the first request, starting them now')
+            self.start()
+
+        for shard, requests in batches.iteritems():
+            self._log.debug('Sending a batch of %d requests to language worker %d', len(requests), shard)
+            self._submit(shard, requests)
+
+    def _submit(self, shard, requests):
+        """
+        Send a batch of requests to a worker.
+
+        @type   shard:      int
+        @type   requests:   list of _Request
+        """
+        def callback(replies):
+            # We're called from the pools result handler thread
+            self._reactor.callFromThread(self._deliver, requests, replies)
+
+        batch = [(r.message, r.client, r.groups) for r in requests]
+        self._pools[shard].apply_async(_reply_batch, (batch,), callback=callback)
+
+    def _deliver(self, requests, replies):
+        """
+        @type   requests:   list of _Request
+        @type   replies:    list of str or None
+        """
+        for request, reply in zip(requests, replies):
+            if request.done:
+                continue
+
+            request.timeout.cancel()
+            request.reply = reply
+            request.done = True
+
+        for client in set(request.client for request in requests):
+            self._release(client)
+
+    def _timed_out(self, request):
+        """
+        @type   request:    _Request
+        """
+        self._log.warn('Timed out waiting for a language reply to: %s', request.message)
+        request.done = True
+        self._release(request.client)
+
+    def _release(self, client):
+        """
+        Fire the Deferreds of a client's completed requests, in the order they were made.
+
+        @type   client: str
+        """
+        pending = self._pending.get(client)
+        while pending and pending[0].done:
+            request = pending.popleft()
+            request.deferred.callback(request.reply)
+
+        if not pending:
+            self._pending.pop(client, None)
@@ -0,0 +1,252 @@
+import logging
+import os
+import re
+import xml.etree.cElementTree as ElementTree
+
+# Pattern words that can be used as anchors. Anything else (wildcards, punctuation, non-ASCII) may be normalized or
+# matched loosely by the language engine, so we can't rely on it appearing verbatim in a message.
+ANCHOR_WORD = re.compile(r'^[a-z0-9]+$')
+
+WORD = re.compile(r'\w+')
+NON_WORD = re.compile(r'\W+')
+
+# Bump this whenever the way files are indexed changes, so cached indexes are discarded
+INDEX_VERSION = 1
+
+# Characters that open an optional or alternation group in a pattern, and the characters that close them
+GROUP_OPEN = '(['
+GROUP_CLOSE = ')]'
+
+
+class KeywordPrefilter(object):
+    """
+    Rejects messages that can not possibly match any loaded trigger pattern.
+
+    Every trigger pattern is reduced to a set of anchor words, at least one of which must appear in any message the
+    pattern matches. A message is only passed on to the language engine when one of its words is an anchor word of
+    some pattern. Patterns we can't reason about (regular expressions, patterns with child elements, or patterns made
+    up entirely of wildcards) disable the prefilter, so it never rejects a message the language engine would reply to.
+    """
+    def __init__(self):
+        self._log = logging.getLogger('firefly.language.prefilter')
+        self.anchors = set()
+        self.patterns = 0
+        self.unanchored = 0
+
+        self.checked = 0
+        self.passed = 0
+
+    @property
+    def enabled(self):
+        """
+        @rtype: bool
+        """
+        return not self.unanchored
+
+    @property
+    def rejected(self):
+        """
+        @rtype: int
+        """
+        return self.checked - self.passed
+
+    @property
+    def hit_rate(self):
+        """
+        The fraction of checked messages that were passed on to the language engine.
+        @rtype: float or None
+        """
+        return (float(self.passed) / self.checked) if self.checked else None
+
+    @property
+    def stats(self):
+        """
+        @rtype: dict
+        """
+        return {
+            'enabled': self.enabled,
+            'patterns': self.patterns,
+            'unanchored_patterns': self.unanchored,
+            'anchor_words': len(self.anchors),
+            'checked': self.checked,
+            'passed': self.passed,
+            'rejected': self.rejected,
+            'hit_rate': self.hit_rate,
+        }
+
+    def reset_stats(self):
+        self.checked = 0
+        self.passed = 0
+
+    @staticmethod
+    def tokenize(message):
+        """
+        Get every word in a message a pattern anchor could be matched against.
+
+        Both whitespace separated chunks with punctuation removed ("don't" -> "dont") and the individual word pieces
+        ("don", "t") are returned, since we don't know how the language engine normalizes punctuation.
+
+        @type   message:    str or unicode
+        @rtype: set of str
+        """
+        message = message.lower()
+        words = set(WORD.findall(message))
+        for chunk in message.split():
+            words.add(NON_WORD.sub('', chunk))
+
+        return words
+
+    @staticmethod
+    def pattern_anchors(pattern):
+        """
+        Get the anchor words of a pattern.
+
+        @type   pattern:    str or unicode
+        @param  pattern:    The pattern text.
+
+        @rtype:     set of str or None
+        @return:    A set of words, one of which must appear in any matching message, or None if the pattern has no
+                    usable anchors.
+        """
+        pattern = pattern.lower()
+        candidates = []
+
+        # Split the pattern into top level words and (alternation) / [optional] groups. Words directly attached to a
+        # group (e.g. "colo[u]r") are not whole words in a matching message, so they can't be used as anchors.
+        depth = 0
+        group = []
+        word = []
+        glued = False
+        alternation = None
+        for char in pattern + ' ':
+            if char in GROUP_OPEN:
+                depth += 1
+                if depth == 1:
+                    glued = glued or bool(word)
+                    word = []
+                    alternation = None
+                    continue
+            elif char in GROUP_CLOSE and depth:
+                depth -= 1
+                if not depth:
+                    # Optional groups never have to match, but one of the alternatives in a group always does
+                    alternatives = [a.split() for a in ''.join(group).split('|')]
+                    if char == ')' and not glued and all(a and ANCHOR_WORD.match(a[0]) for a in alternatives):
+                        alternation = set(a[0] for a in alternatives)
+                    group = []
+                    glued = True
+                    continue
+
+            if depth:
+                group.append(char)
+            elif char.isspace():
+                if not glued:
+                    candidates.append(''.join(word))
+                elif alternation and not word:
+                    candidates.append(alternation)
+                word = []
+                glued = False
+                alternation = None
+            else:
+                word.append(char)
+
+        # Prefer the longest single word, since longer words are more selective, then the smallest alternation
+        words = [c for c in candidates if isinstance(c, basestring) and ANCHOR_WORD.match(c)]
+        if words:
+            return {max(words, key=len)}
+
+        groups = [c for c in candidates if isinstance(c, set)]
+        if groups:
+            return min(groups, key=len)
+
+        return None
+
+    def index_file(self, file_path):
+        """
+        Get the anchor words of every trigger pattern in an AgentML file.
+
+        @type   file_path:  str
+
+        @rtype:     tuple of (set of str, int, int)
+        @return:    The anchor words, the number of patterns, and the number of patterns without usable anchors.
+        """
+        anchors = set()
+        patterns = unanchored = 0
+
+        try:
+            root = ElementTree.parse(file_path).getroot()
+        except (ElementTree.ParseError, IOError, OSError):
+            self._log.warn('Unable to parse %s', file_path)
+            return anchors, patterns, 1
+
+        for element in root.iter():
+            if not isinstance(element.tag, basestring) or element.tag.rsplit('}', 1)[-1] != 'pattern':
+                continue
+
+            patterns += 1
+
+            # We have no way of knowing what regular expressions or dynamic pattern elements match
+            if len(element) or element.get('regex', '').lower() in ('true', '1', 'yes'):
+                self._log.info('Pattern in %s can not be prefiltered', file_path)
+                unanchored += 1
+                continue
+
+            pattern_anchors = self.pattern_anchors(element.text or '')
+            if not pattern_anchors:
+                self._log.info('Pattern in %s has no anchor words: %s', file_path, element.text)
+                unanchored += 1
+                continue
+
+            anchors.update(str(anchor) for anchor in pattern_anchors)
+
+        return anchors, patterns, unanchored
+
+    def load_file(self, file_path, cache=None):
+        """
+        Add the trigger patterns in an AgentML file.
+
+        @type   file_path:  str
+
+        @type   cache:      firefly.languages.cache.LanguageCache or None
+        @param  cache:      Cache to keep the files index in, so it's only parsed again when it changes.
+        """
+        if cache:
+            anchors, patterns, unanchored = cache.memoize(
+                'prefilter:{v}'.format(v=INDEX_VERSION), file_path, self.index_file)
+        else:
+            anchors, patterns, unanchored = self.index_file(file_path)
+
+        if unanchored:
+            self._log.info('%d patterns in %s can not be prefiltered, disabling the prefilter', unanchored, file_path)
+
+        self.anchors.update(anchors)
+        self.patterns += patterns
+        self.unanchored += unanchored
+
+    def load_directory(self, dir_path, cache=None):
+        """
+        Add the trigger patterns in every AgentML file in a directory.
+
+        @type   dir_path:   str
+        @type   cache:      firefly.languages.cache.LanguageCache or None
+        """
+        for root, dirs, files in os.walk(dir_path):
+            for filename in sorted(files):
+                if filename.endswith('.aml'):
+                    self.load_file(os.path.join(root, filename), cache)
+
+    def check(self, message):
+        """
+        Check whether a message could match any loaded pattern.
+
+        @type   message:    str or unicode
+
+        @rtype: bool
+        """
+        self.checked += 1
+
+        if self.unanchored or not self.anchors.isdisjoint(self.tokenize(message)):
+            self.passed += 1
+            return True
+
+        return False
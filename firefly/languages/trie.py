@@ -0,0 +1,448 @@
+import json
+import logging
+import os
+import random
+import re
+import xml.etree.cElementTree as ElementTree
+
+from .interface import LanguageInterface
+
+# Characters stripped from messages and pattern words before matching
+PUNCTUATION = re.compile(r'[^\w\s]', re.UNICODE)
+
+# Template star references, e.g. <star/> or <star index="2"/>
+STAR = re.compile(r'<star(?:\s+index=["\'](\d+)["\'])?\s*/>')
+
+# Wildcards, in the order they are tried, and the words they match. Every wildcard matches one or more words.
+WILDCARDS = (
+    ('#', lambda word: word.isdigit()),
+    ('_', lambda word: word.isalpha()),
+    ('*', lambda word: True),
+)
+
+# Upper limit on the number of word sequences a single pattern may expand to through optional and alternation groups
+MAX_EXPANSIONS = 1024
+
+
+class PatternError(ValueError):
+    """
+    Raised when a trigger pattern can not be compiled.
+    """
+    pass
+
+
+def normalize(word):
+    """
+    @type   word:   unicode
+    @rtype: unicode
+    """
+    return PUNCTUATION.sub('', word.lower())
+
+
+def tokenize(message):
+    """
+    Split a message into normalized words.
+
+    @type   message:    unicode
+    @rtype: list of unicode
+    """
+    return [w for w in (normalize(w) for w in message.split()) if w]
+
+
+def expand(pattern):
+    """
+    Expand a pattern into every word sequence it matches, with wildcards left in place.
+
+    Optional groups ("[please] help") expand to sequences with and without their contents, and alternation groups
+    ("(hi|hello) there") expand to one sequence per alternative. Groups may be nested.
+
+    @type   pattern:    unicode
+
+    @raise  PatternError:   The pattern is malformed, or expands to too many sequences.
+    @rtype: list of tuple of unicode
+    """
+    return _expand(pattern.lower(), 0, None)[0]
+
+
+def _expand(pattern, pos, close):
+    """
+    Expand a pattern from pos up to the closing character of the current group.
+
+    @rtype: tuple of (list of tuple of unicode, int)
+    @return:    The expanded alternatives and the position just past the end of the group.
+    """
+    alternatives = []
+    sequences = [()]
+    word = []
+
+    def flush():
+        text = ''.join(word)
+        del word[:]
+        if text in ('*', '#', '_'):
+            return [s + (text,) for s in sequences]
+
+        text = normalize(text)
+        return [s + (text,) for s in sequences] if text else sequences
+
+    while pos < len(pattern):
+        char = pattern[pos]
+        pos += 1
+
+        if char in '([':
+            sequences = flush()
+            group, pos = _expand(pattern, pos, ')' if char == '(' else ']')
+            if char == '[':
+                group.append(())
+            sequences = [s + g for s in sequences for g in group]
+        elif char == close:
+            break
+        elif char == '|' and close:
+            alternatives.extend(flush())
+            sequences = [()]
+        elif char in ')]|':
+            raise PatternError('Unexpected {c} in pattern: {p}'.format(c=char, p=pattern))
+        elif char.isspace():
+            sequences = flush()
+        else:
+            word.append(char)
+
+        if len(sequences) > MAX_EXPANSIONS:
+            raise PatternError('Pattern expands to more than {m} sequences: {p}'.format(m=MAX_EXPANSIONS, p=pattern))
+    else:
+        if close:
+            raise PatternError('Unclosed group in pattern: {p}'.format(p=pattern))
+
+    alternatives.extend(flush())
+    return alternatives, pos
+
+
+class Response(object):
+    """
+    A compiled response template.
+    """
+    __slots__ = ('parts',)
+
+    def __init__(self, template):
+        """
+        @type   template:   unicode
+        @param  template:   Response text, with <star/> references to the text matched by the patterns wildcards.
+        """
+        self.parts = []
+        pos = 0
+        for match in STAR.finditer(template):
+            self.parts.append(template[pos:match.start()])
+            self.parts.append(int(match.group(1) or 1) - 1)
+            pos = match.end()
+
+        self.parts.append(template[pos:])
+
+    def render(self, stars):
+        """
+        @type   stars:  list of unicode
+        @rtype: unicode
+        """
+        text = []
+        for part in self.parts:
+            if isinstance(part, int):
+                part = stars[part] if part < len(stars) else ''
+            text.append(part)
+
+        return ''.join(text).strip()
+
+
+class Trigger(object):
+    """
+    A compiled trigger.
+    """
+    __slots__ = ('pattern', 'group', 'responses')
+
+    def __init__(self, pattern, group, responses):
+        """
+        @type   pattern:    unicode
+        @type   group:      unicode or None
+        @type   responses:  list of Response
+        """
+        self.pattern = pattern
+        self.group = group
+        self.responses = responses
+
+
+class Node(object):
+    """
+    A trie node. Literal words are looked up in children; wildcard edges are tried in WILDCARDS order.
+    """
+    __slots__ = ('children', 'wildcards', 'triggers')
+
+    def __init__(self):
+        self.children = {}
+        self.wildcards = {}
+        self.triggers = []
+
+
+class TrieLanguage(LanguageInterface):
+    """
+    Trigger engine that compiles patterns into a word trie.
+
+    Matching a message walks the trie one word at a time, so its cost depends on the length of the message rather than
+    the number of loaded triggers. Patterns support the AgentML wildcards (* for any words, # for numbers, _ for
+    alphabetic words), [optional] and (alternation|groups); responses support <star/> references.
+
+    Native language files are JSON documents with a list of triggers:
+        {"triggers": [{"pattern": "hello *", "group": null, "responses": ["Hi <star/>!"]}]}
+
+    AgentML (.aml) files are converted on load, see convert_file.
+    """
+    version = '1'
+
+    def __init__(self):
+        self._log = logging.getLogger('firefly.language.trie')
+        super(TrieLanguage, self).__init__()
+        self.root = Node()
+        self.triggers = 0
+
+    def add_trigger(self, pattern, responses, group=None):
+        """
+        @type   pattern:    unicode
+
+        @type   responses:  list of unicode
+        @param  responses:  Response templates. One is chosen at random for every reply.
+
+        @type   group:      unicode or None
+        @param  group:      Trigger group. Triggers only match when their group is one of the requested groups.
+
+        @raise  PatternError:   The pattern could not be compiled.
+        """
+        if isinstance(pattern, str):
+            pattern = unicode(pattern, 'utf-8')
+
+        trigger = Trigger(pattern, group, [Response(r) for r in responses])
+
+        sequences = expand(pattern)
+        if not all(sequences):
+            raise PatternError('Pattern can match an empty message: {p}'.format(p=pattern))
+
+        for sequence in sequences:
+            node = self.root
+            for word in sequence:
+                edges = node.wildcards if word in ('*', '#', '_') else node.children
+                node = edges.setdefault(word, Node())
+
+            node.triggers.append(trigger)
+
+        self.triggers += 1
+
+    def get_reply(self, message, client='localhost', groups=None):
+        if isinstance(message, str):
+            message = unicode(message, 'utf-8')
+
+        groups = groups or {None}
+        match = self._match(self.root, tokenize(message), 0, [], groups)
+        if not match:
+            return
+
+        trigger, stars = match
+        self._log.debug('Message matched pattern: %s', trigger.pattern)
+        return random.choice(trigger.responses).render(stars)
+
+    def _match(self, node, words, pos, stars, groups, failed=None):
+        """
+        Match the remaining words against a trie node. Literal words are preferred over wildcards, and wildcards
+        match as few words as possible.
+
+        @type   failed: set of (int, int)
+        @param  failed: (node id, position) pairs already known not to match, so patterns with several wildcards
+                        don't backtrack exponentially.
+
+        @rtype: tuple of (Trigger, list of unicode) or None
+        """
+        if pos == len(words):
+            for trigger in node.triggers:
+                if trigger.group in groups:
+                    return trigger, stars
+
+            return
+
+        failed = set() if failed is None else failed
+        if (id(node), pos) in failed:
+            return
+
+        child = node.children.get(words[pos])
+        if child:
+            match = self._match(child, words, pos + 1, stars, groups, failed)
+            if match:
+                return match
+
+        for wildcard, accepts in WILDCARDS:
+            child = node.wildcards.get(wildcard)
+            if not child:
+                continue
+
+            for end in range(pos + 1, len(words) + 1):
+                if not accepts(words[end - 1]):
+                    break
+
+                match = self._match(child, words, end, stars + [' '.join(words[pos:end])], groups, failed)
+                if match:
+                    return match
+
+        failed.add((id(node), pos))
+
+    def load_file(self, file_path):
+        self._log.debug('Loading file: %s', file_path)
+        if file_path.endswith('.aml'):
+            triggers = convert_file(file_path)
+        else:
+            with open(file_path) as f:
+                triggers = json.load(f)['triggers']
+
+        for trigger in triggers:
+            try:
+                self.add_trigger(trigger['pattern'], trigger['responses'], trigger.get('group'))
+            except PatternError as e:
+                self._log.warn('Skipping trigger in %s: %s', file_path, e)
+
+    def load_directory(self, dir_path):
+        self._log.debug('Loading directory: %s', dir_path)
+        for root, dirs, files in os.walk(dir_path):
+            dirs.sort()
+            for filename in sorted(files):
+                if filename.endswith(('.json', '.aml')):
+                    self.load_file(os.path.join(root, filename))
+
+    def get_state(self):
+        return self.root, self.triggers
+
+    def set_state(self, state):
+        self.root, self.triggers = state
+
+
+def _local_name(element):
+    """
+    @rtype: str or None
+    """
+    if not isinstance(element.tag, basestring):
+        return None
+
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def _template_text(element):
+    """
+    Serialize the contents of a template element, keeping only text and star references.
+
+    @raise  PatternError:   The template uses elements other than <star/>.
+    @rtype: unicode
+    """
+    text = [element.text or '']
+    for child in element:
+        if _local_name(child) != 'star':
+            raise PatternError('Unsupported template element <{t}>'.format(t=_local_name(child)))
+
+        index = child.get('index')
+        text.append('<star index="{i}"/>'.format(i=index) if index else '<star/>')
+        text.append(child.tail or '')
+
+    return ' '.join(''.join(text).split())
+
+
+def _template_responses(template):
+    """
+    Get the responses of a template element, expanding <random> items.
+
+    @rtype: list of unicode
+    """
+    randoms = [c for c in template if _local_name(c) == 'random']
+    if not randoms:
+        return [_template_text(template)]
+
+    if len(randoms) > 1 or len(template) > 1:
+        raise PatternError('Templates may only contain a single <random> element')
+
+    random_element = randoms[0]
+    prefix = template.text or ''
+    suffix = random_element.tail or ''
+    return [' '.join((prefix + _template_text(item) + suffix).split()) for item in random_element
+            if _local_name(item) == 'item']
+
+
+def _convert_trigger(element, group):
+    """
+    @rtype: dict
+    """
+    patterns = [c for c in element if _local_name(c) == 'pattern']
+    templates = [c for c in element if _local_name(c) == 'template']
+    unsupported = [_local_name(c) for c in element if _local_name(c) not in ('pattern', 'template', None)]
+
+    if len(patterns) != 1 or len(templates) != 1:
+        raise PatternError('Triggers must have exactly one pattern and template')
+
+    if unsupported:
+        raise PatternError('Unsupported trigger element <{t}>'.format(t=unsupported[0]))
+
+    pattern = patterns[0]
+    if len(pattern) or pattern.get('regex', '').lower() in ('true', '1', 'yes'):
+        raise PatternError('Regular expression and dynamic patterns are not supported')
+
+    return {'pattern': (pattern.text or '').strip(), 'group': group, 'responses': _template_responses(templates[0])}
+
+
+def convert_file(file_path):
+    """
+    Convert the triggers in an AgentML file to native triggers.
+
+    Only the subset of AgentML the trie engine supports is converted: plain patterns, optionally inside a <group>, and
+    templates made of text, <star/> references and <random> items. Anything else (topics, conditions, variables,
+    regular expression patterns, ...) is skipped with a warning.
+
+    @type   file_path:  str
+    @rtype: list of dict
+    """
+    log = logging.getLogger('firefly.language.trie')
+    triggers = []
+
+    def walk(element, group):
+        for child in element:
+            name = _local_name(child)
+            if name == 'group':
+                walk(child, child.get('name'))
+            elif name == 'trigger':
+                try:
+                    triggers.append(_convert_trigger(child, group))
+                except PatternError as e:
+                    log.warn('Skipping trigger in %s: %s', file_path, e)
+            elif name == 'topic':
+                log.warn('Skipping topic in %s: topics are not supported', file_path)
+
+    walk(ElementTree.parse(file_path).getroot(), None)
+    return triggers
+
+
+def convert_directory(source, destination):
+    """
+    Convert every AgentML file in a directory to a native language file with the same relative path.
+
+    @type   source:         str
+    @type   destination:    str
+
+    @rtype: list of str
+    @return:    The written files.
+    """
+    written = []
+    for root, dirs, files in os.walk(source):
+        for filename in sorted(files):
+            if not filename.endswith('.aml'):
+                continue
+
+            target_dir = os.path.normpath(os.path.join(destination, os.path.relpath(root, source)))
+            if not os.path.isdir(target_dir):
+                os.makedirs(target_dir, 0o755)
+
+            target = os.path.join(target_dir, filename[:-4] + '.json')
+            with open(target, 'w') as f:
+                json.dump({'triggers': convert_file(os.path.join(root, filename))}, f, indent=4)
+            written.append(target)
+
+    return written
+
+
+__LANGUAGE_CLASS__ = TrieLanguage
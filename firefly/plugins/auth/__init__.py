@@ -1,18 +1,20 @@
+import math
+
 from ircmessage import style
 
 from firefly import irc, PluginAbstract
-from firefly.errors import AuthAlreadyLoggedInError, AuthError
+from firefly.errors import AuthAlreadyLoggedInError, AuthError, AuthBusyError, AuthThrottledError
 
 
 class AuthPlugin(PluginAbstract):
 
     FIREFLY_IRC_PLUGIN_NAME = 'Auth'
 
-    def __init__(self, firefly):
+    def __init__(self, host):
         """
-        @type   firefly:    firefly.FireflyIRC
+        @type   host:   firefly.PluginHost
         """
-        super(AuthPlugin, self).__init__(firefly)
+        super(AuthPlugin, self).__init__(host)
 
     @irc.command()
     def status(self, args):
@@ -26,12 +28,12 @@ class AuthPlugin(PluginAbstract):
             """
             @type   response:   firefly.containers.Response
             """
-            user = self.firefly.auth.check(response.request.source)
+            user = response.firefly.auth.check(response.request.source)
             if not user:
                 response.add_message('You are not logged in.')
                 return
 
-            response.add_message('You are currently logged in as {user}.'.format(user=style(user.email, bold=True)))
+            response.add_message(u'You are currently logged in as {user}.'.format(user=style(user.email, bold=True)))
 
         return _status
 
@@ -49,16 +51,26 @@ class AuthPlugin(PluginAbstract):
             """
             @type   response:   firefly.containers.Response
             """
-            try:
-                self.firefly.auth.attempt(response.request.source, args.email, args.password)
-            except AuthAlreadyLoggedInError as e:
-                response.add_message('You are already logged in to an account.')
-                return
-            except AuthError:
-                response.add_message('Login failed; An invalid email or password was provided.')
-                return
-
-            response.add_message('You have successfully logged in as {user}.'.format(user=style(args.email, bold=True)))
+            def _success(user):
+                response.add_message(
+                    u'You have successfully logged in as {user}.'.format(user=style(user.email, bold=True))
+                )
+
+            def _failed(failure):
+                failure.trap(AuthError)
+                if failure.check(AuthAlreadyLoggedInError):
+                    response.add_message('You are already logged in to an account.')
+                elif failure.check(AuthBusyError):
+                    response.add_message('Too many logins are being processed right now, please try again shortly.')
+                elif failure.check(AuthThrottledError):
+                    response.add_message('Too many failed login attempts; Please wait {s} seconds and try again.'
+                                         .format(s=int(math.ceil(failure.value.retry_after))))
+                else:
+                    response.add_message('Login failed; An invalid email or password was provided.')
+
+            d = response.firefly.auth.attempt(response.request.source, args.email, args.password)
+            d.addCallbacks(_success, _failed)
+            return d
 
         return _login
 
@@ -74,7 +86,7 @@ class AuthPlugin(PluginAbstract):
             """
             @type   response:   firefly.containers.Response
             """
-            if self.firefly.auth.logout(response.request.source):
+            if response.firefly.auth.logout(response.request.source):
                 response.add_message('You have been logged out successfully.')
             else:
                 response.add_message('You are not logged in.')
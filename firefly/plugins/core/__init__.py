@@ -3,3 +3,68 @@ __copyright__  = 'Copyright 2015, Makoto Fujimoto'
 __license__    = "MIT"
 __version__    = "0.1"
 __maintainer__ = "Makoto Fujimoto"
+
+from firefly import irc, PluginAbstract
+from firefly.errors import NoSuchPluginError, PluginError
+
+
+class Core(PluginAbstract):
+    """
+    Core administration commands.
+    """
+    FIREFLY_IRC_PLUGIN_CONFIG = None
+
+    @irc.command('reload', permission='admin')
+    def reload_plugin(self, args):
+        """
+        Reloads a plugin from disk.
+        @type   args:   firefly.args.ArgumentParser
+        """
+        args.description = 'Reloads a plugin from disk without reconnecting to any servers.'
+        args.add_argument('plugin', help='The name of the plugin to reload.')
+
+        def _reload(args, response):
+            """
+            @type   response:   firefly.containers.Response
+            """
+            try:
+                self.host.registry.reload_plugin(args.plugin)
+            except NoSuchPluginError:
+                response.add_message(u'There is no plugin named {p}.'.format(p=args.plugin))
+                return
+            except PluginError as e:
+                response.add_message(u'Unable to reload {p}: {e}'.format(p=args.plugin, e=e.message))
+                return
+
+            response.add_message(u'The {p} plugin has been reloaded.'.format(p=args.plugin))
+
+        return _reload
+
+    # Named so as not to override PluginAbstract.unload
+    @irc.command('unload', permission='admin')
+    def unload_plugin(self, args):
+        """
+        Unloads a plugin.
+        @type   args:   firefly.args.ArgumentParser
+        """
+        args.description = 'Unloads a plugin until it is reloaded.'
+        args.add_argument('plugin', help='The name of the plugin to unload.')
+
+        def _unload(args, response):
+            """
+            @type   response:   firefly.containers.Response
+            """
+            # We'd have no way of loading anything back again
+            if args.plugin.lower().strip() == self.name:
+                response.add_message('The {p} plugin can not be unloaded.'.format(p=self.name))
+                return
+
+            try:
+                self.host.registry.unbind_plugin(args.plugin)
+            except NoSuchPluginError:
+                response.add_message(u'There is no plugin named {p}.'.format(p=args.plugin))
+                return
+
+            response.add_message(u'The {p} plugin has been unloaded.'.format(p=args.plugin))
+
+        return _unload
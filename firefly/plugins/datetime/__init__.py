@@ -1,8 +1,15 @@
-import arrow
-
 from firefly import irc, PluginAbstract
 
 
+def now():
+    """
+    @rtype: arrow.Arrow
+    """
+    # Imported here so the plugin doesn't load arrow until a date is actually formatted
+    import arrow
+    return arrow.now()
+
+
 class DateTime(PluginAbstract):
 
     @irc.command()
@@ -18,7 +25,7 @@ class DateTime(PluginAbstract):
             """
             @type   response:   firefly.containers.Response
             """
-            msg = arrow.now().format('YYYY-MM-DD') if args.iso else arrow.now().format('MMMM D, YYYY')
+            msg = now().format('YYYY-MM-DD') if args.iso else now().format('MMMM D, YYYY')
             response.add_message(msg)
 
         return _date
@@ -36,7 +43,7 @@ class DateTime(PluginAbstract):
             """
             @type   response:   firefly.containers.Response
             """
-            msg = arrow.now().format('HH:mm:ss ZZ') if args.iso else arrow.now().format('h:mm A ZZ')
+            msg = now().format('HH:mm:ss ZZ') if args.iso else now().format('h:mm A ZZ')
             response.add_message(msg)
 
         return _time
@@ -54,7 +61,7 @@ class DateTime(PluginAbstract):
             """
             @type   response:   firefly.containers.Response
             """
-            msg = arrow.now().isoformat() if args.iso else arrow.now().format('MMMM D, YYYY - h:mm A ZZ')
+            msg = now().isoformat() if args.iso else now().format('MMMM D, YYYY - h:mm A ZZ')
             response.add_message(msg)
 
         return _datetime
@@ -73,7 +80,7 @@ class DateTime(PluginAbstract):
             """
             @type   response:   firefly.containers.Response
             """
-            msg = arrow.now().format(args.format)
+            msg = now().format(args.format)
             if msg:
                 response.add_message(msg)
 
@@ -1,25 +1,121 @@
 import argparse
+import os
+import time
 
 from ircmessage import style
+from twisted.internet import defer, threads
 
 from firefly import irc, PluginAbstract
-from .webster import CollegiateDictionary, WordNotFoundException, InvalidAPIKeyException
+from firefly.cache import LRUCache, SingleFlight
+from .local import LocalDictionary, IndexOutOfDateException
+from .store import DefinitionStore
+from .webster import CollegiateDictionary, WordNotFoundException, InvalidAPIKeyException, InvalidResponseException
 
 
 class Dictionary(PluginAbstract):
     """
     If you don't know what a dictionary is, look it up in the dictionary
     """
-    def __init__(self, firefly):
+    FIREFLY_IRC_LAZY_LOAD = True
+
+    def __init__(self, host):
         """
-        @type   firefly:    firefly.FireflyIRC
+        @type   host:   firefly.PluginHost
         """
-        super(Dictionary, self).__init__(firefly)
+        super(Dictionary, self).__init__(host)
+        self._flights = SingleFlight()
+        self.dictionary = None
+        self._generation = 0
+        self._load_settings()
+        self._open_cache()
+
+    def _load_settings(self):
         self.api_key = self.config.get('MerriamWebster', 'APIKey')
         self.max_default = self.config.getint('Dictionary', 'DefaultMaxDefinitions')
         self.max_results = self.config.getint('Dictionary', 'MaxDefinitions')
+        self._open_dictionary()
+
+        self.cache_ttl = self.config.getint('Cache', 'TTL')
+        self.negative_ttl = self.config.getint('Cache', 'NegativeTTL')
+
+    def _open_dictionary(self):
+        """
+        Open the configured dictionary backend, falling back to the Merriam-Webster API if the local dictionary can't be
+        opened. If the local dictionary has to be indexed first, it's indexed in a thread and Merriam-Webster is used
+        until it's ready.
+        """
+        self._close_dictionary()
+        self.local = False
+        backend = self.config.get('Dictionary', 'Backend').strip().lower()
+
+        if backend == 'local':
+            path = os.path.join(self.data_path, os.path.expanduser(self.config.get('Local', 'Path')))
+            try:
+                self.dictionary = LocalDictionary(path, build=False)
+                self.local = True
+                return
+            except IndexOutOfDateException:
+                self._log.info('Indexing the local dictionary %s, using Merriam-Webster until it\'s ready', path)
+                self._build_index(path)
+            except (IOError, OSError) as e:
+                self._log.error('Unable to open the local dictionary %s, using Merriam-Webster instead: %s', path, e)
+        elif backend != 'webster':
+            self._log.error('Unknown dictionary backend %s, using Merriam-Webster instead', backend)
+
         self.dictionary = CollegiateDictionary(self.api_key)
 
+    def _build_index(self, path):
+        """
+        Index the local dictionary in a thread, switching to it once it's ready unless the dictionary has been reopened
+        or closed since.
+
+        @type   path:   str
+        """
+        generation = self._generation
+
+        def _built(dictionary):
+            if generation != self._generation:
+                dictionary.close()
+                return
+
+            self._log.info('Finished indexing the local dictionary %s', path)
+            self.dictionary = dictionary
+            self.local = True
+
+        def _failed(failure):
+            failure.trap(IOError, OSError)
+            if generation == self._generation:
+                self._log.error('Unable to index the local dictionary %s, using Merriam-Webster instead: %s',
+                                path, failure.value)
+
+        threads.deferToThread(LocalDictionary, path).addCallbacks(_built, _failed)
+
+    def _close_dictionary(self):
+        # Discards any local dictionary still being indexed
+        self._generation += 1
+        if isinstance(self.dictionary, LocalDictionary):
+            self.dictionary.close()
+        self.dictionary = None
+
+    def _open_cache(self):
+        """
+        Open our definition caches. Recently looked up words are kept in memory, and every looked up word is kept on
+        disk so lookups survive restarts.
+        """
+        self.memory_cache = LRUCache(self.config.getint('Cache', 'MemoryEntries'))
+        self.disk_cache = DefinitionStore(os.path.join(self.data_path, 'definitions'))
+
+    def reload_configuration(self, config):
+        super(Dictionary, self).reload_configuration(config)
+        self._load_settings()
+
+    def unload(self):
+        super(Dictionary, self).unload()
+        self._close_dictionary()
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+            self.disk_cache = None
+
     def _get_definitions(self, word, max_definitions=3):
         """
         Fetch definitions for the specified word
@@ -29,23 +125,141 @@ class Dictionary(PluginAbstract):
             max_definitions(int): The maximum number of definitions to retrieve. Defaults to 3
 
         Returns:
-            list
+            Deferred: Fires with a tuple of the definitions and, if none were found, spelling suggestions
+        """
+        d = self._lookup(word.strip().lower())
+
+        def _results(entry):
+            expires, definitions, suggestions = entry
+            return definitions[:max_definitions], suggestions
+
+        def _error(failure):
+            failure.trap(InvalidAPIKeyException, InvalidResponseException, IOError)
+            if failure.check(InvalidAPIKeyException):
+                self._log.error('Invalid API key defined in Dictionary configuration')
+            elif failure.check(InvalidResponseException):
+                self._log.warn('Invalid response to the lookup of %s: %s', word, failure.value)
+            else:
+                self._log.warn('Unable to look up the definition of %s: %s', word, failure.value)
+            return [], []
+
+        return d.addCallbacks(_results, _error)
+
+    def _lookup(self, word):
+        """
+        Look up a word, from our caches if possible. Concurrent lookups of the same word share a single request.
+
+        @type   word:   str
+        @param  word:   The normalized word.
+
+        @rtype:     Deferred
+        @return:    Fires with a cache entry tuple of (expires, definitions, suggestions).
+        """
+        key = word.encode('utf-8') if isinstance(word, unicode) else word
+
+        # Local lookups are quicker than our caches would be, so they're neither cached nor deferred to a thread
+        if self.local:
+            d = defer.maybeDeferred(self._fetch_definitions, self.dictionary, key, self.max_results)
+            return d.addCallback(lambda result: (None,) + result)
+
+        entry = self.memory_cache.get(key)
+        if entry is None and self.disk_cache is not None:
+            d = self.disk_cache.get(key)
+            d.addCallback(self._remember, key)
+        else:
+            d = defer.succeed(entry)
+
+        return d.addCallback(self._fetch_expired, key)
+
+    def _remember(self, entry, word):
+        """
+        Keep an entry read from the disk cache in memory.
+
+        @type   entry:  tuple of (float, list, list) or None
+        @type   word:   str
+        """
+        if entry is not None:
+            self.memory_cache.set(word, entry)
+
+        return entry
+
+    def _fetch_expired(self, entry, word):
+        """
+        @type   entry:  tuple of (float, list, list) or None
+        @param  entry:  The cached entry, if there is one.
+
+        @type   word:   str
+        @rtype: tuple of (float, list, list) or Deferred
+        """
+        if entry is not None and entry[0] > time.time():
+            self._log.debug('Definitions of %s cached', word)
+            return entry
+
+        return self._flights.call(word, self._fetch, word)
+
+    def _fetch(self, word):
+        """
+        Fetch a word from the dictionary API, without blocking the reactor, and cache the result.
+
+        @type   word:   str
+        @rtype: Deferred
         """
         self._log.info('Looking up the definition of: ' + word)
-        # Attempt to fetch the words definition
+        d = threads.deferToThread(self._fetch_definitions, self.dictionary, word, self.max_results)
+        d.addCallback(self._cache, word)
+        return d
+
+    @staticmethod
+    def _fetch_definitions(dictionary, word, limit):
+        """
+        Runs in a thread for the Merriam-Webster API. The API request and the XML parsing (entries are parsed as the
+        response streams in) both happen here.
+
+        @type   dictionary: CollegiateDictionary or LocalDictionary
+        @type   word:       str
+
+        @type   limit:      int
+        @param  limit:      Stop reading the response once this many definitions have been collected.
+
+        @rtype: tuple of (list, list)
+        """
+        definitions = []
+        entries = dictionary.lookup(word)
         try:
-            definitions = []
-            for entry in self.dictionary.lookup(word):
+            for entry in entries:
                 for definition, examples in entry.senses:
                     definitions.append((entry.word, entry.function, definition))
-        except WordNotFoundException:
-            self._log.info('No definition for {word} found'.format(word=word))
-            definitions = []
-        except InvalidAPIKeyException:
-            self._log.error('Invalid API key defined in Dictionary configuration')
-            definitions = []
 
-        return definitions[:max_definitions]
+                if len(definitions) >= limit:
+                    break
+        except InvalidResponseException:
+            # A malformed response says nothing about the word, so it mustn't be cached as not found
+            raise
+        except WordNotFoundException as e:
+            return [], e.suggestions
+        finally:
+            entries.close()
+
+        return definitions[:limit], []
+
+    def _cache(self, result, word):
+        """
+        @type   result: tuple of (list, list)
+        @type   word:   str
+
+        @rtype: tuple of (float, list, list)
+        """
+        definitions, suggestions = result
+        if not definitions:
+            self._log.info('No definition for %s found', word)
+
+        entry = (time.time() + (self.cache_ttl if definitions else self.negative_ttl), definitions, suggestions)
+        self.memory_cache.set(word, entry)
+
+        if self.disk_cache is not None:
+            self.disk_cache.set(word, entry)
+
+        return entry
 
     @irc.command()
     def define(self, args):
@@ -64,25 +278,37 @@ class Dictionary(PluginAbstract):
             @type   response:   firefly.containers.Response
             """
             # Fetch our definitions
-            self._log.info('Fetching up to {max} definitions for the word {word}'
+            self._log.info(u'Fetching up to {max} definitions for the word {word}'
                            .format(max=args.results, word=args.word))
-            definitions = self._get_definitions(args.word, args.results)
+            d = self._get_definitions(args.word, args.results)
+            d.addCallback(_respond, args, response)
+            return d
+
+        def _respond(result, args, response):
+            """
+            @type   result:     tuple of (list, list)
+            @type   args:       argparse.Namespace
+            @type   response:   firefly.containers.Response
+            """
+            definitions, suggestions = result
 
             if not definitions:
-                response.add_message(
-                    "Sorry, I couldn't find any definitions for {word}.".format(word=style(args.word, bold=True))
-                )
+                message = u"Sorry, I couldn't find any definitions for {word}.".format(word=style(args.word, bold=True))
+                if suggestions:
+                    message += u' Did you mean: {s}?'.format(s=u', '.join(suggestions[:5]))
+                response.add_message(message)
+                return
 
             # Format our definitions
             formatted_definitions = []
             for index, definition in enumerate(definitions):
                 if not formatted_definitions:
-                    formatted_definitions.append("{word} ({pos}) {key} {definition}"
+                    formatted_definitions.append(u"{word} ({pos}) {key} {definition}"
                                                  .format(word=style(args.word, bold=True),
                                                          pos=style(definition[1], italics=True),
                                                          key=style('1:', bold=True), definition=definition[2]))
                 else:
-                    formatted_definitions.append("{key} {definition}"
+                    formatted_definitions.append(u"{key} {definition}"
                                                  .format(key=style(str(index + 1), bold=True),
                                                          definition=definition[2]))
 
@@ -0,0 +1,278 @@
+import logging
+import mmap
+import os
+
+from firefly.files import atomic_write
+from .webster import CollegiateDictionaryEntry, WordNotFoundException, WordSense
+
+INDEX_VERSION = 1
+_INDEX_MAGIC = 'firefly-dictionary-index'
+
+
+class IndexOutOfDateException(IOError):
+    """
+    Raised when a dictionary's index has to be built before it can be opened, and building it wasn't allowed.
+    """
+    pass
+
+
+def normalize(word):
+    """
+    Normalize a word into an index key.
+
+    @type   word:   str or unicode
+    @rtype: str
+    """
+    if not isinstance(word, unicode):
+        word = word.decode('utf-8', 'replace')
+
+    return u' '.join(word.lower().split()).encode('utf-8')
+
+
+class LocalDictionary(object):
+    """
+    Looks up definitions in a local dictionary file instead of a remote API.
+
+    The dictionary is a UTF-8 text file with one definition per line, in tab separated columns: the word, its part of
+    speech, the definition, and optionally usage examples separated by " | ". Blank lines and lines starting with # are
+    ignored. Exports of WordNet or DICT databases are easily converted to this format.
+
+    The first time a dictionary is opened, a sorted index of the offsets of each word's definitions is written next to
+    it (or to index_path). The index is memory mapped and binary searched, so lookups only touch a few pages of it no
+    matter how large the dictionary is. It's rebuilt whenever the dictionary file changes.
+
+    Building the index reads the whole dictionary, so callers that mustn't block (i.e. the reactor) should open the
+    dictionary with build disabled, and build it in a thread if IndexOutOfDateException is raised.
+    """
+    def __init__(self, path, index_path=None, build=True):
+        """
+        @type   path:       str
+        @param  path:       Path to the dictionary file.
+
+        @type   index_path: str or None
+        @param  index_path: Path to the index file. Defaults to the dictionary path with an .index extension.
+
+        @type   build:      bool
+        @param  build:      Build the index if it's missing or out of date.
+
+        @raise  IndexOutOfDateException:    Raised if the index is missing or out of date, and build is False.
+        @raise  IOError:                    Raised if the dictionary file can not be read.
+        """
+        self._log = logging.getLogger('firefly.plugins.dictionary.local')
+        self.path = path
+        self.index_path = index_path or path + '.index'
+
+        self._data = self._index = None
+        self._data_file = open(path, 'rb')
+        try:
+            self._data = self._map(self._data_file)
+            self._index_file, self._index, self._start = self._open_index(build)
+        except Exception:
+            self.close()
+            raise
+
+    @staticmethod
+    def _map(f):
+        """
+        @type   f:  file
+        @rtype: mmap.mmap or str
+        """
+        # Empty files can't be mapped, but nothing can be read from them anyway
+        if not os.fstat(f.fileno()).st_size:
+            return ''
+
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _signature(self):
+        """
+        @rtype:     str
+        @return:    The index header line matching the current dictionary file.
+        """
+        stat = os.fstat(self._data_file.fileno())
+        return '{m}\t{v}\t{s}\t{t}\n'.format(m=_INDEX_MAGIC, v=INDEX_VERSION, s=stat.st_size, t=int(stat.st_mtime))
+
+    def _open_index(self, build=True):
+        """
+        Open our index, building it first if it's missing or out of date.
+
+        @type   build:  bool
+        @param  build:  Raise IndexOutOfDateException instead of building the index.
+
+        @rtype: tuple of (file, mmap.mmap, int)
+        """
+        signature = self._signature()
+        try:
+            index_file = open(self.index_path, 'rb')
+        except IOError:
+            index_file = None
+
+        if index_file and index_file.readline() != signature:
+            index_file.close()
+            index_file = None
+
+        if not index_file:
+            if not build:
+                raise IndexOutOfDateException('The index of {p} is missing or out of date'.format(p=self.path))
+
+            self.build_index(signature)
+            index_file = open(self.index_path, 'rb')
+
+        return index_file, self._map(index_file), len(signature)
+
+    def build_index(self, signature=None):
+        """
+        Write the index of our dictionary file.
+
+        Each line of the index holds a word's key and the offsets of its definitions in the dictionary file, and lines
+        are sorted by key so they can be binary searched.
+
+        @type   signature:  str or None
+        @param  signature:  The header line of the index.
+        """
+        self._log.info('Indexing dictionary %s', self.path)
+        offsets = {}
+        offset = 0
+        self._data_file.seek(0)
+
+        for line in self._data_file:
+            if line.strip() and not line.startswith('#'):
+                offsets.setdefault(normalize(line.split('\t', 1)[0]), []).append(offset)
+            offset += len(line)
+
+        lines = [signature or self._signature()]
+        for key in sorted(offsets):
+            lines.append('{k}\t{o}\n'.format(k=key, o=','.join(str(o) for o in offsets[key])))
+
+        atomic_write(self.index_path, ''.join(lines))
+        self._log.info('Indexed %d words from %s', len(offsets), self.path)
+
+    def _line_at(self, position):
+        """
+        @type   position:   int
+        @param  position:   The start of a line in the index.
+
+        @rtype:     tuple of (str, str, int)
+        @return:    The key and offsets of the line, and the start of the next line.
+        """
+        end = self._index.find('\n', position)
+        end = len(self._index) if end == -1 else end
+        key, __, offsets = self._index[position:end].partition('\t')
+        return key, offsets, end + 1
+
+    def _search(self, key):
+        """
+        Binary search the index.
+
+        @type   key:    str
+
+        @rtype:     int
+        @return:    The start of the first line with a key not less than key.
+        """
+        low, high = self._start, len(self._index)
+        # low and high are always the start of a line (or the end of the index)
+        while low < high:
+            middle = (low + high) // 2
+            start = self._index.rfind('\n', low, middle) + 1 or low
+            line_key, __, end = self._line_at(start)
+
+            if line_key < key:
+                low = end
+            else:
+                high = start
+
+        return low
+
+    def _suggestions(self, key, position, limit=5):
+        """
+        Get the words next to where a key would be in the index which share a prefix with it.
+
+        @type   key:        str
+        @type   position:   int
+        @param  position:   The position returned by _search for the key.
+
+        @rtype: list of unicode
+        """
+        prefix = key[:max(1, min(3, len(key) - 1))]
+
+        # Words before the key, nearest first
+        before = []
+        end = position
+        while end > self._start and len(before) < limit:
+            start = self._index.rfind('\n', self._start, end - 1) + 1 or self._start
+            word = self._line_at(start)[0]
+            if not word.startswith(prefix):
+                break
+            before.append(word)
+            end = start
+
+        # And after it
+        after = []
+        while position < len(self._index) and len(after) < limit:
+            word, __, position = self._line_at(position)
+            if not word.startswith(prefix):
+                break
+            after.append(word)
+
+        # Take words from both sides evenly, unless one side runs out
+        count = min(len(before), max(limit // 2, limit - len(after)))
+        words = list(reversed(before[:count])) + after[:limit - count]
+        return [word.decode('utf-8', 'replace') for word in words]
+
+    def definition_offsets(self, word):
+        """
+        @type   word:   str or unicode
+
+        @rtype:     list of int
+        @return:    Offsets of the word's definitions in the dictionary file.
+
+        @raise  WordNotFoundException:  Raised, with spelling suggestions, if the word is not in the dictionary.
+        """
+        key = normalize(word)
+        position = self._search(key)
+        line_key, offsets, __ = self._line_at(position) if position < len(self._index) else (None, '', 0)
+
+        if line_key != key:
+            raise WordNotFoundException(word, self._suggestions(key, position))
+
+        return [int(offset) for offset in offsets.split(',')]
+
+    def lookup(self, word):
+        """
+        Look up a word, like the Merriam-Webster API wrappers do.
+
+        @type   word:   str or unicode
+
+        @rtype:     generator of CollegiateDictionaryEntry
+        @return:    An entry for each run of definitions with the same part of speech, in dictionary order.
+
+        @raise  WordNotFoundException:  Raised, with spelling suggestions, if the word is not in the dictionary.
+        """
+        entry = None
+        for offset in self.definition_offsets(word):
+            end = self._data.find('\n', offset)
+            columns = self._data[offset:None if end == -1 else end].rstrip('\r').decode('utf-8', 'replace').split('\t')
+            headword, function, definition = (columns + [u'', u''])[:3]
+            examples = [e.strip() for e in columns[3].split(u'|') if e.strip()] if len(columns) > 3 else []
+
+            # Consecutive definitions with the same part of speech make up one entry
+            if entry is None or entry.function != (function or None):
+                if entry is not None:
+                    yield entry
+
+                entry = CollegiateDictionaryEntry(word, {
+                    'headword': headword, 'functional_label': function or None, 'pronunciations': [],
+                    'inflections': [], 'senses': [], 'sound_fragments': [], 'illustration_fragments': []
+                })
+            entry.senses.append(WordSense(definition.strip(), examples))
+
+        if entry is not None:
+            yield entry
+
+    def close(self):
+        for mapped in (self._data, self._index):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+        for f in (self._data_file, getattr(self, '_index_file', None)):
+            if f:
+                f.close()
@@ -0,0 +1,213 @@
+import logging
+import os
+import shelve
+import time
+
+# Files the dbm backends may keep a shelf in, as suffixes of the shelf path
+DBM_SUFFIXES = ('', '.db', '.dat', '.dir', '.bak', '.pag')
+
+
+class DefinitionStore(object):
+    """
+    Looked up definitions cached on disk, so lookups survive restarts.
+
+    The underlying shelf is only ever used from a single worker thread, so disk reads and writes never block the
+    reactor and never race each other. Writes are synced to disk at most once every sync_interval seconds, and expired
+    definitions are pruned when the store is opened and then at most once every prune_interval seconds.
+    """
+    def __init__(self, path, sync_interval=30, prune_interval=60 * 60, reactor=None, pool=None, clock=time.time):
+        """
+        @type   path:           str
+        @param  path:           Path of the shelf, without any extension the dbm backend adds.
+
+        @type   sync_interval:  float
+        @param  sync_interval:  Seconds to batch writes for before syncing them to disk.
+
+        @type   prune_interval: float
+        @param  prune_interval: Seconds between pruning expired definitions.
+
+        @param  reactor:        The reactor to schedule syncs on. Defaults to the global reactor.
+
+        @type   pool:           twisted.python.threadpool.ThreadPool or None
+        @param  pool:           The thread pool to use the shelf from. It must have a single thread. Defaults to a new
+                                pool, stopped when the store is closed.
+
+        @type   clock:          callable
+        """
+        self._log = logging.getLogger('firefly.plugins.dictionary.store')
+        self.path = path
+        self.sync_interval = sync_interval
+        self.prune_interval = prune_interval
+        self._clock = clock
+
+        if reactor is None:
+            from twisted.internet import reactor
+        self._reactor = reactor
+
+        if pool is None:
+            from twisted.python.threadpool import ThreadPool
+            pool = ThreadPool(1, 1, 'firefly-dictionary-store')
+        self._pool = pool
+        self._pool.start()
+        self._shutdown_trigger = reactor.addSystemEventTrigger('during', 'shutdown', self.close)
+
+        self._shelf = None
+        self._dirty = False
+        self._pruned = None
+        self._sync_call = None
+
+        self._run(self._open)
+
+    def _run(self, func, *args):
+        """
+        Call a function in our worker thread.
+
+        @rtype: twisted.internet.defer.Deferred
+        """
+        from twisted.internet import threads
+        return threads.deferToThreadPool(self._reactor, self._pool, func, *args)
+
+    def get(self, key):
+        """
+        @type   key:    str
+
+        @rtype:     twisted.internet.defer.Deferred
+        @return:    Fires with the cached entry, or None if the key is not cached.
+        """
+        return self._run(self._get, key)
+
+    def set(self, key, entry):
+        """
+        Cache an entry. The first element of an entry must be the time it expires at.
+
+        @type   key:    str
+        @type   entry:  tuple
+
+        @rtype: twisted.internet.defer.Deferred
+        """
+        d = self._run(self._set, key, entry)
+        if not self._sync_call:
+            self._sync_call = self._reactor.callLater(self.sync_interval, self.sync)
+
+        return d
+
+    def sync(self):
+        """
+        Write any batched writes to disk, pruning expired entries if they are due to be.
+
+        @rtype: twisted.internet.defer.Deferred
+        """
+        if self._sync_call and self._sync_call.active():
+            self._sync_call.cancel()
+        self._sync_call = None
+
+        return self._run(self._sync)
+
+    def close(self):
+        """
+        Sync and close the shelf, then stop our worker thread. Waits for any pending reads and writes to finish.
+        """
+        if not self._pool:
+            return
+
+        if self._sync_call and self._sync_call.active():
+            self._sync_call.cancel()
+        self._sync_call = None
+
+        self._pool.callInThread(self._close)
+        self._pool.stop()
+        self._pool = None
+
+        if self._shutdown_trigger:
+            self._reactor.removeSystemEventTrigger(self._shutdown_trigger)
+            self._shutdown_trigger = None
+
+    ################################
+    # Worker thread                #
+    ################################
+
+    def _open(self):
+        try:
+            self._shelf = shelve.open(self.path, protocol=2)
+        except Exception:
+            self._log.exception('Unable to open the definition cache %s, definitions will only be cached in memory',
+                                self.path)
+            return
+
+        self._prune()
+
+    def _get(self, key):
+        if self._shelf is None:
+            return None
+
+        try:
+            return self._shelf.get(key)
+        except Exception:
+            self._log.exception('Unable to read %s from the definition cache', key)
+
+    def _set(self, key, entry):
+        if self._shelf is None:
+            return
+
+        try:
+            self._shelf[key] = entry
+            self._dirty = True
+        except Exception:
+            self._log.exception('Unable to write %s to the definition cache', key)
+
+    def _sync(self):
+        if self._shelf is None:
+            return
+
+        if self._pruned is None or self._clock() - self._pruned >= self.prune_interval:
+            self._prune()
+
+        if self._dirty:
+            try:
+                self._shelf.sync()
+                self._dirty = False
+            except Exception:
+                self._log.exception('Unable to sync the definition cache')
+
+    def _prune(self):
+        """
+        Remove expired entries, and compact the shelf if any were removed.
+        """
+        self._pruned = self._clock()
+        try:
+            live = {}
+            for key, entry in self._shelf.iteritems():
+                if entry[0] > self._pruned:
+                    live[key] = entry
+
+            expired = len(self._shelf) - len(live)
+            if not expired:
+                return
+
+            # Deleted entries still take up space in some dbm backends (dumbdbm never reclaims it), so the remaining
+            # entries are written to a new shelf instead. It's only a cache, so losing it to a crash part way through
+            # isn't a problem.
+            self._shelf.close()
+            self._shelf = None
+            for suffix in DBM_SUFFIXES:
+                if os.path.isfile(self.path + suffix):
+                    os.remove(self.path + suffix)
+
+            self._shelf = shelve.open(self.path, flag='n', protocol=2)
+            self._shelf.update(live)
+            self._shelf.sync()
+            self._dirty = False
+            self._log.info('Pruned %d expired definitions from the definition cache, %d remain', expired, len(live))
+        except Exception:
+            self._log.exception('Unable to prune the definition cache')
+
+    def _close(self):
+        if self._shelf is None:
+            return
+
+        try:
+            self._shelf.close()
+        except Exception:
+            self._log.exception('Unable to close the definition cache')
+
+        self._shelf = None
@@ -1,7 +1,6 @@
 # -*- encoding: utf-8 -*-
 
 import re
-import xml.etree.cElementTree as ElementTree
 from abc import ABCMeta, abstractmethod, abstractproperty
 from urllib import quote, quote_plus, urlopen
 
@@ -14,9 +13,9 @@ class WordNotFoundException(KeyError):
         if suggestions is None:
             suggestions = []
         self.suggestions = suggestions
-        message = "'{0}' not found.".format(word)
+        message = u"'{0}' not found.".format(word)
         if suggestions:
-            message = "{0} Try: {1}".format(message, ", ".join(suggestions))
+            message = u"{0} Try: {1}".format(message, ", ".join(suggestions))
         KeyError.__init__(self, message, *args, **kwargs)
 
 
@@ -24,7 +23,7 @@ class InvalidResponseException(WordNotFoundException):
     def __init__(self, word, *args, **kwargs):
         self.word = word
         self.suggestions = []
-        message = "{0} not found. (Malformed XML from server).".format(word)
+        message = u"{0} not found. (Malformed XML from server).".format(word)
         KeyError.__init__(self, message, *args, **kwargs)
 
 
@@ -32,6 +31,46 @@ class InvalidAPIKeyException(Exception):
     pass
 
 
+# Ampersands that don't start an entity reference. The API doesn't always escape them.
+_BARE_AMPERSAND = re.compile(r'&(?!(?:amp|lt|gt|quot|apos|#[0-9]+|#x[0-9a-fA-F]+);)')
+# The longest entity reference we escape around (&#x10FFFF;)
+_MAX_ENTITY = 10
+
+
+class _EscapingReader(object):
+    """ File-like wrapper that escapes bare ampersands as the response is
+    streamed to the parser.
+
+    An ampersand near the end of a read may be the start of an entity that
+    continues in the next read, so it is held back until the next read.
+
+    """
+
+    def __init__(self, stream, head_size=1024):
+        self._stream = stream
+        self._pending = ''
+        self._head_size = head_size
+        # The start of the response, to recognise non-XML error messages
+        self.head = ''
+
+    def read(self, size=16 * 1024):
+        while True:
+            chunk = self._stream.read(size)
+            if len(self.head) < self._head_size:
+                self.head += chunk[:self._head_size - len(self.head)]
+
+            data, self._pending = self._pending + chunk, ''
+            if not chunk:
+                return _BARE_AMPERSAND.sub('&amp;', data)
+
+            amp = data.rfind('&', max(0, len(data) - _MAX_ENTITY))
+            if amp != -1 and ';' not in data[amp:]:
+                data, self._pending = data[:amp], data[amp:]
+
+            if data:
+                return _BARE_AMPERSAND.sub('&amp;', data)
+
+
 class MWApiWrapper:
     """ Defines an interface for wrappers to Merriam Webster web APIs. """
 
@@ -52,9 +91,14 @@ class MWApiWrapper:
         pass
 
     @abstractmethod
-    def parse_xml(root, word):
+    def parse_entry(self, entry, word):
+        """ Returns an entry object for an <entry> element. """
         pass
 
+    def parse_xml(self, root, word):
+        for entry in root.findall('entry'):
+            yield self.parse_entry(entry, word)
+
     def request_url(self, word):
         """ Returns the target url for an API GET request (w/ API key).
 
@@ -69,30 +113,65 @@ class MWApiWrapper:
 
         if self.key is None:
             raise InvalidAPIKeyException("API key not set")
+        if isinstance(word, unicode):
+            word = word.encode('utf-8')
         qstring = "{0}?key={1}".format(quote(word), quote_plus(self.key))
         return ("{0}/xml/{1}").format(self.base_url, qstring)
 
     def lookup(self, word):
+        """ Returns a generator of the entries for word.
+
+        The response is parsed as it is read, and each entry is yielded as
+        soon as it has been parsed. Closing the generator early (e.g. by
+        breaking out of a loop over it) stops reading the response.
+
+        Raises WordNotFoundException with spelling suggestions if the word
+        has no entries.
+
+        """
         response = self.urlopen(self.request_url(word))
-        data = response.read()
         try:
-            root = ElementTree.fromstring(data)
+            for entry in self._iterparse(response, word):
+                yield entry
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+
+    def _iterparse(self, stream, word):
+        import xml.etree.cElementTree as ElementTree
+
+        reader = _EscapingReader(stream)
+        suggestions = []
+        found = False
+        depth = 0
+
+        try:
+            for event, elem in ElementTree.iterparse(reader, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    continue
+
+                # Only the children of the root element are of interest
+                depth -= 1
+                if depth != 1:
+                    continue
+
+                if elem.tag == 'entry':
+                    found = True
+                    yield self.parse_entry(elem, word)
+                elif elem.tag == 'suggestion' and elem.text:
+                    suggestions.append(elem.text)
+
+                # Everything we need from the element has been parsed
+                elem.clear()
         except ElementTree.ParseError:
-            if re.search("Invalid API key", data):
+            if re.search("Invalid API key", reader.head):
                 raise InvalidAPIKeyException()
-            data = re.sub(r'&(?!amp;)', '&amp;', data)
-            try:
-                root = ElementTree.fromstring(data)
-            except ElementTree.ParseError:
-                raise InvalidResponseException(word)
+            raise InvalidResponseException(word)
 
-        suggestions = root.findall("suggestion")
-        if suggestions:
-            suggestions = [s.text for s in suggestions]
+        if suggestions and not found:
             raise WordNotFoundException(word, suggestions)
 
-        return self.parse_xml(root, word)
-
     def _flatten_tree(self, root, exclude=None):
         """ Returns a list containing the (non-None) .text and .tail for all
         nodes in root.
@@ -121,25 +200,24 @@ class LearnersDictionary(MWApiWrapper):
 
     base_url = "http://www.dictionaryapi.com/api/v1/references/learners"
 
-    def parse_xml(self, root, word):
-        entries = root.findall("entry")
-        for num, entry in enumerate(entries):
-            args = {}
-            args['illustration_fragments'] = [e.get('id') for e in
-                                     entry.findall("art/artref")
-                                     if e.get('id')]
-            args['headword'] = entry.find("hw").text
-            args['pronunciations'] = self._get_pronunciations(entry)
-            sound = entry.find("sound")
-            args['sound_fragments'] = []
-            if sound:
-                args['sound_fragments'] = [s.text for s in sound]
-            args['functional_label'] = getattr(entry.find('fl'), 'text', None)
-            args['inflections'] = self._get_inflections(entry)
-            args['senses'] = self._get_senses(entry)
-            yield LearnersDictionaryEntry(
-                re.sub(r'(?:\[\d+\])?\s*', '', entry.get('id')),
-                       args)
+    def parse_entry(self, entry, word):
+        args = {}
+        args['illustration_fragments'] = [e.get('id') for e in
+                                          entry.findall("art/artref")
+                                          if e.get('id')]
+        args['headword'] = entry.find("hw").text
+        args['pronunciations'] = self._get_pronunciations(entry)
+        sound = entry.find("sound")
+        args['sound_fragments'] = []
+        if sound:
+            args['sound_fragments'] = [s.text for s in sound]
+        args['functional_label'] = getattr(entry.find('fl'), 'text', None)
+        # Parsed now, while the element is still populated
+        args['inflections'] = list(self._get_inflections(entry))
+        args['senses'] = list(self._get_senses(entry))
+        return LearnersDictionaryEntry(
+            re.sub(r'(?:\[\d+\])?\s*', '', entry.get('id')),
+                   args)
 
     def _get_inflections(self, root):
         """ Returns a generator of Inflections found in root.
@@ -300,22 +378,22 @@ class CollegiateDictionaryEntry(MWDictionaryEntry):
 class CollegiateDictionary(MWApiWrapper):
     base_url = "http://www.dictionaryapi.com/api/v1/references/collegiate"
 
-    def parse_xml(self, root, word):
-        for entry in root.findall('entry'):
-            args = {}
-            args['headword'] = entry.find('hw').text
-            args['functional_label'] = getattr(entry.find('fl'), 'text', None)
-            args['pronunciations'] = self._get_pronunciations(entry)
-            args['inflections'] = self._get_inflections(entry)
-            args['senses'] = self._get_senses(entry)
-            args['sound_fragments'] = []
-            args['illustration_fragments'] = [e.text for e in
-                                              entry.findall("art/bmp")
-                                              if e.text]
-            sound = entry.find("sound")
-            if sound:
-                args['sound_fragments'] = [s.text for s in sound]
-            yield CollegiateDictionaryEntry(word, args)
+    def parse_entry(self, entry, word):
+        args = {}
+        args['headword'] = entry.find('hw').text
+        args['functional_label'] = getattr(entry.find('fl'), 'text', None)
+        args['pronunciations'] = self._get_pronunciations(entry)
+        # Parsed now, while the element is still populated
+        args['inflections'] = list(self._get_inflections(entry))
+        args['senses'] = list(self._get_senses(entry))
+        args['sound_fragments'] = []
+        args['illustration_fragments'] = [e.text for e in
+                                          entry.findall("art/bmp")
+                                          if e.text]
+        sound = entry.find("sound")
+        if sound:
+            args['sound_fragments'] = [s.text for s in sound]
+        return CollegiateDictionaryEntry(word, args)
 
     def _get_pronunciations(self, root):
         """ Returns list of IPA for regular and 'alternative' pronunciation. """
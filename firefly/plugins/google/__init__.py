@@ -1,22 +1,137 @@
 import argparse
+import math
+import time
 
 from ircmessage import style
-from poogle import google_search
-from poogle.errors import PoogleNoResultsError
+from twisted.internet import defer, reactor, task, threads
 
 from firefly import irc, PluginAbstract
+from firefly.cache import LRUCache, SingleFlight
+from firefly.errors import RateLimitedError
+from firefly.ratelimit import TokenBucket
 
 
 class Google(PluginAbstract):
 
-    def __init__(self, firefly):
-        PluginAbstract.__init__(self, firefly)
+    FIREFLY_IRC_LAZY_LOAD = True
 
+    def __init__(self, host):
+        PluginAbstract.__init__(self, host)
+        self._flights = SingleFlight()
+        self._load_settings()
+
+        self.cache      = LRUCache(self.cache_entries)
+
+        # Searches are limited across every server connection, since they all share our IP address
+        self.limiter    = TokenBucket(self.search_rate, self.search_burst)
+
+    def _load_settings(self):
         # Get our configuration attributes
         self.default_results    = self.config.getint('Google', 'Results')
         self.max_results        = self.config.getint('Google', 'MaxResults')
-        self.template           = self.config.get('Google', 'Format')
-        self.separator          = self.config.get('Google', 'Separator').strip() + ' '
+        self.template           = self.config.get('Google', 'Format').decode('utf-8')
+        self.separator          = self.config.get('Google', 'Separator').decode('utf-8').strip() + u' '
+
+        self.cache_entries  = self.config.getint('Cache', 'Entries')
+        self.cache_ttl      = self.config.getint('Cache', 'TTL')
+
+        self.search_rate    = self.config.getfloat('RateLimit', 'Searches') / 60
+        self.search_burst   = self.config.getint('RateLimit', 'Burst')
+        self.max_wait       = self.config.getfloat('RateLimit', 'MaxWait')
+
+    def reload_configuration(self, config):
+        PluginAbstract.reload_configuration(self, config)
+        self._load_settings()
+
+        # Keep our cached searches and the searches we've already made, only applying the new limits
+        self.cache.maxsize  = self.cache_entries
+        self.limiter.configure(self.search_rate, self.search_burst)
+
+    def _search(self, query, results):
+        """
+        Search Google, from our cache if possible. Concurrent identical searches share a single request.
+
+        @type   query:      unicode
+        @type   results:    int
+
+        @rtype:     Deferred
+        @return:    Fires with a list of (title, url) tuples. Fails with RateLimitedError if we're making too many
+                    searches to queue this one.
+        """
+        key = (' '.join(query.lower().split()), results)
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] > time.time():
+            self._log.debug('Search results for %s cached', query)
+            return defer.succeed(entry[1])
+
+        return self._flights.call(key, self._fetch, query, results, key)
+
+    def _fetch(self, query, results, key):
+        """
+        Search Google in a thread once the rate limiter allows it, and cache the results.
+
+        @rtype: Deferred
+        """
+        wait = self.limiter.reserve(self.max_wait)
+        if wait:
+            self._log.info('Queueing search for %s for %.1f seconds', query, wait)
+            d = task.deferLater(reactor, wait, threads.deferToThread, self._google_search, query, results)
+        else:
+            d = threads.deferToThread(self._google_search, query, results)
+
+        d.addCallback(self._cache, key)
+        return d
+
+    @staticmethod
+    def _google_search(query, results):
+        """
+        Runs in a thread.
+
+        @type   query:      unicode
+        @type   results:    int
+
+        @rtype: list of tuple of (unicode, str)
+        """
+        from poogle import google_search
+        from poogle.errors import PoogleNoResultsError
+
+        try:
+            return [(result.title, result.url.as_string()) for result in google_search(query, results)]
+        except PoogleNoResultsError:
+            return []
+
+    def _cache(self, results, key):
+        """
+        @type   results:    list of tuple of (unicode, str)
+        @type   key:        tuple of (unicode, int)
+
+        @rtype: list of tuple of (unicode, str)
+        """
+        self.cache.set(key, (time.time() + self.cache_ttl, results))
+        return results
+
+    def _failed(self, failure, query, response):
+        """
+        @type   failure:    twisted.python.failure.Failure
+        @type   query:      unicode
+        @type   response:   firefly.containers.Response
+        """
+        if failure.check(RateLimitedError):
+            response.add_message(u"I'm making too many searches right now, please try again in {s} seconds."
+                                 .format(s=int(math.ceil(failure.value.retry_after))))
+            return
+
+        self._log.warn('Unable to search for %s: %s', query, failure.getErrorMessage())
+        response.add_message(u"Sorry, my search for {q} failed, please try again later."
+                             .format(q=style(query, bold=True)))
+
+    @staticmethod
+    def _no_results(query):
+        """
+        @type   query:  unicode
+        @rtype: unicode
+        """
+        return u"Sorry, I couldn't find anything for {q}".format(q=style(query, bold=True))
 
     @irc.command()
     def search(self, args):
@@ -34,18 +149,25 @@ class Google(PluginAbstract):
             @type   args:       argparse.Namespace
             @type   response:   firefly.containers.Response
             """
-            try:
-                query = ' '.join(args.query)
-                results = google_search(query, args.results)
-            except PoogleNoResultsError:
-                message = "Sorry, I couldn't find anything for {q}".format(q=style(query, bold=True))
-                response.add_message(message)
+            query = ' '.join(args.query)
+            d = self._search(query, args.results)
+            d.addCallbacks(_respond, self._failed, callbackArgs=(query, response), errbackArgs=(query, response))
+            return d
+
+        def _respond(results, query, response):
+            """
+            @type   results:    list of tuple of (unicode, str)
+            @type   query:      unicode
+            @type   response:   firefly.containers.Response
+            """
+            if not results:
+                response.add_message(self._no_results(query))
                 return
 
             formatted_results = []
-            for result in results:
+            for title, url in results:
                 formatted_results.append(
-                    self.template.format(title=style(result.title, bold=True), url=result.url.as_string())
+                    self.template.format(title=style(title, bold=True), url=url)
                 )
 
             response.add_message(
@@ -68,15 +190,22 @@ class Google(PluginAbstract):
             @type   args:       argparse.Namespace
             @type   response:   firefly.containers.Response
             """
-            try:
-                query = ' '.join(args.query)
-                results = google_search(query, 1)
-            except PoogleNoResultsError:
-                message = "Sorry, I couldn't find anything for {q}".format(q=style(query, bold=True))
-                response.add_message(message)
+            query = ' '.join(args.query)
+            d = self._search(query, 1)
+            d.addCallbacks(_respond, self._failed, callbackArgs=(query, response), errbackArgs=(query, response))
+            return d
+
+        def _respond(results, query, response):
+            """
+            @type   results:    list of tuple of (unicode, str)
+            @type   query:      unicode
+            @type   response:   firefly.containers.Response
+            """
+            if not results:
+                response.add_message(self._no_results(query))
                 return
 
-            response.add_message(results[0].url.as_string())
+            response.add_message(results[0][1])
 
         return _lucky
 
@@ -1,5 +1,6 @@
 import os
 import errno
+import sys
 
 import time
 
@@ -12,12 +13,24 @@ class Logger(PluginAbstract):
     TYPE_CHANNEL = 'channels'
     TYPE_QUERY   = 'queries'
 
-    def __init__(self, firefly):
+    def __init__(self, host):
         """
-        @type   firefly:    FireflyIRC
+        @type   host:   firefly.PluginHost
         """
-        PluginAbstract.__init__(self, firefly)
+        PluginAbstract.__init__(self, host)
 
+        # Open logfiles, keyed by server hostname and then by channel or user name
+        self._logs = {
+            self.TYPE_CHANNEL: {},
+            self.TYPE_QUERY:  {}
+        }
+
+        self._load_settings()
+
+    def _load_settings(self):
+        """
+        Load our logging flags, paths and templates from the plugin configuration.
+        """
         # Define our logging flags
         self.log_channels   = self.config.getboolean('Logging', 'Log_Channels')
         self.log_queries    = self.config.getboolean('Logging', 'Log_Queries')
@@ -53,10 +66,20 @@ class Logger(PluginAbstract):
             }
         }
 
-        self._logs = {
-            self.TYPE_CHANNEL: {},
-            self.TYPE_QUERY:  {}
-        }
+    def reload_configuration(self, config):
+        PluginAbstract.reload_configuration(self, config)
+        self._load_settings()
+
+    def unload(self):
+        PluginAbstract.unload(self)
+
+        # Close every open logfile
+        for log_type in (self.TYPE_CHANNEL, self.TYPE_QUERY):
+            for logs in self._logs[log_type].itervalues():
+                for log in logs.itervalues():
+                    log.close()
+                    self._log.info('Logfile closed: %s', log.name)
+            self._logs[log_type] = {}
 
     def _load_paths(self):
         """
@@ -109,11 +132,28 @@ class Logger(PluginAbstract):
         """
         return '_'.join(fn.replace('/', '_').replace('\\', '_').split())
 
-    def _get_path(self, name, log_type):
+    def _open_logs(self, server, log_type):
+        """
+        Get the open logfiles for a server.
+
+        @type   server:     str
+        @param  server:     The server hostname.
+
+        @type   log_type:   str
+        @param  log_type:   Either Logging.TYPE_CHANNEL or Logging.TYPE_QUERY
+
+        @rtype: dict of (str: file)
+        """
+        return self._logs[log_type].setdefault(server, {})
+
+    def _get_path(self, server, name, log_type):
         """
         Get the filesystem path to the logfile.
 
-        @type   name:   str or None
+        @type   server: str
+        @param  server: The server hostname.
+
+        @type   name:   unicode or None
         @param  name:   The name of the channel or user.
 
         @type   log_type:   str
@@ -127,16 +167,29 @@ class Logger(PluginAbstract):
         if log_type not in [self.TYPE_CHANNEL, self.TYPE_QUERY]:
             raise ValueError('Unrecognized log type: %s', log_type)
 
-        # Get our path
+        # Get our path. Logs are kept per server, since channel names are only unique to a single network.
         base_path = self.channel_path if (log_type == self.TYPE_CHANNEL) else self.query_path
-        filename  = self.sanitize_filename(name)
+        base_path = os.path.join(base_path, self.sanitize_filename(server))
+        filename  = u'{fn}.log'.format(fn=self.sanitize_filename(name))
+
+        # Channel and user names are unicode, so they're encoded before they reach the filesystem
+        try:
+            filename = filename.encode(sys.getfilesystemencoding() or 'utf-8')
+        except UnicodeEncodeError:
+            filename = filename.encode('utf-8')
 
-        return os.path.join(base_path, '{fn}.log'.format(fn=filename))
+        if not os.path.isdir(base_path):
+            os.makedirs(base_path)
 
-    def _open_logfile(self, name, log_type=TYPE_CHANNEL):
+        return os.path.join(base_path, filename)
+
+    def _open_logfile(self, server, name, log_type=TYPE_CHANNEL):
         """
         Open a log file.
 
+        @type   server:     str
+        @param  server:     The server hostname.
+
         @type   name:       str or None
         @param  name:       The name of the channel or user.
 
@@ -149,18 +202,22 @@ class Logger(PluginAbstract):
             return
 
         # Make sure our logfile isn't already open
-        path = self._get_path(name, log_type)
-        if name in self._logs[log_type]:
+        path = self._get_path(server, name, log_type)
+        logs = self._open_logs(server, log_type)
+        if name in logs:
             self._log.warn('Logfile already open for %s (type: %s)', name, log_type)
             return
 
-        self._logs[log_type][name] = open(path, 'a+')
+        logs[name] = open(path, 'a+')
         self._log.info('New logfile opened: %s', path)
 
-    def _close_logfile(self, name, log_type=TYPE_CHANNEL):
+    def _close_logfile(self, server, name, log_type=TYPE_CHANNEL):
         """
         Close an open log file.
 
+        @type   server: str
+        @param  server: The server hostname.
+
         @type   name:   str or None
         @param  name:   The name of the channel or user.
 
@@ -174,13 +231,14 @@ class Logger(PluginAbstract):
             raise ValueError('Unrecognized log type: %s', log_type)
 
         # Make sure our logfile is actually open
-        if name in self._logs[log_type]:
+        logs = self._open_logs(server, log_type)
+        if name in logs:
             self._log.warn('No logfile has been opened for %s (type: %s)', name, log_type)
             return
 
-        path = self._logs[log_type][name].name
-        self._logs[log_type][name].close()
-        del self._logs[log_type][name]
+        path = logs[name].name
+        logs[name].close()
+        del logs[name]
 
         self._log.info('Logfile closed: %s', path)
 
@@ -207,32 +265,38 @@ class Logger(PluginAbstract):
         # Flushing a single logfile?
         if name:
             # Make sure it exists
-            if name not in self._logs[log_type]:
+            logs = [l[name] for l in self._logs[log_type].itervalues() if name in l]
+            if not logs:
                 self._log.warn('Unable to flush logfile, log not open')
                 return
 
             # Flush
-            self._logs[log_type][name].flush()
-
-            self._log.debug('Flushed log file: %s', self._logs[log_type][name].name)
+            for log in logs:
+                log.flush()
+                self._log.debug('Flushed log file: %s', log.name)
             return
 
         # Flush all channels
         if not log_type or (log_type == self.TYPE_CHANNEL):
-            for name, log in self._logs[self.TYPE_CHANNEL].iteritems():
-                log.flush()
-                self._log.debug('Flushed log file: %s', log.name)
+            for logs in self._logs[self.TYPE_CHANNEL].itervalues():
+                for name, log in logs.iteritems():
+                    log.flush()
+                    self._log.debug('Flushed log file: %s', log.name)
 
         # Flush all queries
         if not log_type or (log_type == self.TYPE_QUERY):
-            for name, log in self._logs[self.TYPE_QUERY].iteritems():
-                log.flush()
-                self._log.debug('Flushed log file: %s', log.name)
+            for logs in self._logs[self.TYPE_QUERY].itervalues():
+                for name, log in logs.iteritems():
+                    log.flush()
+                    self._log.debug('Flushed log file: %s', log.name)
 
-    def read(self, name, log_type=TYPE_CHANNEL):
+    def read(self, server, name, log_type=TYPE_CHANNEL):
         """
         Open a logfile for reading
 
+        @type   server: str
+        @param  server: The server hostname.
+
         @type   name:   str or None
         @param  name:   The name of the channel or user.
 
@@ -243,13 +307,14 @@ class Logger(PluginAbstract):
 
         @raise  KeyError:   Raised if the requested logfile does not exist or has not been opened yet.
         """
-        if name not in self._logs[log_type]:
+        logs = self._open_logs(server, log_type)
+        if name not in logs:
             self._log.info('No logfile has been opened for %s (type: %s)', name, log_type)
-            raise KeyError('No logfile has been opened for {n} (type: {t})'.format(n=name, t=log_type))
+            raise KeyError(u'No logfile has been opened for {n} (type: {t})'.format(n=name, t=log_type))
 
         # Flush the logfile before opening it
-        self._logs[log_type][name].flush()
-        return open(self._logs[log_type][name].name)
+        logs[name].flush()
+        return open(logs[name].name)
 
     def write(self, message, template):
         """
@@ -276,23 +341,25 @@ class Logger(PluginAbstract):
             log_type = self.TYPE_QUERY
             source   = message.source.nick
 
-        if source not in self._logs[log_type]:
+        logs = self._open_logs(message.destination.firefly.server.hostname, log_type)
+        if source not in logs:
             self._log.debug('Logging not enabled for %s (type: %s)', source, log_type)
             return
 
-        log_line = template.format(nick=message.source.nick, hostmask=message.source.hostmask,
-                                   message=message.stripped, channel=source)
-        line = '{ts} {log}\n'.format(ts=self._get_timestamp(), log=log_line)
+        # Messages arrive decoded, so format in unicode and write UTF-8
+        log_line = unicode(template, 'utf-8').format(nick=message.source.nick, hostmask=message.source.hostmask,
+                                                     message=message.stripped, channel=source)
+        line = u'{ts} {log}\n'.format(ts=self._get_timestamp(), log=log_line)
 
-        self._logs[log_type][source].write(line)
+        logs[source].write(line.encode('utf-8'))
 
     @irc.event(irc.on_client_join)
     def start_logging_channel(self, response, channel):
-        self._open_logfile(channel.raw)
+        self._open_logfile(response.firefly.server.hostname, channel.raw)
 
     @irc.event(irc.on_client_part)
     def stop_logging_channel(self, response, channel):
-        self._close_logfile(channel.raw)
+        self._close_logfile(response.firefly.server.hostname, channel.raw)
 
     ################################
     # Logging events               #
@@ -321,27 +388,31 @@ class Logger(PluginAbstract):
     @irc.event(irc.on_user_quit)
     def user_quit(self, response, message):
         # Only log quits if we have an open log session for them
-        if message.source.nick in self._logs[self.TYPE_QUERY]:
+        server = response.firefly.server.hostname
+        if message.source.nick in self._open_logs(server, self.TYPE_QUERY):
             self.write(message, self.templates['query']['quit'])
-            self._close_logfile(message.source.nick, self.TYPE_QUERY)
+            self._close_logfile(server, message.source.nick, self.TYPE_QUERY)
 
     @irc.event(irc.on_private_message)
     def private_message(self, response, message):
-        if message.source.nick not in self._logs[self.TYPE_QUERY]:
-            self._open_logfile(message.source.nick, self.TYPE_QUERY)
+        server = response.firefly.server.hostname
+        if message.source.nick not in self._open_logs(server, self.TYPE_QUERY):
+            self._open_logfile(server, message.source.nick, self.TYPE_QUERY)
 
         self.write(message, self.templates['query']['message'])
 
     @irc.event(irc.on_private_action)
     def private_action(self, response, action):
-        if action.source.nick not in self._logs[self.TYPE_QUERY]:
-            self._open_logfile(action.source.nick, self.TYPE_QUERY)
+        server = response.firefly.server.hostname
+        if action.source.nick not in self._open_logs(server, self.TYPE_QUERY):
+            self._open_logfile(server, action.source.nick, self.TYPE_QUERY)
 
         self.write(action, self.templates['query']['action'])
 
     @irc.event(irc.on_private_notice)
     def private_notice(self, response, notice):
-        if notice.source.nick not in self._logs[self.TYPE_QUERY]:
-            self._open_logfile(notice.source.nick, self.TYPE_QUERY)
+        server = response.firefly.server.hostname
+        if notice.source.nick not in self._open_logs(server, self.TYPE_QUERY):
+            self._open_logfile(server, notice.source.nick, self.TYPE_QUERY)
 
         self.write(notice, self.templates['query']['notice'])
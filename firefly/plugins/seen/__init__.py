@@ -1,11 +1,10 @@
 import re
 
-import arrow
 import random
 from ircmessage import style
-from boltons.jsonutils import reverse_iter_lines
 
 from firefly import PluginAbstract, irc
+from firefly.errors import NoSuchPluginError
 
 
 class Seen(PluginAbstract):
@@ -16,20 +15,19 @@ class Seen(PluginAbstract):
     ]
 
     NOT_SEEN_RESPONSES = [
-        "Hmm.. I don't think I've ever seen {name}.",
-        "I have never seen {name} before.",
-        "{name}? Who is that?",
-        "{name}? What a funny name! I've never seen them before.",
-        "{name}? That name's not familiar to me, sorry!"
+        u"Hmm.. I don't think I've ever seen {name}.",
+        u"I have never seen {name} before.",
+        u"{name}? Who is that?",
+        u"{name}? What a funny name! I've never seen them before.",
+        u"{name}? That name's not familiar to me, sorry!"
     ]
 
-    def __init__(self, firefly):
+    def __init__(self, host):
         """
-        @type   firefly:    firefly.FireflyIRC
+        @type   host:   firefly.PluginHost
         """
-        super(Seen, self).__init__(firefly)
+        super(Seen, self).__init__(host)
 
-        self._logger = None
         self.message_patterns = self.DEFAULT_PATTERNS
 
     def _iterate_logfile(self, name, logfile):
@@ -43,6 +41,8 @@ class Seen(PluginAbstract):
         @rtype: tuple of (str, str, str)
         """
         for line in logfile:
+            line = line.decode('utf-8', 'replace')
+
             # Loop through our message patterns and attempt to find a match
             for pattern in self.message_patterns:
                 match = pattern.match(line)
@@ -58,7 +58,7 @@ class Seen(PluginAbstract):
 
             # Does our name match?
             if line_name.lower() == name.lower():
-                self._log.info('Match found for {name}'.format(name=name))
+                self._log.info('Match found for %s', name)
                 break
             continue
         else:
@@ -66,26 +66,40 @@ class Seen(PluginAbstract):
 
         return line_datetime, line_name, line_message
 
+    @staticmethod
+    def _format_date(date, relative, date_format):
+        """
+        @type   date:           str or int
+        @param  date:           A logfile date string, or a message log timestamp.
+
+        @type   relative:       bool
+        @param  relative:       Format the date relative to now instead of with date_format.
+
+        @type   date_format:    str
+        @rtype: str
+        """
+        # Imported here so the plugin doesn't load arrow until a date is actually formatted
+        import arrow
+
+        if isinstance(date, basestring):
+            date = arrow.get(date, 'YYYY-MM-DD HH:mm:ss')
+        else:
+            date = arrow.Arrow.fromtimestamp(date)
+
+        return date.humanize() if relative else date.format(date_format)
+
     def _first_logging(self, args, response):
         """
         Get the first message by a user from a log file.
         @type   response:   firefly.containers.Response
         """
         try:
-            with self.logger.read(response.channel.raw) as log:
+            with self.logger.read(response.firefly.server.hostname, response.channel.raw) as log:
                 line = self._iterate_logfile(args.nick, log)
         except KeyError:
             return None
 
-        # Make sure we got a result
-        if not line:
-            return None
-
-        # Parse the datetime string
-        date, name, message = line
-        date = arrow.get(date, 'YYYY-MM-DD HH:mm:ss')
-
-        return date, name, message
+        return line
 
     # noinspection PyMethodMayBeStatic
     def _first_fallback(self, args, response):
@@ -97,7 +111,7 @@ class Seen(PluginAbstract):
         """@type: list of (int, firefly.containers.Message)"""
         for timestamp, message in messages:
             if message.source.nick.lower() == args.nick.lower():
-                return arrow.Arrow.fromtimestamp(timestamp), message.source.nick, message.raw
+                return timestamp, message.source.nick, message.raw
 
     @irc.command()
     def first(self, args):
@@ -113,7 +127,6 @@ class Seen(PluginAbstract):
             """
             @type   response:   firefly.containers.Response
             """
-            print self.firefly.registry.plugins
             reply = self._first_logging(args, response) if self.logger else self._first_fallback(args, response)
             if not reply:
                 response.add_message(random.choice(self.NOT_SEEN_RESPONSES).format(name=args.nick.title()))
@@ -123,11 +136,11 @@ class Seen(PluginAbstract):
             bits = []
 
             # Get the formatted date string
-            date_string = date.humanize() if args.relative else date.format('MMMM D, YYYY - h:mm A ZZ')
+            date_string = self._format_date(date, args.relative, 'MMMM D, YYYY - h:mm A ZZ')
             bits.append(style(date_string, bold=args.message))
 
             if args.message:
-                bits.append(': <{nick}> {msg}'.format(nick=nick, msg=message))
+                bits.append(u': <{nick}> {msg}'.format(nick=nick, msg=message))
 
             response.add_message(''.join(bits))
 
@@ -138,21 +151,15 @@ class Seen(PluginAbstract):
         Get the first message by a user from a log file.
         @type   response:   firefly.containers.Response
         """
+        from boltons.jsonutils import reverse_iter_lines
+
         try:
-            with self.logger.read(response.channel.raw) as log:
+            with self.logger.read(response.firefly.server.hostname, response.channel.raw) as log:
                 line = self._iterate_logfile(args.nick, reverse_iter_lines(log))
         except KeyError:
             return None
 
-        # Make sure we got a result
-        if not line:
-            return None
-
-        # Parse the datetime string
-        date, name, message = line
-        date = arrow.get(date, 'YYYY-MM-DD HH:mm:ss')
-
-        return date, name, message
+        return line
 
     # noinspection PyMethodMayBeStatic
     def _last_fallback(self, args, response):
@@ -164,7 +171,7 @@ class Seen(PluginAbstract):
         """@type: list of (int, firefly.containers.Message)"""
         for timestamp, message in messages:
             if message.source.nick.lower() == args.nick.lower():
-                return arrow.Arrow.fromtimestamp(timestamp), message.source.nick, message.raw
+                return timestamp, message.source.nick, message.raw
 
     @irc.command()
     def last(self, args):
@@ -189,11 +196,11 @@ class Seen(PluginAbstract):
             bits = []
 
             # Get the formatted date string
-            date_string = date.humanize() if args.relative else date.format('MMMM DD, YYYY - HH:mm A ZZ')
+            date_string = self._format_date(date, args.relative, 'MMMM DD, YYYY - HH:mm A ZZ')
             bits.append(style(date_string, bold=args.message))
 
             if args.message:
-                bits.append(': <{nick}> {msg}'.format(nick=nick, msg=message))
+                bits.append(u': <{nick}> {msg}'.format(nick=nick, msg=message))
 
             response.add_message(''.join(bits))
 
@@ -206,9 +213,8 @@ class Seen(PluginAbstract):
         ChannelLogger containers.
         @rtype: firefly.plugins.logging.Logger or bool
         """
-        if self._logger is None:
-            self._log.debug('Logger plugin instance found')
-            self._logger = self.firefly.registry.plugins['logger'] if 'logger' in self.firefly.registry.plugins \
-                else False
-
-        return self._logger
+        # Not cached, since the logging plugin may be reloaded or unloaded at any time
+        try:
+            return self.host.registry.get_plugin('logger')
+        except NoSuchPluginError:
+            return False
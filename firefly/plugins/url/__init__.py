@@ -5,10 +5,9 @@ from firefly import irc, PluginAbstract
 
 class Url(PluginAbstract):
 
-    def __init__(self, firefly):
-        PluginAbstract.__init__(self, firefly)
+    def __init__(self, host):
+        PluginAbstract.__init__(self, host)
 
-        self.auto_parse = self.config.getboolean('URL', 'AutoParseUrls')
         self.url_parser = UrlParser()
 
     @irc.command()
@@ -30,13 +29,14 @@ class Url(PluginAbstract):
 
         return _title
 
-    @irc.event(irc.on_channel_message)
+    # Every URL we match contains one of these (see UrlParser.url_regex)
+    @irc.event(irc.on_channel_message, keywords=['/', 'www'])
     def parse_message(self, response, message):
         """
         @type   response:   firefly.Response
         @type   message:    firefly.containers.Message
         """
-        if not self.auto_parse:
+        if not self.server_config(response.firefly.server).getboolean('URL', 'AutoParseUrls'):
             self._log.debug('URL parsing disabled')
             return
 
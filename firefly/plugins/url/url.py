@@ -3,11 +3,8 @@ import socket
 import re
 import logging
 
-from urllib2 import urlopen, URLError, HTTPError
 from urlparse import urlparse
 
-from bs4 import BeautifulSoup
-
 
 class UrlParser:
     """
@@ -55,8 +52,11 @@ class UrlParser:
         Returns:
             str or None
         """
+        # urllib2 pulls in httplib, ssl and friends, so we only import it once we actually fetch something
+        from urllib2 import urlopen, URLError, HTTPError
+
         # Download the first <bytes> of the web page
-        self.log.debug('Attempting to download the first {bytes} bytes of {url}'.format(bytes=page_bytes, url=url))
+        self.log.debug('Attempting to download the first %d bytes of %s', page_bytes, url)
         try:
             page = urlopen(url, timeout=3).read(page_bytes)
         except HTTPError as e:
@@ -81,6 +81,8 @@ class UrlParser:
         Returns:
             str or None
         """
+        from bs4 import BeautifulSoup
+
         self.log.debug('Attempting to parse the HTML page title')
         title = None
         soup = BeautifulSoup(page, 'lxml')
@@ -106,11 +108,11 @@ class UrlParser:
         Returns:
             str
         """
-        title = ''.join(title.splitlines())
-        title = 'Title: ' + str(title).strip()
+        title = u''.join(title.splitlines())
+        title = u'Title: ' + title.strip()
         host = urlparse(url).netloc
         if host:
-            title += ' (at {host})'.format(host=host)
+            title += u' (at {host})'.format(host=host)
 
         return title
 
@@ -0,0 +1,81 @@
+from firefly.clock import monotonic
+from firefly.errors import RateLimitedError
+
+
+class TokenBucket(object):
+    """
+    A token bucket rate limiter.
+
+    The bucket holds up to burst tokens and refills at rate tokens per second; every request takes a token. Requests
+    made when the bucket is empty may reserve a future token instead, up to max_wait seconds ahead, so bursts are
+    queued in order and spread out at the sustained rate rather than rejected outright.
+    """
+    def __init__(self, rate, burst=1, clock=monotonic):
+        """
+        @type   rate:   float
+        @param  rate:   Tokens added per second.
+
+        @type   burst:  int
+        @param  burst:  Maximum number of tokens the bucket holds.
+
+        @type   clock:  callable
+        @param  clock:  Returns the current time in seconds.
+        """
+        self.rate = float(rate)
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def configure(self, rate, burst):
+        """
+        Change the rate and burst size, keeping the tokens already in the bucket (up to the new burst size).
+
+        @type   rate:   float
+        @type   burst:  int
+        """
+        self._refill()
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = min(self.burst, self._tokens)
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self):
+        """
+        @rtype:     float
+        @return:    Tokens currently available. Negative when future tokens have been reserved.
+        """
+        self._refill()
+        return self._tokens
+
+    def retry_after(self):
+        """
+        @rtype:     float
+        @return:    Seconds until a token will be available. 0 if one is available now.
+        """
+        return max(1 - self.tokens, 0) / self.rate
+
+    def reserve(self, max_wait=0):
+        """
+        Take a token, reserving a future one if none are available now.
+
+        @type   max_wait:   float
+        @param  max_wait:   The longest to wait for a token, in seconds.
+
+        @rtype:     float
+        @return:    Seconds until the reserved token is available; the request should be made then. 0 if it's available
+                    now.
+
+        @raise  RateLimitedError:   Raised, without taking a token, if no token will be available within max_wait.
+        """
+        wait = self.retry_after()
+        if wait > max_wait:
+            raise RateLimitedError(wait - max_wait)
+
+        self._tokens -= 1
+        return wait
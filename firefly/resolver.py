@@ -0,0 +1,94 @@
+import logging
+import time
+
+from firefly.cache import LRUCache, SingleFlight
+
+
+class Resolver(object):
+    """
+    Resolves hostnames without blocking the reactor.
+
+    Lookups are made with the reactor's resolver (by default, gethostbyname in the reactor thread pool). Results are
+    cached for ttl seconds, and failures for negative_ttl seconds, so hosts that don't resolve (e.g. masked hosts)
+    aren't looked up again on every call. Concurrent lookups of the same host share a single request.
+    """
+    def __init__(self, ttl=5 * 60, negative_ttl=60, maxsize=4096, lookup=None, clock=time.time):
+        """
+        @type   ttl:            float
+        @param  ttl:            Seconds to cache resolved addresses for.
+
+        @type   negative_ttl:   float
+        @param  negative_ttl:   Seconds to remember that a host could not be resolved.
+
+        @type   maxsize:        int
+        @param  maxsize:        Maximum number of hosts to cache.
+
+        @type   lookup:         callable or None
+        @param  lookup:         Called with a hostname, returns a Deferred firing with its address. Defaults to
+                                reactor.resolve.
+
+        @type   clock:          callable
+        """
+        self._log = logging.getLogger('firefly.resolver')
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lookup = lookup
+        self._clock = clock
+        self._flights = SingleFlight()
+
+        self.cache = LRUCache(maxsize)
+        """@type: LRUCache of (str: tuple of (float, str or None))"""
+
+    def resolve(self, host, ignore_cache=False):
+        """
+        Resolve a hostname to an IPv4 address.
+
+        @type   host:           str
+
+        @type   ignore_cache:   bool
+        @param  ignore_cache:   Look the host up again even if a cached result is available.
+
+        @rtype:     twisted.internet.defer.Deferred
+        @return:    Fires with the address. Fails with twisted.internet.error.DNSLookupError if the host can't be
+                    resolved.
+        """
+        from twisted.internet import defer
+        from twisted.internet.error import DNSLookupError
+
+        key = host.lower()
+        entry = None if ignore_cache else self.cache.get(key)
+        if entry is not None and entry[0] > self._clock():
+            if entry[1] is None:
+                self._log.debug('Previously failed to resolve %s', host)
+                return defer.fail(DNSLookupError(host))
+
+            self._log.debug('Returning cached resolution of %s: %s', host, entry[1])
+            return defer.succeed(entry[1])
+
+        return self._flights.call(key, self._resolve, key)
+
+    def _resolve(self, host):
+        """
+        @type   host:   str
+        @rtype: twisted.internet.defer.Deferred
+        """
+        if self._lookup:
+            d = self._lookup(host)
+        else:
+            from twisted.internet import reactor
+            d = reactor.resolve(host)
+
+        return d.addCallbacks(self._resolved, self._failed, callbackArgs=(host,), errbackArgs=(host,))
+
+    def _resolved(self, address, host):
+        self._log.debug('Resolved %s: %s', host, address)
+        self.cache.set(host, (self._clock() + self.ttl, address))
+        return address
+
+    def _failed(self, failure, host):
+        from twisted.internet.error import DNSLookupError
+
+        failure.trap(DNSLookupError)
+        self._log.info('Could not resolve host %s (%s)', host, failure.getErrorMessage())
+        self.cache.set(host, (self._clock() + self.negative_ttl, None))
+        return failure
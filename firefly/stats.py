@@ -0,0 +1,24 @@
+import math
+
+
+def percentiles(samples, points=(50, 90, 99, 99.9)):
+    """
+    Calculate percentiles of the supplied samples using the nearest-rank method.
+
+    @type   samples:    list of float
+    @type   points:     tuple of float
+
+    @rtype:     dict of (str: float)
+    @return:    The percentiles keyed by point (e.g. p50, p99.9), and the largest sample keyed by max.
+    """
+    if not samples:
+        return {}
+
+    ordered = sorted(samples)
+    result = {}
+    for point in points:
+        rank = max(int(math.ceil(point / 100.0 * len(ordered))) - 1, 0)
+        result['p{p:g}'.format(p=point)] = ordered[min(rank, len(ordered) - 1)]
+
+    result['max'] = ordered[-1]
+    return result
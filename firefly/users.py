@@ -0,0 +1,352 @@
+import logging
+import os
+import sqlite3
+from abc import ABCMeta, abstractmethod, abstractproperty
+
+
+class User(object):
+
+    def __init__(self, email, group='user', nick=None, name=None, password=None):
+        """
+        @type   email:      str
+        @param  email:      The account e-mail/username.
+
+        @type   group:      str
+        @param  group:      The account group / access level (user or admin).
+
+        @type   nick:       str or None
+        @param  nick:       Nickname / alias.
+
+        @type   name:       str or None
+        @param  name:       Display name.
+
+        @type   password:   str or None
+        @param  password:   bcrypt password hash.
+        """
+        self.email    = email
+        self.group    = (group or 'user').lower()
+        self.nick     = nick or None
+        self.name     = name or None
+        self.password = password
+
+    @property
+    def is_admin(self):
+        return self.group == 'admin'
+
+    def __repr__(self):
+        return '<User email={e!r} group={g!r} nick={n!r}>'.format(e=self.email, g=self.group, n=self.nick)
+
+
+class UserStore(object):
+    """
+    User account directory.
+
+    Subscribers are notified whenever accounts may have been changed from outside of this process, so they can refresh
+    any User instances they are holding on to.
+    """
+    __metaclass__ = ABCMeta
+
+    def __init__(self):
+        self._log = logging.getLogger('firefly.users')
+        self._subscribers = []
+
+    def __contains__(self, email):
+        return self.get(email) is not None
+
+    @abstractmethod
+    def __iter__(self):
+        """
+        Iterate over the e-mail addresses of every account.
+        """
+        pass
+
+    @abstractproperty
+    def location(self):
+        """
+        @rtype:     str
+        @return:    Where accounts are stored, for display purposes.
+        """
+        pass
+
+    @abstractmethod
+    def get(self, email):
+        """
+        Look up an account by its e-mail address.
+
+        @type   email:  str
+        @rtype: User or None
+        """
+        pass
+
+    @abstractmethod
+    def find(self, nick):
+        """
+        Look up an account by its nick, ignoring case.
+
+        @type   nick:   str
+        @rtype: User or None
+        """
+        pass
+
+    @abstractmethod
+    def add(self, user):
+        """
+        Add an account, replacing any existing account with the same e-mail address.
+
+        @type   user:   User
+        """
+        pass
+
+    @abstractmethod
+    def remove(self, email):
+        """
+        Delete an account.
+
+        @type   email:  str
+
+        @rtype:     bool
+        @return:    False if no such account exists.
+        """
+        pass
+
+    def check(self):
+        """
+        Check for accounts changed from outside of this process, notifying our subscribers if there were any.
+
+        @rtype: bool
+        """
+        return False
+
+    def subscribe(self, callback):
+        """
+        @type   callback:   callable
+        @param  callback:   Called with this store whenever accounts may have been changed.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """
+        @type   callback:   callable
+        """
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _notify(self):
+        for callback in list(self._subscribers):
+            try:
+                callback(self)
+            except Exception:
+                self._log.exception('Exception raised by user store subscriber %s', repr(callback))
+
+
+class ConfigUserStore(UserStore):
+    """
+    Accounts stored as sections of the users configuration file, indexed in memory by e-mail and nick.
+
+    The index is rebuilt whenever the configuration cache reloads the file.
+    """
+    def __init__(self, config, path, config_cache=None):
+        """
+        @type   config:         ConfigParser.ConfigParser
+        @param  config:         Users configuration instance.
+
+        @type   path:           str
+        @param  path:           Path to write account changes to.
+
+        @type   config_cache:   firefly.configuration.ConfigurationCache or None
+        @param  config_cache:   The cache the configuration was loaded from, to rebuild our index when it's reloaded.
+        """
+        super(ConfigUserStore, self).__init__()
+        self.config = config
+        self.path = path
+        self._users = {}
+        self._nicks = {}
+        self._index()
+
+        if config_cache:
+            config_cache.subscribe(config, self._reloaded)
+
+    def __iter__(self):
+        return iter(sorted(self._users))
+
+    @property
+    def location(self):
+        return self.path
+
+    def _index(self):
+        users, nicks = {}, {}
+        for email in self.config.sections():
+            user = User(email, self.config.get(email, 'Group'), self.config.get(email, 'Nick'),
+                        self.config.get(email, 'DisplayName'), self.config.get(email, 'Password'))
+            users[email] = user
+            if user.nick:
+                nicks.setdefault(user.nick.lower(), user)
+
+        self._users, self._nicks = users, nicks
+
+    def _reloaded(self, config):
+        self._log.info('Users configuration reloaded, re-indexing %d accounts', len(config.sections()))
+        self._index()
+        self._notify()
+
+    def get(self, email):
+        return self._users.get(email)
+
+    def find(self, nick):
+        return self._nicks.get(nick.lower())
+
+    def add(self, user):
+        if self.config.has_section(user.email):
+            self.config.remove_section(user.email)
+
+        self.config.add_section(user.email)
+        self.config.set(user.email, 'Password', user.password or '')
+        self.config.set(user.email, 'Group', user.group)
+        self.config.set(user.email, 'Nick', user.nick or '')
+        self.config.set(user.email, 'DisplayName', user.name or '')
+        self._write()
+
+    def remove(self, email):
+        if not self.config.remove_section(email):
+            return False
+
+        self._write()
+        return True
+
+    def _write(self):
+        with open(self.path, 'w') as cf:
+            self.config.write(cf)
+
+        self._index()
+
+
+class SQLiteUserStore(UserStore):
+    """
+    Accounts stored in an SQLite database, for large user bases.
+
+    Lookups go straight to the database, so they always see the current accounts. Changes committed by other processes
+    (e.g. firefly-config useradd) are detected by check().
+    """
+    COLUMNS = 'email, grp, nick, display_name, password'
+
+    def __init__(self, path):
+        """
+        @type   path:   str
+        @param  path:   Path to the database file.
+        """
+        super(SQLiteUserStore, self).__init__()
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0o755)
+
+        self._db = sqlite3.connect(path)
+        self._db.text_factory = str
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS users (
+                email           TEXT PRIMARY KEY,
+                grp             TEXT NOT NULL DEFAULT 'user',
+                nick            TEXT,
+                display_name    TEXT,
+                password        TEXT
+            );
+            CREATE INDEX IF NOT EXISTS users_nick ON users (nick COLLATE NOCASE);
+        ''')
+        self._db.commit()
+        self._version = self._data_version()
+
+    def __iter__(self):
+        return iter([row[0] for row in self._db.execute('SELECT email FROM users ORDER BY email')])
+
+    @property
+    def location(self):
+        return self.path
+
+    def _data_version(self):
+        """
+        @return:    A value that changes whenever another connection commits to the database.
+        """
+        row = self._db.execute('PRAGMA data_version').fetchone()
+        if row:
+            return row[0]
+
+        # SQLite older than 3.8.8; fall back to the database file itself
+        stat = os.stat(self.path)
+        return stat.st_mtime, stat.st_size
+
+    def get(self, email):
+        row = self._db.execute('SELECT {c} FROM users WHERE email = ?'.format(c=self.COLUMNS), (email,)).fetchone()
+        return User(*row) if row else None
+
+    def find(self, nick):
+        row = self._db.execute('SELECT {c} FROM users WHERE nick = ? COLLATE NOCASE LIMIT 1'.format(c=self.COLUMNS),
+                               (nick,)).fetchone()
+        return User(*row) if row else None
+
+    def add(self, user):
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO users ({c}) VALUES (?, ?, ?, ?, ?)'.format(c=self.COLUMNS),
+                             (user.email, user.group, user.nick, user.name, user.password))
+
+    def remove(self, email):
+        with self._db:
+            return self._db.execute('DELETE FROM users WHERE email = ?', (email,)).rowcount > 0
+
+    def check(self):
+        version = self._data_version()
+        if version == self._version:
+            return False
+
+        self._log.info('User database changed, notifying subscribers')
+        self._version = version
+        self._notify()
+        return True
+
+    def close(self):
+        self._db.close()
+
+
+# Opened stores, shared by every server connection
+_stores = {}
+
+
+def open_store(config=None):
+    """
+    Open the user store selected in the auth configuration.
+
+    @type   config: ConfigParser.ConfigParser or None
+    @param  config: Auth configuration. Loaded from auth.cfg if not supplied.
+
+    @raise  ValueError: Raised if an unknown backend is configured.
+
+    @rtype: UserStore
+    """
+    from firefly import FireflyIRC
+
+    config = config or FireflyIRC.load_configuration('auth')
+    backend = config.get('Users', 'Backend').strip().lower()
+
+    if backend == 'config':
+        key = (backend, FireflyIRC.CONFIG_DIR)
+        if key not in _stores:
+            users_config = FireflyIRC.load_configuration('users')
+            path = os.path.join(FireflyIRC.CONFIG_DIR, 'config', 'users.cfg')
+            _stores[key] = ConfigUserStore(users_config, path, FireflyIRC.config_cache)
+    elif backend == 'sqlite':
+        path = os.path.join(FireflyIRC.DATA_DIR, os.path.expanduser(config.get('Users', 'Database')))
+        key = (backend, path)
+        if key not in _stores:
+            _stores[key] = SQLiteUserStore(path)
+    else:
+        raise ValueError('Unknown user store backend: {b}'.format(b=backend))
+
+    return _stores[key]
+
+
+def check_stores():
+    """
+    Check every opened user store for accounts changed from outside of this process.
+    """
+    for store in _stores.values():
+        store.check()
@@ -31,7 +31,7 @@ setup(
         'Development Status :: 1 - Planning',
         'License :: OSI Approved :: MIT License',
     ],
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks', 'benchmarks.*']),
     entry_points={
         'console_scripts': [
             'firefly = firefly.cli:cli',
@@ -39,6 +39,7 @@ setup(
         ],
         'firefly_irc.plugins': [
             'auth = firefly.plugins.auth:AuthPlugin',
+            'core = firefly.plugins.core:Core',
             'google = firefly.plugins.google:Google',
             'datetime = firefly.plugins.datetime:DateTime',
             'dictionary = firefly.plugins.dictionary:Dictionary',
@@ -1,5 +1,8 @@
 import unittest
 
+import mock
+
+from firefly.cache import LRUCache
 from firefly.languages.aml import AgentML, AgentMLLanguage
 
 
@@ -23,3 +26,23 @@ class AgentMLTests(AgentMLTestCase):
     """
     def test_default_instantiation(self):
         self.assertIsInstance(self.aml.aml, AgentML)
+
+    def test_session_measurement(self):
+        sizeof = mock.Mock(return_value=1)
+        self.aml.sessions = LRUCache(10, maxbytes=1024, sizeof=sizeof)
+        self.aml.prefilter.check = lambda message: True
+        self.aml.aml = mock.Mock(_users={'client': {}})
+        self.aml.aml.get_reply.return_value = 'Hello!'
+
+        # Sessions are measured when they're created
+        self.assertEqual(self.aml.get_reply('hello', 'client'), 'Hello!')
+        self.assertEqual(sizeof.call_count, 1)
+
+        # And re-measured periodically after that, rather than on every reply
+        for __ in range(AgentMLLanguage.SESSION_MEASURE_INTERVAL):
+            self.aml.get_reply('hello', 'client')
+        self.assertEqual(sizeof.call_count, 1)
+
+        self.aml.get_reply('hello', 'client')
+        self.assertEqual(sizeof.call_count, 2)
+        self.assertIn('client', self.aml.sessions)
@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import mock
+
+from firefly.auth import Auth, AuthSession, LoginThrottle
+from firefly.containers import Hostmask
+from firefly.users import User
+
+
+class LoginThrottleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.throttle = LoginThrottle(base_delay=1.0, max_delay=8.0, forget_after=60, clock=lambda: self.now)
+        self.host = ('host', 'example.org')
+        self.account = ('account', 'user@example.org')
+
+    def test_backoff(self):
+        self.assertEqual(self.throttle.retry_after(self.host, self.account), 0)
+
+        # Every consecutive failure doubles the delay, up to the maximum
+        for delay in (1.0, 2.0, 4.0, 8.0, 8.0):
+            self.throttle.failed(self.host, self.account)
+            self.assertEqual(self.throttle.retry_after(self.host, self.account), delay)
+            self.now += delay
+
+        self.assertEqual(self.throttle.retry_after(self.host, self.account), 0)
+
+    def test_keys(self):
+        self.throttle.failed(self.host)
+        self.throttle.failed(self.host)
+
+        # Throttled if any of the keys are throttled
+        self.assertEqual(self.throttle.retry_after(self.account), 0)
+        self.assertEqual(self.throttle.retry_after(self.host, self.account), 2.0)
+
+    def test_succeeded(self):
+        self.throttle.failed(self.host, self.account)
+        self.throttle.succeeded(self.host, self.account)
+        self.assertEqual(self.throttle.retry_after(self.host, self.account), 0)
+
+        self.throttle.failed(self.host)
+        self.assertEqual(self.throttle.retry_after(self.host), 1.0)
+
+    def test_forget(self):
+        self.throttle.failed(self.host)
+        self.throttle.failed(self.host)
+        self.now = 60.0
+
+        # Idle failures are forgotten, so the backoff starts over
+        self.throttle.failed(self.host)
+        self.assertEqual(self.throttle.retry_after(self.host), 1.0)
+
+
+class AuthSessionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.session = AuthSession(None, None, {'minutes': 1}, clock=lambda: self.now)
+
+    def test_lifetime(self):
+        self.assertEqual(self.session.expires, 60.0)
+
+        # Checking an active session refreshes it
+        self.now = 59.0
+        self.assertTrue(self.session.active)
+        self.assertEqual(self.session.expires, 119.0)
+
+        self.now = 119.0
+        self.assertFalse(self.session.active)
+
+    def test_no_lifetime(self):
+        session = AuthSession(None, None, None, clock=lambda: self.now)
+        self.now = 10 ** 9
+        self.assertIs(session.expires, False)
+        self.assertTrue(session.active)
+
+
+class AuthPersistenceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'sessions', 'irc.example.org.json')
+
+        self.accounts = {'user@example.org': User('user@example.org'), 'admin@example.org': User('admin@example.org')}
+        self.auth = self._auth()
+
+    def _auth(self):
+        with mock.patch('firefly.auth.open_store') as mock_open_store:
+            mock_open_store.return_value.get.side_effect = self.accounts.get
+            return Auth(mock.Mock())
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    @mock.patch('twisted.internet.task.LoopingCall')
+    def test_save_load(self, mock_looping_call):
+        self.auth.persist(self.path)
+        self.auth._start(AuthSession(self.accounts['user@example.org'], Hostmask('User!user@user.example.org'), 60))
+        self.auth._start(AuthSession(self.accounts['admin@example.org'], Hostmask('Admin!admin@admin.example.org'),
+                                     None))
+
+        # Sessions are saved as soon as they start
+        restored = self._auth()
+        self.assertEqual(restored.load(self.path), 2)
+
+        session = restored.sessions['user.example.org']
+        self.assertEqual(session.user.email, 'user@example.org')
+        self.assertEqual(session.hostmask.nick, 'User')
+        self.assertAlmostEqual(session.expires, self.auth.sessions['user.example.org'].expires, delta=1)
+        self.assertIs(restored.sessions['admin.example.org'].expires, False)
+
+    @mock.patch('twisted.internet.task.LoopingCall')
+    @mock.patch('firefly.auth.time')
+    def test_load_skipped(self, mock_time, mock_looping_call):
+        mock_time.time.return_value = time.time()
+        self.auth._start(AuthSession(self.accounts['user@example.org'], Hostmask('User!user@user.example.org'), 60))
+        self.auth._start(AuthSession(self.accounts['admin@example.org'], Hostmask('Admin!admin@admin.example.org'),
+                                     3600))
+        self.auth.save(self.path)
+
+        # Expired sessions and sessions of deleted accounts aren't restored
+        mock_time.time.return_value += 120
+        del self.accounts['admin@example.org']
+        self.assertEqual(self.auth.load(self.path), 0)
+
+    @mock.patch('twisted.internet.task.LoopingCall')
+    def test_services_sessions_not_saved(self, mock_looping_call):
+        self.auth._start(AuthSession(self.accounts['user@example.org'], Hostmask('User!user@user.example.org'), 60))
+        self.auth._start(AuthSession(self.accounts['admin@example.org'], Hostmask('Admin!admin@admin.example.org'),
+                                     60, account='Admin'))
+
+        # The server may no longer report the services account after a restart, so only password sessions are kept
+        self.assertEqual(self.auth.save(self.path), 1)
+
+        restored = self._auth()
+        self.assertEqual(restored.load(self.path), 1)
+        self.assertListEqual(restored.sessions.keys(), ['user.example.org'])
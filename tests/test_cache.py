@@ -0,0 +1,93 @@
+import unittest
+
+from twisted.internet import defer
+
+from firefly.cache import LRUCache, SingleFlight, deep_sizeof
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.evicted = []
+        self.cache = LRUCache(3, ttl=60, on_evict=lambda k, v: self.evicted.append(k), clock=lambda: self.now)
+
+    def test_maxsize(self):
+        for key in 'abc':
+            self.cache.set(key, key.upper())
+
+        # Reading an entry marks it as recently used
+        self.assertEqual(self.cache.get('a'), 'A')
+        self.cache.set('d', 'D')
+
+        self.assertListEqual(self.evicted, ['b'])
+        self.assertListEqual(list(self.cache), ['c', 'a', 'd'])
+        self.assertDictContainsSubset({'entries': 3, 'hits': 1, 'evictions': 1}, self.cache.stats)
+
+    def test_ttl(self):
+        self.cache.set('a', 'A')
+        self.now = 30.0
+        self.cache.set('b', 'B')
+
+        self.now = 60.0
+        self.assertNotIn('a', self.cache)
+        self.assertEqual(self.cache.get('b'), 'B')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertListEqual(self.evicted, ['a'])
+
+        self.now = 150.0
+        self.assertEqual(self.cache.expire(), 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_maxbytes(self):
+        cache = LRUCache(10, maxbytes=100, sizeof=len)
+        cache.set('a', 'x' * 60)
+        cache.set('b', 'x' * 30)
+        self.assertEqual(cache.size, 90)
+
+        cache.set('c', 'x' * 20)
+        self.assertListEqual(list(cache), ['b', 'c'])
+        self.assertEqual(cache.size, 50)
+
+        self.assertEqual(cache.pop('b'), 'x' * 30)
+        self.assertEqual(cache.size, 20)
+
+    def test_deep_sizeof(self):
+        self.assertGreater(deep_sizeof({'a': ['x' * 1000]}), 1000)
+        self.assertLess(deep_sizeof({'module': unittest}), 1000)
+
+
+class SingleFlightTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.calls = []
+
+    def _call(self, word):
+        self.calls.append(word)
+        self.pending = defer.Deferred()
+        return self.pending
+
+    def test_deduplicate(self):
+        results = []
+        self.flights.call('a', self._call, 'a').addCallback(results.append)
+        self.flights.call('a', self._call, 'a').addCallback(results.append)
+        self.assertIn('a', self.flights)
+
+        self.pending.callback('A')
+        self.assertListEqual(self.calls, ['a'])
+        self.assertListEqual(results, ['A', 'A'])
+        self.assertEqual(len(self.flights), 0)
+
+        # Once finished, the next call goes through again
+        self.flights.call('a', self._call, 'a')
+        self.assertListEqual(self.calls, ['a', 'a'])
+
+    def test_failure(self):
+        failures = []
+        for __ in range(2):
+            self.flights.call('a', self._call, 'a').addErrback(lambda f: failures.append(f.trap(KeyError)))
+
+        self.pending.errback(KeyError('a'))
+        self.assertListEqual(failures, [KeyError, KeyError])
+        self.assertNotIn('a', self.flights)
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from firefly import FireflyIRC
+from firefly.capture import TrafficRecorder, read_capture, compare_outputs, TemporaryDirectories
+
+
+class CaptureTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.capture = os.path.join(self.path, 'irc.example.org.cap.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_capture_round_trip(self):
+        lines = [
+            ':irc.example.org 001 Firefly :Welcome to the Example IRC Network Firefly',
+            ':Nick!~user@example.org PRIVMSG #testchan :Hello,\tworld!',
+        ]
+
+        recorder = TrafficRecorder(self.capture, 'irc.example.org')
+        for line in lines:
+            recorder.record(line)
+        recorder.close()
+
+        header, entries = read_capture(self.capture)
+        self.assertEqual(header['hostname'], 'irc.example.org')
+        self.assertListEqual([line for offset, line in entries], lines)
+        self.assertTrue(all(offset >= 0 for offset, line in entries))
+
+    def test_capture_redacts_auth(self):
+        recorder = TrafficRecorder(self.capture, 'irc.example.org')
+        recorder.record(':Nick!~user@example.org PRIVMSG Firefly :>>>auth login user@example.org hunter2')
+        recorder.record(':Nick!~user@example.org PRIVMSG #testchan :>>>author login user@example.org')
+        recorder.close()
+
+        header, entries = read_capture(self.capture)
+        self.assertListEqual([line for offset, line in entries], [
+            ':Nick!~user@example.org PRIVMSG Firefly :>>>auth login [redacted]',
+            ':Nick!~user@example.org PRIVMSG #testchan :>>>author login user@example.org',
+        ])
+        self.assertEqual(os.stat(self.capture).st_mode & 0o777, 0o600)
+
+    def test_invalid_capture(self):
+        recorder = TrafficRecorder(self.capture, 'irc.example.org')
+        recorder.close()
+
+        with open(self.capture, 'w') as f:
+            f.write('not a capture')
+
+        self.assertRaises(Exception, read_capture, self.capture)
+
+    def test_compare_outputs(self):
+        expected = [(0, ['PRIVMSG #testchan :pong']), (4, ['PRIVMSG Nick :hi'])]
+        actual   = [(0, ['PRIVMSG #testchan :pong']), (5, ['PRIVMSG Nick :hi'])]
+
+        self.assertListEqual(compare_outputs(expected, expected), [])
+        self.assertListEqual(compare_outputs(expected, actual),
+                             [(4, ['PRIVMSG Nick :hi'], []), (5, [], ['PRIVMSG Nick :hi'])])
+
+    def test_temporary_directories(self):
+        data_dir = FireflyIRC.DATA_DIR
+
+        with TemporaryDirectories() as directories:
+            self.assertEqual(FireflyIRC.DATA_DIR, os.path.join(directories.path, 'data'))
+
+        self.assertEqual(FireflyIRC.DATA_DIR, data_dir)
+        self.assertFalse(os.path.exists(directories.path))
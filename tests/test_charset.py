@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from firefly.charset import Charset
+
+
+class CharsetTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.charset = Charset()
+
+    def test_decode_utf8(self):
+        line = ':Nick!~user@example.org PRIVMSG #test :caf\xc3\xa9'
+        self.assertEqual(self.charset.decode(line), u':Nick!~user@example.org PRIVMSG #test :café')
+        self.assertEqual(len(self.charset.sources), 0)
+
+    def test_decode_fallback(self):
+        line = ':Nick!~user@example.org PRIVMSG #test :caf\xe9 \x93quoted\x94'
+        self.assertEqual(self.charset.decode(line), u':Nick!~user@example.org PRIVMSG #test :café “quoted”')
+        self.assertEqual(self.charset.sources.get('Nick!~user@example.org'), 'cp1252')
+
+        # Lines from other sources are unaffected
+        line = ':Other!~user@example.org PRIVMSG #test :caf\xc3\xa9'
+        self.assertEqual(self.charset.decode(line), u':Other!~user@example.org PRIVMSG #test :café')
+
+    def test_unknown_encoding(self):
+        charset = Charset(['utf-8', 'not-an-encoding', 'latin-1'])
+        self.assertListEqual(charset.encodings, ['utf-8', 'iso8859-1'])
+
+    def test_encode(self):
+        self.assertEqual(self.charset.encode(u'café'), 'caf\xc3\xa9')
+        self.assertEqual(self.charset.encode('caf\xc3\xa9'), 'caf\xc3\xa9')
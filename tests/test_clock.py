@@ -0,0 +1,52 @@
+import unittest
+
+from firefly.clock import monotonic, TimerWheel
+
+
+class TimerWheelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.expired = []
+        self.wheel = TimerWheel(tick=1.0, slots=8, on_expire=self.expired.append, clock=lambda: self.now)
+
+    def test_monotonic(self):
+        self.assertLessEqual(monotonic(), monotonic())
+
+    def test_expire(self):
+        self.wheel.schedule('a', 2.5)
+        self.wheel.schedule('b', 4.0)
+
+        self.assertListEqual(self.wheel.advance(2.0), [])
+        self.assertListEqual(self.wheel.advance(3.0), ['a'])
+        self.assertListEqual(self.wheel.advance(4.0), ['b'])
+        self.assertListEqual(self.expired, ['a', 'b'])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_reschedule(self):
+        self.wheel.schedule('a', 2.0)
+        self.wheel.schedule('b', 5.0)
+
+        # Postponed deadlines are carried over, brought forward deadlines move immediately
+        self.wheel.schedule('a', 6.0)
+        self.wheel.schedule('b', 1.0)
+        self.assertListEqual(self.wheel.advance(3.0), ['b'])
+        self.assertListEqual(self.wheel.advance(5.0), [])
+        self.assertListEqual(self.wheel.advance(6.0), ['a'])
+
+    def test_rotations(self):
+        # Deadlines more than a rotation away survive every pass of their slot until they're due
+        self.wheel.schedule('a', 20.0)
+        for now in xrange(1, 20):
+            self.assertListEqual(self.wheel.advance(float(now)), [])
+
+        # Falling behind by several rotations still expires everything
+        self.wheel.schedule('b', 21.0)
+        self.assertListEqual(sorted(self.wheel.advance(100.0)), ['a', 'b'])
+
+    def test_cancel(self):
+        self.wheel.schedule('a', 1.0)
+        self.assertTrue(self.wheel.cancel('a'))
+        self.assertFalse(self.wheel.cancel('a'))
+        self.assertNotIn('a', self.wheel)
+        self.assertListEqual(self.wheel.advance(2.0), [])
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from firefly.configuration import ConfigurationCache, copy_configuration
+
+
+class ConfigurationCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.default = os.path.join(self.path, 'default.cfg')
+        self.user = os.path.join(self.path, 'user.cfg')
+
+        self._write(self.default, '[Test]\nName = Default\nValue = 1\n')
+        self._write(self.user, '[Test]\nName = User\n')
+
+        self.cache = ConfigurationCache()
+        self.key = ('test', None, None)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write(self, path, contents, mtime=None):
+        with open(path, 'w') as f:
+            f.write(contents)
+
+        if mtime:
+            os.utime(path, (mtime, mtime))
+
+    def test_load(self):
+        config = self.cache.load(self.key, [self.default, self.user])
+
+        self.assertEqual(config.get('Test', 'Name'), 'User')
+        self.assertEqual(config.getint('Test', 'Value'), 1)
+        self.assertIs(self.cache.get(self.key), config)
+        self.assertIsNone(self.cache.get(('missing', None, None)))
+
+    def test_check_unchanged(self):
+        self.cache.load(self.key, [self.default, self.user])
+        self.assertListEqual(self.cache.check(), [])
+
+    def test_check_reloads_in_place(self):
+        config = self.cache.load(self.key, [self.default, self.user])
+        self._write(self.user, '[Test]\nName = Changed\n', os.path.getmtime(self.user) + 10)
+
+        self.assertListEqual(self.cache.check(), [config])
+        self.assertEqual(config.get('Test', 'Name'), 'Changed')
+        self.assertEqual(config.getint('Test', 'Value'), 1)
+
+    def test_check_malformed(self):
+        config = self.cache.load(self.key, [self.default, self.user])
+        mtime = os.path.getmtime(self.user)
+
+        # A file that can't be parsed leaves the current values in place
+        self._write(self.user, 'Name = Broken\n', mtime + 10)
+        self.assertListEqual(self.cache.check(), [])
+        self.assertEqual(config.get('Test', 'Name'), 'User')
+
+        # And is read again once it's fixed
+        self._write(self.user, '[Test]\nName = Fixed\n', mtime + 20)
+        self.assertListEqual(self.cache.check(), [config])
+        self.assertEqual(config.get('Test', 'Name'), 'Fixed')
+
+    def test_subscribers(self):
+        config = self.cache.load(self.key, [self.default, self.user])
+        reloaded = []
+
+        self.assertTrue(self.cache.subscribe(config, reloaded.append))
+        self._write(self.default, '[Test]\nName = Default\nValue = 2\n', os.path.getmtime(self.default) + 10)
+        self.cache.check()
+
+        self.assertListEqual(reloaded, [config])
+        self.assertEqual(config.getint('Test', 'Value'), 2)
+
+        self.cache.unsubscribe(reloaded.append)
+        self._write(self.default, '[Test]\nName = Default\nValue = 3\n', os.path.getmtime(self.default) + 20)
+        self.cache.check()
+
+        self.assertListEqual(reloaded, [config])
+
+    def test_subscribe_uncached(self):
+        self.assertFalse(self.cache.subscribe(object(), lambda config: None))
+
+    def test_copy(self):
+        config = self.cache.load(self.key, [self.default, self.user])
+        duplicate = copy_configuration(config)
+
+        duplicate.set('Test', 'Name', 'Copy')
+        duplicate.add_section('Other')
+
+        self.assertEqual(duplicate.get('Test', 'Name'), 'Copy')
+        self.assertEqual(duplicate.getint('Test', 'Value'), 1)
+        self.assertEqual(config.get('Test', 'Name'), 'User')
+        self.assertListEqual(config.sections(), ['Test'])
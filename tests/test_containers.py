@@ -4,10 +4,13 @@ from ConfigParser import ConfigParser
 
 import arrow
 import mock
-import socket
+from twisted.internet import defer
+from twisted.internet.error import DNSLookupError
 
 from firefly import FireflyIRC
+from firefly.cache import LRUCache
 from firefly.containers import Server, Channel, ServerInfo, Destination, Hostmask, Message, Identity, Response
+from firefly.resolver import Resolver
 
 
 class ServerTestCase(unittest.TestCase):
@@ -216,16 +219,23 @@ class HostmaskTestCase(unittest.TestCase):
         self.assertEqual(hostmask.username, '~user')
         self.assertEqual(hostmask.host, 'example.org')
 
-    # This test will fail if the host machine is not connected to a working network
     def test_hostmask_resolution(self):
-        hostmask = Hostmask('Nick!~user@example.org')
-        self.assertEqual(hostmask.resolve_host(), '93.184.216.34')
+        hosts = {'example.org': '93.184.216.34'}
+
+        def lookup(host):
+            if host in hosts:
+                return defer.succeed(hosts[host])
+            return defer.fail(DNSLookupError(host))
 
-        hostmask = Hostmask('Nick!~user@testhost.example')
-        self.assertFalse(hostmask.resolve_host())
+        results = []
+        with mock.patch.object(FireflyIRC, 'resolver', Resolver(lookup=lookup)):
+            Hostmask('Nick!~user@example.org').resolve_host().addCallback(results.append)
+            Hostmask('Nick!~user@testhost.example').resolve_host().addCallback(results.append)
+            Hostmask('Nick!~user@testhost.example').resolve_host(False).addErrback(results.append)
 
-        hostmask = Hostmask('Nick!~user@testhost.example')
-        self.assertRaises(socket.error, hostmask.resolve_host, False)
+        self.assertEqual(results[0], '93.184.216.34')
+        self.assertIs(results[1], False)
+        results[2].trap(DNSLookupError)
 
 
 class MessageTestCase(unittest.TestCase):
@@ -313,6 +323,70 @@ class MessageTestCase(unittest.TestCase):
 
         self.assertTupleEqual(r, ('testCase', 'Hello! This, this testCase is a test.', r[2]))
 
+    def test_get_mention(self):
+        message = Message('Hello! This is a test, TestCase', self.mock_firefly, self.hostmask)
+
+        r = message.get_mention(['casetest', 'TestCase'])
+        self.assertTupleEqual(r, ('TestCase', 'Hello! This is a test', r[2]))
+        self.assertIs(message.get_mention(['casetest', 'TestCase']), r)
+
+        message = Message('Hello! This is a test.', self.mock_firefly, self.hostmask)
+        self.assertIsNone(message.get_mention(['casetest', 'TestCase']))
+
+    def test_non_ascii_repr(self):
+        destination = Destination(self.mock_firefly, u'#caf\xe9')
+        hostmask = Hostmask(u'b\xf8b!~user@example.org')
+
+        self.assertEqual(repr(destination), '<FireflyIRC Container: Destination(firefly, #caf\xc3\xa9)>')
+        self.assertEqual(str(destination), '#caf\xc3\xa9')
+        self.assertEqual(unicode(destination), u'#caf\xe9')
+        self.assertEqual(repr(hostmask), '<FireflyIRC Container: Hostmask("b\xc3\xb8b!~user@example.org")>')
+        self.assertEqual(unicode(hostmask), u'b\xf8b!~user@example.org')
+
+    def test_mention_regex_cache(self):
+        with mock.patch.object(Message, '_mention_regexes', LRUCache(2)):
+            for nick in ('one', 'two', 'three'):
+                Message('Hello, {n}'.format(n=nick), self.mock_firefly, self.hostmask).get_mention([nick])
+
+            # Only the most recently used regexes are kept
+            self.assertEqual(len(Message._mention_regexes), 2)
+
+    @mock.patch('firefly.containers.unstyle')
+    def test_unformatted_fast_path(self, mock_unstyle):
+        message = Message('  Hello, world!  ', self.mock_firefly, self.hostmask)
+        self.assertEqual(message.stripped, 'Hello, world!')
+        self.assertFalse(mock_unstyle.called)
+
+        mock_unstyle.return_value = 'Hello, world!'
+        message = Message(self.message, self.mock_firefly, self.hostmask)
+        self.assertEqual(message.stripped, self.stripped)
+        self.assertEqual(message.stripped, self.stripped)
+        mock_unstyle.assert_called_once_with(self.message)
+
+    @mock.patch('firefly.containers.shlex.split')
+    def test_command_parts(self, mock_split):
+        mock_split.return_value = ['plugin', 'command', 'arg']
+        self.mock_firefly.server.command_prefix = '>>>'
+        destination = Destination(self.mock_firefly, '#testchan')
+
+        message = Message('>>> plugin command arg', destination, self.hostmask)
+        self.assertTrue(message.is_command)
+        self.assertTupleEqual(message.command_parts, ('plugin', 'command', ['arg']))
+        self.assertTupleEqual(message.command_parts, ('plugin', 'command', ['arg']))
+        mock_split.assert_called_once_with('plugin command arg')
+
+        message = Message('plugin command arg', destination, self.hostmask)
+        self.assertFalse(message.is_command)
+        self.assertRaises(ValueError, getattr, message, 'command_parts')
+
+    def test_unicode_command_parts(self):
+        self.mock_firefly.server.command_prefix = '>>>'
+        destination = Destination(self.mock_firefly, '#testchan')
+
+        message = Message(u'>>> dictionary define "caf\xe9 au lait"', destination, self.hostmask)
+        self.assertTupleEqual(message.command_parts, (u'dictionary', u'define', [u'caf\xe9 au lait']))
+        self.assertEqual(str(message), '>>> dictionary define "caf\xc3\xa9 au lait"')
+
 
 # noinspection PyTypeChecker
 class ResponseTestCase(unittest.TestCase):
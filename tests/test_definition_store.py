@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+from twisted.internet.task import Clock
+from twisted.python.failure import Failure
+
+from firefly.plugins.dictionary.store import DefinitionStore
+
+
+class SynchronousPool(object):
+    """
+    A thread pool that runs everything immediately, in the calling thread.
+    """
+    def __init__(self):
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def callInThread(self, func, *args):
+        func(*args)
+
+    def callInThreadWithCallback(self, on_result, func, *args):
+        try:
+            result = func(*args)
+        except Exception:
+            on_result(False, Failure())
+        else:
+            on_result(True, result)
+
+
+class Reactor(Clock):
+
+    def __init__(self):
+        Clock.__init__(self)
+        self.triggers = []
+
+    def callFromThread(self, func, *args):
+        func(*args)
+
+    def addSystemEventTrigger(self, phase, event, func):
+        self.triggers.append(func)
+        return func
+
+    def removeSystemEventTrigger(self, trigger):
+        self.triggers.remove(trigger)
+
+
+class DefinitionStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'definitions')
+        self.reactor = Reactor()
+        self.now = 1000.0
+        self.store = self._open()
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def _open(self):
+        return DefinitionStore(self.path, sync_interval=30, prune_interval=60, reactor=self.reactor,
+                               pool=SynchronousPool(), clock=lambda: self.now)
+
+    def _get(self, key):
+        results = []
+        self.store.get(key).addCallback(results.append)
+        return results[0]
+
+    def test_get_set(self):
+        self.assertIsNone(self._get('test'))
+
+        self.store.set('test', (self.now + 10, ['definition'], []))
+        self.assertEqual(self._get('test'), (self.now + 10, ['definition'], []))
+
+    def test_batched_sync(self):
+        with mock.patch.object(self.store._shelf, 'sync') as mock_sync:
+            self.store.set('one', (self.now + 10, [], []))
+            self.store.set('two', (self.now + 10, [], []))
+            self.assertFalse(mock_sync.called)
+
+            self.reactor.advance(30)
+            mock_sync.assert_called_once_with()
+
+            # Nothing has been written since
+            self.store.sync()
+            mock_sync.assert_called_once_with()
+
+    def test_prune(self):
+        self.store.set('expired', (self.now + 10, [], []))
+        self.store.set('fresh', (self.now + 100, ['definition'], []))
+        self.store.close()
+        size = os.path.getsize(self.path + '.dat')
+
+        # Expired entries are pruned when the store is opened
+        self.now += 50
+        self.store = self._open()
+        self.assertIsNone(self._get('expired'))
+        self.assertEqual(self._get('fresh'), (1100.0, ['definition'], []))
+        self.assertLess(os.path.getsize(self.path + '.dat'), size)
+
+        # And then every prune interval
+        self.now += 60
+        self.store.sync()
+        self.assertIsNone(self._get('fresh'))
+
+    def test_prune_siblings(self):
+        sibling = self.path + '.old'
+        with open(sibling, 'w') as f:
+            f.write('unrelated')
+
+        self.store.set('expired', (self.now + 10, [], []))
+        self.now += 60
+        self.store.sync()
+
+        # Only the shelf's own files are replaced
+        self.assertIsNone(self._get('expired'))
+        self.assertTrue(os.path.isfile(sibling))
+
+    def test_close(self):
+        pool = self.store._pool
+        self.assertListEqual(self.reactor.triggers, [self.store.close])
+
+        self.store.set('test', (self.now + 10, [], []))
+        self.store.close()
+
+        self.assertFalse(pool.running)
+        self.assertListEqual(self.reactor.triggers, [])
+        self.assertListEqual(self.reactor.getDelayedCalls(), [])
@@ -0,0 +1,111 @@
+import random
+import unittest
+
+import mock
+
+from firefly import filters
+from firefly.filters import AhoCorasick, KeywordSearch, EventFilter, EventMatcher
+
+
+class AhoCorasickTestCase(unittest.TestCase):
+
+    def test_search(self):
+        automaton = AhoCorasick(['he', 'she', 'his', 'hers', 'http://'])
+        self.assertEqual(automaton.search('ushers'), {'he', 'she', 'hers'})
+        self.assertEqual(automaton.search('see http://example.org'), {'http://'})
+        self.assertEqual(automaton.search('nothing here'), {'he'})
+        self.assertEqual(automaton.search(''), frozenset())
+
+    def test_random(self):
+        # Compare against plain substring checks, with a small alphabet so keywords overlap a lot
+        rand = random.Random(0)
+        for __ in range(50):
+            keywords = {''.join(rand.choice('abc') for __ in range(rand.randint(1, 5))) for __ in range(10)}
+            text = ''.join(rand.choice('abcd') for __ in range(40))
+            self.assertEqual(AhoCorasick(keywords).search(text), {k for k in keywords if k in text})
+
+
+class KeywordSearchTestCase(unittest.TestCase):
+
+    def test_search(self):
+        keywords = ['www', '/', 'Example']
+        with mock.patch.object(filters, 'AUTOMATON_THRESHOLD', 0):
+            automaton = KeywordSearch(keywords)
+
+        for search in (KeywordSearch(keywords), automaton):
+            self.assertEqual(search.search('See WWW.EXAMPLE.org'), {'www', 'example'})
+            self.assertEqual(search.search('hello'), frozenset())
+
+
+class EventFilterTestCase(unittest.TestCase):
+
+    def message(self, text, channel='#test', message_type='message'):
+        destination = mock.Mock(is_channel=channel is not None, raw=channel or 'Firefly')
+        return mock.Mock(stripped=text, type=message_type, destination=destination)
+
+    def matches(self, event_filter, **kwargs):
+        return bool(EventMatcher([('handler', event_filter)]).match(kwargs))
+
+    def test_keywords(self):
+        event_filter = EventFilter(keywords=['/', 'www'])
+        self.assertTrue(self.matches(event_filter, message=self.message('see http://example.org')))
+        self.assertTrue(self.matches(event_filter, message=self.message('WWW.example.org')))
+        self.assertFalse(self.matches(event_filter, message=self.message('hello, world')))
+
+        # Events without a message never match message conditions
+        self.assertFalse(self.matches(event_filter, channel='#test'))
+
+    def test_regex(self):
+        event_filter = EventFilter(regex=r'\bping\b')
+        self.assertTrue(self.matches(event_filter, message=self.message('ping?')))
+        self.assertFalse(self.matches(event_filter, message=self.message('pinging')))
+
+    def test_channels(self):
+        event_filter = EventFilter(channels=['#Firefly'])
+        self.assertTrue(self.matches(event_filter, message=self.message('hi', '#firefly')))
+        self.assertFalse(self.matches(event_filter, message=self.message('hi', '#test')))
+        self.assertFalse(self.matches(event_filter, message=self.message('hi', None)))
+        self.assertTrue(self.matches(event_filter, channel='#firefly'))
+
+        event_filter = EventFilter(exclude_channels=['#quiet'])
+        self.assertTrue(self.matches(event_filter, message=self.message('hi', '#test')))
+        self.assertTrue(self.matches(event_filter, message=self.message('hi', None)))
+        self.assertFalse(self.matches(event_filter, message=self.message('hi', '#QUIET')))
+
+    def test_channels_unicode(self):
+        event_filter = EventFilter(channels=[u'#\xdcber'])
+        self.assertTrue(self.matches(event_filter, message=self.message('hi', u'#\xfcber')))
+        self.assertTrue(self.matches(event_filter, channel=u'#\xdcBER'))
+        self.assertFalse(self.matches(event_filter, channel=u'#uber'))
+
+        event_filter = EventFilter(exclude_channels=[u'#\xfcber'])
+        self.assertFalse(self.matches(event_filter, message=self.message('hi', u'#\xdcber')))
+
+    def test_message_types(self):
+        event_filter = EventFilter(message_types=['action'])
+        self.assertTrue(self.matches(event_filter, action=self.message('waves', message_type='action')))
+        self.assertFalse(self.matches(event_filter, message=self.message('hello')))
+
+    def test_from_params(self):
+        self.assertIsNone(EventFilter.from_params(keywords=None, regex=None, channels=[]))
+        self.assertIsInstance(EventFilter.from_params(keywords=['www'], regex=None), EventFilter)
+
+
+class EventMatcherTestCase(unittest.TestCase):
+
+    def test_match(self):
+        message = mock.Mock(stripped='see www.example.org', type='message', destination=mock.Mock(is_channel=False))
+        matcher = EventMatcher([
+            ('unfiltered', None),
+            ('url', EventFilter(keywords=['/', 'www'])),
+            ('ping', EventFilter(keywords=['ping'])),
+            ('action', EventFilter(message_types=['action'])),
+        ])
+
+        self.assertListEqual(matcher.match({'message': message}), ['unfiltered', 'url'])
+        self.assertEqual(matcher.keyword_search.keywords, {'/', 'www', 'ping'})
+
+    def test_unfiltered(self):
+        matcher = EventMatcher([('a', None), ('b', None)])
+        self.assertIsNone(matcher.keyword_search)
+        self.assertListEqual(matcher.match({}), ['a', 'b'])
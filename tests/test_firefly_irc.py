@@ -8,8 +8,11 @@ from mock import mock
 
 import firefly
 from firefly import FireflyIRC, irc, PluginAbstract, errors, containers
+from firefly.capture import TemporaryDirectories
 from firefly.containers import Server
+from firefly.filters import EventFilter
 from firefly.languages.aml import AgentMLLanguage
+from firefly.languages.cache import LanguageCache
 from firefly.languages.interface import LanguageInterface
 
 
@@ -61,6 +64,11 @@ class FireflyIRCTestCase(unittest.TestCase):
         """
         Set up the Unit Test
         """
+        # Keep configuration, data and compiled language files out of the users real directories
+        directories = TemporaryDirectories()
+        directories.__enter__()
+        self.addCleanup(directories.__exit__, None, None, None)
+
         self.config_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'config')
 
         self.server_config = ConfigParser()
@@ -100,6 +108,15 @@ class MessageDeliveryTestCase(FireflyIRCTestCase):
 
         mock_msg.assert_called_once_with(firefly_irc, '#testchan', 'Hello, world!', None)
 
+    @mock.patch.object(firefly.IRCClient, 'msg')
+    def test_non_ascii_channel_message(self, mock_msg):
+        firefly_irc = FireflyIRC(Server(self.hostname, self.config))
+
+        dest = containers.Destination(firefly_irc, u'#caf\xe9')
+        firefly_irc.msg(dest, u'Hello, w\xf6rld!')
+
+        mock_msg.assert_called_once_with(firefly_irc, '#caf\xc3\xa9', 'Hello, w\xc3\xb6rld!', None)
+
     @mock.patch.object(firefly.IRCClient, 'msg')
     def test_user_message(self, mock_msg):
         firefly_irc = FireflyIRC(Server(self.hostname, self.config))
@@ -290,6 +307,10 @@ class PluginCommandTestCase(FireflyIRCTestCase):
 
             return _ping
 
+    class LazyPluginTest(PluginTest):
+
+        FIREFLY_IRC_LAZY_LOAD = True
+
     def test_bind_command(self):
         firefly_irc = FireflyIRC(Server(self.hostname, self.config))
         params = {'name': 'ping', 'permission': 'guest'}
@@ -378,6 +399,248 @@ class PluginCommandTestCase(FireflyIRCTestCase):
 
         mock_msg.assert_called_once_with(host, 'wong wong wong')
 
+    def test_lazy_bind_command(self):
+        firefly_irc = FireflyIRC(Server(self.hostname, self.config))
+        params = {'name': 'ping', 'permission': 'guest'}
+
+        firefly_irc.registry.bind_command('ping', self.LazyPluginTest, self.LazyPluginTest.ping, params)
+
+        self.assertIn('ping', firefly_irc.registry._commands['lazyplugintest'])
+        self.assertNotIn('lazyplugintest', firefly_irc.registry.plugins)
+
+        plugin_obj, func, argparse, params = firefly_irc.registry.get_command('lazyplugintest', 'ping')
+        self.assertIsInstance(plugin_obj, self.LazyPluginTest)
+        self.assertIs(firefly_irc.registry.plugins['lazyplugintest'], plugin_obj)
+
+    def test_lazy_bind_event(self):
+        firefly_irc = FireflyIRC(Server(self.hostname, self.config))
+        params = {'name': irc.on_channel_message, 'permission': 'guest', 'command_ok': False, 'reply_ok': False}
+
+        firefly_irc.registry.bind_event(irc.on_channel_message, self.LazyPluginTest, self.LazyPluginTest.ping, params)
+        self.assertNotIn('lazyplugintest', firefly_irc.registry.plugins)
+
+        events = firefly_irc.registry.get_events(irc.on_channel_message)
+        self.assertIn('lazyplugintest', firefly_irc.registry.plugins)
+        self.assertIn((firefly_irc.registry.plugins['lazyplugintest'], self.LazyPluginTest.ping, params), events)
+
+    def test_filtered_lazy_event(self):
+        firefly_irc = FireflyIRC(Server(self.hostname, self.config))
+        params = {'name': irc.on_channel_message, 'permission': 'guest', 'command_ok': False, 'reply_ok': False,
+                  'filter': EventFilter(keywords=['ping'])}
+
+        firefly_irc.registry.bind_event(irc.on_channel_message, self.LazyPluginTest, self.LazyPluginTest.ping, params)
+
+        dest = containers.Destination(firefly_irc, '#test')
+        host = containers.Hostmask('Nick!~user@example.org')
+
+        def get_events(message):
+            # Only our own binding, not those of the plugins loaded by default
+            events = firefly_irc.registry.get_events(irc.on_channel_message, {'message': message})
+            return [event for event in events if event[1] == self.LazyPluginTest.ping]
+
+        # Lazy plugins aren't loaded for events their filters don't match
+        self.assertListEqual(get_events(containers.Message('Hello, world!', dest, host)), [])
+        self.assertNotIn('lazyplugintest', firefly_irc.registry.plugins)
+
+        events = get_events(containers.Message('PING?', dest, host))
+        plugin_obj = firefly_irc.registry.plugins['lazyplugintest']
+        self.assertListEqual(events, [(plugin_obj, self.LazyPluginTest.ping, params)])
+
+    @mock.patch.object(FireflyIRC, 'msg')
+    def test_lazy_ping(self, mock_msg):
+        firefly_irc = FireflyIRC(Server(self.hostname, self.config))
+        params = {'name': 'ping', 'permission': 'guest'}
+
+        firefly_irc.registry.bind_command('ping', self.LazyPluginTest, self.LazyPluginTest.ping, params)
+
+        dest = containers.Destination(firefly_irc, '#test')
+        message = containers.Message('>>> lazyplugintest ping 2', dest, containers.Hostmask('Nick!~user@example.org'))
+        firefly_irc._fire_command('lazyplugintest', 'ping', ['2'], message)
+
+        mock_msg.assert_called_once_with(dest, 'pong pong')
+
+
+class PluginReloadTestCase(FireflyIRCTestCase):
+
+    PluginTest = PluginCommandTestCase.PluginTest
+
+    def _bind(self, firefly_irc):
+        params = {'name': 'ping', 'permission': 'guest'}
+        firefly_irc.registry.bind_command('ping', self.PluginTest, self.PluginTest.ping, params)
+
+        params = {'name': irc.on_channel_message, 'permission': 'guest', 'command_ok': False, 'reply_ok': False}
+        firefly_irc.registry.bind_event(irc.on_channel_message, self.PluginTest, self.PluginTest.ping, params)
+
+    def test_unbind_plugin(self):
+        firefly_irc = FireflyIRC(Server(self.hostname, self.config))
+        self._bind(firefly_irc)
+        plugin_obj = firefly_irc.registry.plugins['plugintest']
+
+        with mock.patch.object(plugin_obj, 'unload') as mock_unload:
+            firefly_irc.registry.unbind_plugin('PluginTest')
+            mock_unload.assert_called_once_with()
+
+        self.assertNotIn('plugintest', firefly_irc.registry.plugins)
+        self.assertRaises(errors.NoSuchPluginError, firefly_irc.registry.get_command, 'plugintest', 'ping')
+        self.assertNotIn(plugin_obj, [e[0] for e in firefly_irc.registry.get_events(irc.on_channel_message)])
+        self.assertRaises(errors.NoSuchPluginError, firefly_irc.registry.unbind_plugin, 'plugintest')
+
+    @mock.patch('__builtin__.reload', side_effect=lambda module: module)
+    def test_reload_plugin(self, mock_reload):
+        firefly_irc = FireflyIRC(Server(self.hostname, self.config))
+        self._bind(firefly_irc)
+
+        with mock.patch.object(firefly_irc.host, 'scan') as mock_scan:
+            firefly_irc.registry.reload_plugin('plugintest')
+            mock_scan.assert_called_once_with(inspect.getmodule(self.PluginTest))
+
+        mock_reload.assert_called_with(inspect.getmodule(self.PluginTest))
+        self.assertNotIn('plugintest', firefly_irc.registry.plugins)
+        self.assertRaises(errors.NoSuchPluginError, firefly_irc.registry.reload_plugin, 'badplugin')
+
+    @mock.patch('__builtin__.reload', side_effect=SyntaxError('invalid syntax'))
+    def test_reload_plugin_error(self, mock_reload):
+        firefly_irc = FireflyIRC(Server(self.hostname, self.config))
+        self._bind(firefly_irc)
+
+        self.assertRaises(errors.PluginError, firefly_irc.registry.reload_plugin, 'plugintest')
+        self.assertIn('plugintest', firefly_irc.registry.plugins)
+        self.assertIsInstance(firefly_irc.registry.get_command('plugintest', 'ping'), tuple)
+
+    @mock.patch('__builtin__.reload', side_effect=lambda module: module)
+    def test_reload_plugin_bind_error(self, mock_reload):
+        firefly_irc = FireflyIRC(Server(self.hostname, self.config))
+        self._bind(firefly_irc)
+        registry = firefly_irc.registry
+        plugin_obj = registry.plugins['plugintest']
+
+        def scan(module):
+            # Fail part way through binding the reloaded plugin
+            registry._commands['plugintest'] = {}
+            raise errors.PluginCommandExistsError('ping')
+
+        with mock.patch.object(firefly_irc.host, 'scan', side_effect=scan), \
+                mock.patch.object(plugin_obj, 'unload') as mock_unload:
+            self.assertRaises(errors.PluginError, registry.reload_plugin, 'plugintest')
+            self.assertFalse(mock_unload.called)
+
+        self.assertIs(registry.plugins['plugintest'], plugin_obj)
+        self.assertIsInstance(registry.get_command('plugintest', 'ping'), tuple)
+        self.assertIn(plugin_obj, [e[0] for e in registry.get_events(irc.on_channel_message)])
+
+
+class PluginHostTestCase(FireflyIRCTestCase):
+
+    PluginTest = PluginCommandTestCase.PluginTest
+
+    def test_shared_registry(self):
+        host = firefly.PluginHost()
+        first = FireflyIRC(Server(self.hostname, self.config), host=host)
+        second = FireflyIRC(Server(self.hostname, self.config), host=host)
+
+        self.assertIs(first.registry, second.registry)
+        self.assertEqual(host.connections, [first, second])
+
+    def test_detach(self):
+        host = firefly.PluginHost()
+        first = FireflyIRC(Server(self.hostname, self.config), host=host)
+        second = FireflyIRC(Server(self.hostname, self.config), host=host)
+
+        with mock.patch.object(firefly.IRCClient, 'connectionLost'):
+            first.connectionLost(None)
+        self.assertEqual(host.connections, [second])
+
+        # Reconnecting reattaches the same connection, without loading its language files again
+        with mock.patch.object(firefly.IRCClient, 'connectionMade'), \
+                mock.patch.object(PluginAbstract, '_load_language') as mock_load_language:
+            first.connectionMade()
+            first.connectionMade()
+        self.assertEqual(host.connections, [second, first])
+        self.assertFalse(mock_load_language.called)
+
+    @mock.patch.object(FireflyIRC, 'msg')
+    def test_deprecated_firefly(self, mock_msg):
+        host = firefly.PluginHost()
+        first = FireflyIRC(Server(self.hostname, self.config), host=host)
+        second = FireflyIRC(Server(self.hostname, self.config), host=host)
+
+        params = {'name': 'ping', 'permission': 'guest'}
+
+        host.registry.bind_command('ping', self.PluginTest, self.PluginTest.ping, params)
+        plugin_obj = host.registry.plugins['plugintest']
+        with mock.patch('warnings.warn') as mock_warn:
+            self.assertIs(plugin_obj.firefly, first)
+            self.assertIs(mock_warn.call_args[0][1], DeprecationWarning)
+
+        # Resolves to the connection currently being handled
+        dest = containers.Destination(second, '#test')
+        message = containers.Message('>>> plugintest ping 1', dest, containers.Hostmask('Nick!~user@example.org'))
+        second._fire_command('plugintest', 'ping', ['1'], message)
+        with mock.patch('warnings.warn'):
+            self.assertIs(plugin_obj.firefly, second)
+
+    def test_language_cache(self):
+        host = firefly.PluginHost()
+        self.assertEqual(host.language_cache.path, os.path.join(FireflyIRC.DATA_DIR, 'language'))
+
+        cache = LanguageCache(os.path.join(FireflyIRC.DATA_DIR, 'compiled'))
+        firefly_irc = FireflyIRC(Server(self.hostname, self.config), host=firefly.PluginHost(language_cache=cache))
+        self.assertIs(firefly_irc.language_cache, cache)
+
+    def test_separate_hosts(self):
+        first = FireflyIRC(Server(self.hostname, self.config))
+        second = FireflyIRC(Server(self.hostname, self.config))
+
+        self.assertIsNot(first.registry, second.registry)
+
+    @mock.patch.object(FireflyIRC, 'msg')
+    def test_shared_plugin_instance(self, mock_msg):
+        host = firefly.PluginHost()
+        first = FireflyIRC(Server(self.hostname, self.config), host=host)
+        params = {'name': 'ping', 'permission': 'guest'}
+
+        host.registry.bind_command('ping', self.PluginTest, self.PluginTest.ping, params)
+        plugin_obj = host.registry.plugins['plugintest']
+
+        # The command is answered on the connection it was received from, using the same plugin instance
+        second = FireflyIRC(Server(self.hostname, self.config), host=host)
+        dest = containers.Destination(second, '#test')
+        message = containers.Message('>>> plugintest ping 1', dest, containers.Hostmask('Nick!~user@example.org'))
+        second._fire_command('plugintest', 'ping', ['1'], message)
+
+        mock_msg.assert_called_once_with(dest, 'pong')
+        self.assertIs(second.registry.get_command('plugintest', 'ping')[0], plugin_obj)
+        self.assertIs(plugin_obj.host, host)
+
+
+class LoggerTestCase(FireflyIRCTestCase):
+
+    def test_non_ascii_names(self):
+        firefly_irc = FireflyIRC(Server(self.hostname, self.config))
+        logger = firefly_irc.registry.get_plugin('logger')
+        response = mock.Mock(firefly=firefly_irc)
+        host = containers.Hostmask(u'b\xf8b!~user@example.org')
+
+        channel = containers.Destination(firefly_irc, u'#caf\xe9')
+        logger.start_logging_channel(response, channel)
+        logger.channel_message(response, containers.Message(u'h\xe9llo', channel, host))
+
+        query = containers.Destination(firefly_irc, firefly_irc.nickname)
+        logger.private_message(response, containers.Message(u'hi', query, host))
+
+        with logger.read(self.hostname, u'#caf\xe9') as log:
+            self.assertTrue(log.read().decode('utf-8').endswith(u' <b\xf8b> h\xe9llo\n'))
+
+        with logger.read(self.hostname, u'b\xf8b', logger.TYPE_QUERY) as log:
+            self.assertTrue(log.read().decode('utf-8').endswith(u' <b\xf8b> hi\n'))
+
+        # The seen plugin searches the same logs
+        seen = firefly_irc.registry.get_plugin('seen')
+        with logger.read(self.hostname, u'#caf\xe9') as log:
+            self.assertEqual(seen._iterate_logfile(u'B\xf8b', log)[1:], (u'b\xf8b', u'h\xe9llo'))
+
+        logger.unload()
+
 
 class LanguageTests(FireflyIRCTestCase):
     """
@@ -0,0 +1,124 @@
+import os
+import unittest
+from ConfigParser import ConfigParser
+
+from mock import mock
+from twisted.test.proto_helpers import StringTransport
+
+from firefly import FireflyIRC
+from firefly.capture import TemporaryDirectories
+from firefly.containers import Server
+from firefly.ircv3 import Capabilities, parse_tags
+from firefly.users import User
+
+
+class TagsTestCase(unittest.TestCase):
+
+    def test_no_tags(self):
+        self.assertEqual(parse_tags(':nick!user@host PRIVMSG #chan :@hi'), ({}, ':nick!user@host PRIVMSG #chan :@hi'))
+
+    def test_tags(self):
+        tags, line = parse_tags('@account=Alice;time=2016-01-01T00:00:00.000Z;+draft/typing '
+                                ':nick!user@host PRIVMSG #c :hi')
+        self.assertEqual(line, ':nick!user@host PRIVMSG #c :hi')
+        self.assertDictEqual(tags, {'account': 'Alice', 'time': '2016-01-01T00:00:00.000Z', '+draft/typing': True})
+
+    def test_escapes(self):
+        tags, __ = parse_tags(r'@a=semi\:colon\sspace\\slash;b=trailing\ PING')
+        self.assertEqual(tags['a'], 'semi;colon space\\slash')
+        self.assertEqual(tags['b'], 'trailing')
+
+
+class CapabilitiesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.capabilities = Capabilities(['account-notify', 'account-tag', 'extended-join'])
+        self.assertEqual(self.capabilities.start(), 'CAP LS 302')
+
+    def test_negotiate(self):
+        # Multiline LS replies are collected before requesting anything
+        self.assertListEqual(self.capabilities.handle('LS', ['*', 'multi-prefix account-notify sasl=PLAIN']), [])
+        self.assertListEqual(self.capabilities.handle('LS', ['extended-join']),
+                             ['CAP REQ :account-notify extended-join'])
+
+        self.assertListEqual(self.capabilities.handle('ACK', ['account-notify extended-join']), ['CAP END'])
+        self.assertIn('extended-join', self.capabilities)
+        self.assertNotIn('account-tag', self.capabilities)
+        self.assertFalse(self.capabilities.negotiating)
+
+        # New capabilities are requested after registration, without ending negotiation again
+        self.assertListEqual(self.capabilities.handle('NEW', ['account-tag']), ['CAP REQ :account-tag'])
+        self.assertListEqual(self.capabilities.handle('ACK', ['account-tag']), [])
+        self.assertListEqual(self.capabilities.handle('DEL', ['account-notify']), [])
+        self.assertSetEqual(self.capabilities.enabled, {'account-tag', 'extended-join'})
+
+    def test_nothing_wanted(self):
+        self.assertListEqual(self.capabilities.handle('LS', ['multi-prefix']), ['CAP END'])
+
+    def test_nak(self):
+        self.capabilities.handle('LS', ['account-tag'])
+        self.assertListEqual(self.capabilities.handle('NAK', ['account-tag']), ['CAP END'])
+        self.assertSetEqual(self.capabilities.enabled, set())
+
+
+class AccountTrackingTestCase(unittest.TestCase):
+    """
+    Drives a client through registration and account tracking, playing the part of the IRC server.
+    """
+    def setUp(self):
+        # Keep configuration, data and compiled language files out of the users real directories
+        directories = TemporaryDirectories()
+        directories.__enter__()
+        self.addCleanup(directories.__exit__, None, None, None)
+
+        config_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'config')
+        server_config = ConfigParser()
+        server_config.read(os.path.join(config_path, 'server.cfg'))
+        identity_config = ConfigParser()
+        identity_config.read(os.path.join(config_path, 'identities', 'test.cfg'))
+
+        with mock.patch.object(FireflyIRC, 'load_configuration') as mock_load_configuration:
+            mock_load_configuration.side_effect = lambda name, plugin=None, basedir=None, default=None, ext='.cfg': \
+                identity_config if basedir == 'identities' else ConfigParser()
+            self.server = Server('irc.example.org', server_config)
+
+        with mock.patch('firefly.auth.open_store') as mock_open_store:
+            self.accounts = {'alice': User('alice@example.org', nick='Alice')}
+            mock_open_store.return_value.find.side_effect = lambda nick: self.accounts.get(nick.lower())
+            self.firefly = FireflyIRC(self.server, language='trie')
+
+        self.firefly.auth.trust_services = True
+        self.transport = StringTransport()
+        self.firefly.makeConnection(self.transport)
+
+    def receive(self, line):
+        self.transport.clear()
+        self.firefly.dataReceived(line + '\r\n')
+        return self.transport.value().splitlines()
+
+    def test_negotiation(self):
+        self.assertEqual(self.transport.value().splitlines()[0], 'CAP LS 302')
+        self.assertListEqual(self.receive(':irc.example.org CAP * LS :account-notify extended-join account-tag'),
+                             ['CAP REQ :account-notify account-tag extended-join'])
+        self.assertListEqual(self.receive(':irc.example.org CAP * ACK :account-notify account-tag extended-join'),
+                             ['CAP END'])
+
+    @mock.patch('twisted.internet.task.LoopingCall')
+    def test_accounts(self, mock_looping_call):
+        self.receive(':irc.example.org CAP * LS :account-notify extended-join account-tag')
+        self.receive(':irc.example.org CAP * ACK :account-notify extended-join account-tag')
+
+        with mock.patch.object(FireflyIRC, 'userJoined') as mock_user_joined:
+            self.receive(':Alice!alice@alice.example.org JOIN #firefly Alice :Alice Liddell')
+            mock_user_joined.assert_called_once_with('Alice', '#firefly')
+        self.assertEqual(self.firefly.auth.sessions['alice.example.org'].account, 'Alice')
+
+        self.receive(':Alice!alice@alice.example.org ACCOUNT *')
+        self.assertNotIn('alice.example.org', self.firefly.auth.sessions)
+
+        self.receive('@account=Alice :Alice!alice@alice.example.org NOTICE Firefly :hello')
+        self.assertEqual(self.firefly.auth.sessions['alice.example.org'].user.email, 'alice@example.org')
+
+        # Services accounts without a matching user aren't logged in
+        self.receive(':Bob!bob@bob.example.org ACCOUNT Bob')
+        self.assertNotIn('bob.example.org', self.firefly.auth.sessions)
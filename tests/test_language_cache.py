@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from firefly.languages.cache import LanguageCache
+from firefly.languages.interface import LanguageInterface
+
+
+class FakeLanguage(LanguageInterface):
+    version = '1.0'
+
+    def __init__(self):
+        super(FakeLanguage, self).__init__()
+        self.files = []
+        self.parsed = 0
+
+    def get_reply(self, message, client='localhost', groups=None):
+        pass
+
+    def load_file(self, file_path):
+        self.parsed += 1
+        with open(file_path) as f:
+            self.files.append(f.read())
+
+    def load_directory(self, dir_path):
+        for filename in sorted(os.listdir(dir_path)):
+            self.load_file(os.path.join(dir_path, filename))
+
+    def get_state(self):
+        return self.files
+
+    def set_state(self, state):
+        self.files = state
+
+
+class LanguageCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.lang_dir = os.path.join(self.path, 'lang')
+        os.makedirs(self.lang_dir)
+        self._write('a.aml', 'a')
+        self._write('b.aml', 'b')
+
+        self.cache = LanguageCache(os.path.join(self.path, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write(self, filename, content):
+        with open(os.path.join(self.lang_dir, filename), 'w') as f:
+            f.write(content)
+
+    def test_restore(self):
+        first = FakeLanguage()
+        self.assertTrue(self.cache.load(first, self.lang_dir))
+        self.assertEqual(first.parsed, 2)
+
+        second = FakeLanguage()
+        self.cache.load(second, self.lang_dir)
+        self.assertEqual(second.parsed, 0)
+        self.assertListEqual(second.files, ['a', 'b'])
+
+    def test_invalidation(self):
+        self.cache.load(FakeLanguage(), self.lang_dir)
+
+        self._write('c.aml', 'c')
+        engine = FakeLanguage()
+        self.cache.load(engine, self.lang_dir)
+        self.assertEqual(engine.parsed, 3)
+
+        FakeLanguage.version = '2.0'
+        try:
+            engine = FakeLanguage()
+            self.cache.load(engine, self.lang_dir)
+            self.assertEqual(engine.parsed, 3)
+        finally:
+            FakeLanguage.version = '1.0'
+
+    def test_shared_engine(self):
+        engine = FakeLanguage()
+        self.assertTrue(self.cache.load(engine, self.lang_dir))
+        self.assertFalse(self.cache.load(engine, self.lang_dir))
+        self.assertListEqual(engine.files, ['a', 'b'])
+
+    def test_unversioned(self):
+        engine = FakeLanguage()
+        engine.version = None
+        with mock.patch.object(engine, 'get_state') as mock_get_state, \
+                mock.patch('firefly.languages.cache.fingerprint') as mock_fingerprint:
+            self.cache.load(engine, self.lang_dir)
+
+        self.assertEqual(engine.parsed, 2)
+        self.assertFalse(mock_get_state.called)
+        self.assertFalse(mock_fingerprint.called)
+        self.assertIs(engine.language_cache, self.cache)
+
+    def test_uncacheable(self):
+        engine = FakeLanguage()
+        engine.get_state = lambda: None
+        self.cache.load(engine, self.lang_dir)
+        self.assertFalse(os.path.isdir(self.cache.path))
@@ -0,0 +1,121 @@
+import unittest
+
+import mock
+from twisted.internet.task import Clock
+
+from firefly.languages import pool
+from firefly.languages.pool import PooledLanguage
+
+
+class PooledLanguageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.language = PooledLanguage('test', workers=2, timeout=2.0, reactor=self.clock)
+        self.language.start = mock.Mock()
+        self.language._submit = mock.Mock()
+
+    def _replies(self, *messages, **kwargs):
+        replies = []
+        for message in messages:
+            self.language.get_reply(message, client=kwargs.get('client', message)).addCallback(replies.append)
+
+        return replies
+
+    def test_batching(self):
+        self._replies('one', 'two', 'three')
+        self.assertFalse(self.language._submit.called)
+
+        self.clock.advance(0)
+        submitted = [r.message for call in self.language._submit.call_args_list for r in call[0][1]]
+        self.assertListEqual(sorted(submitted), ['one', 'three', 'two'])
+        self.assertLessEqual(self.language._submit.call_count, 2)
+
+    def test_ordered_delivery(self):
+        replies = self._replies('one', 'two', client='client')
+        self.clock.advance(0)
+        first, second = list(self.language._pending['client'])
+
+        # A reply to a later request is held back until every earlier request by the same client has been answered
+        self.language._deliver([second], ['Two'])
+        self.assertListEqual(replies, [])
+
+        self.language._deliver([first], ['One'])
+        self.assertListEqual(replies, ['One', 'Two'])
+        self.assertDictEqual(self.language._pending, {})
+
+    def test_independent_clients(self):
+        replies = self._replies('one', 'two')
+        self.clock.advance(0)
+        first, = self.language._pending['one']
+        second, = self.language._pending['two']
+
+        # A slow request doesn't hold back replies to other clients
+        self.language._deliver([second], ['Two'])
+        self.assertListEqual(replies, ['Two'])
+
+        self.language._deliver([first], ['One'])
+        self.assertListEqual(replies, ['Two', 'One'])
+
+    def test_prefilter_ordered_delivery(self):
+        self.language.prefilter = mock.Mock()
+        self.language.prefilter.check.side_effect = lambda message: message != 'rejected'
+
+        replies = self._replies('one', 'rejected', client='client')
+        self.clock.advance(0)
+        first, rejected = list(self.language._pending['client'])
+        self.assertListEqual([r.message for r in self.language._submit.call_args[0][1]], ['one'])
+
+        # Messages the prefilter rejects aren't answered before the client's earlier requests
+        self.assertListEqual(replies, [])
+        self.language._deliver([first], ['One'])
+        self.assertListEqual(replies, ['One', None])
+
+        # Or straight away, when the client has nothing pending
+        self.assertListEqual(self._replies('rejected', client='client'), [None])
+        self.assertDictEqual(self.language._pending, {})
+
+    def test_timeout(self):
+        replies = self._replies('one', 'two', client='client')
+        self.clock.advance(0)
+        first, second = list(self.language._pending['client'])
+        self.language._deliver([second], ['Two'])
+
+        self.clock.advance(2.0)
+        self.assertListEqual(replies, [None, 'Two'])
+
+        # Late replies are discarded
+        self.language._deliver([first], ['Late'])
+        self.assertListEqual(replies, [None, 'Two'])
+
+    @mock.patch('firefly.languages.pool.multiprocessing.Pool')
+    def test_start(self, mock_pool):
+        reactor = mock.Mock()
+        language = PooledLanguage('test', workers=2, reactor=reactor)
+        language.load_file('one.aml')
+
+        language.start()
+        language.start()
+        self.assertEqual(mock_pool.call_count, 2)
+        self.assertEqual(mock_pool.call_args[0][2], ('test', [('load_file', 'one.aml')], None))
+
+        # Files loaded later are loaded into the running workers, rather than forking new ones
+        language.load_file('two.aml')
+        self.assertEqual(mock_pool.call_count, 2)
+        mock_pool.return_value.apply_async.assert_called_with(pool._load_worker, ('load_file', 'two.aml', 1))
+
+        # And into any workers the pools start to replace ones that die
+        self.assertListEqual(mock_pool.call_args[0][2][1], [('load_file', 'one.aml'), ('load_file', 'two.aml')])
+
+        # Workers are only closed once on shutdown, however many times they're started
+        language.close()
+        language.start()
+        reactor.addSystemEventTrigger.assert_called_once_with('before', 'shutdown', language.close)
+
+    @mock.patch.multiple('firefly.languages.pool', _engine=mock.DEFAULT, _cache=None, _loaded=1)
+    def test_load_worker_skips_replayed(self, _engine):
+        # A replacement worker that replayed the first load call on start doesn't make it again
+        pool._load_worker('load_file', 'one.aml', 0)
+        pool._load_worker('load_file', 'two.aml', 1)
+        _engine.load_file.assert_called_once_with('two.aml')
+        self.assertEqual(pool._loaded, 2)
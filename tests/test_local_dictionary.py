@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import time
+import logging
+import unittest
+from ConfigParser import ConfigParser
+
+import mock
+from twisted.internet import defer
+
+from firefly.plugins.dictionary import Dictionary
+from firefly.plugins.dictionary.local import LocalDictionary, IndexOutOfDateException
+from firefly.plugins.dictionary.webster import CollegiateDictionary, WordNotFoundException
+
+DICTIONARY = """# word\tpart of speech\tdefinition\texamples
+test\tnoun\ta means of testing\ta spelling test | a test of strength
+test\tnoun\ta critical examination
+Test\tverb\tto put to test or proof
+
+tesla\tnoun\tthe unit of magnetic flux density
+testament\tnoun\ta will
+tester\tnoun\tone that tests
+café\tnoun\ta small restaurant
+zebra\tnoun\ta striped horse
+test\tadjective\tof or relating to a test
+"""
+
+
+class LocalDictionaryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'dictionary.tsv')
+        with open(self.path, 'w') as f:
+            f.write(DICTIONARY)
+
+        self.dictionary = LocalDictionary(self.path)
+
+    def tearDown(self):
+        self.dictionary.close()
+        shutil.rmtree(self.directory)
+
+    def test_lookup(self):
+        entries = list(self.dictionary.lookup('TEST'))
+        self.assertListEqual([(e.headword, e.function) for e in entries],
+                             [('test', 'noun'), ('Test', 'verb'), ('test', 'adjective')])
+
+        senses = entries[0].senses
+        self.assertListEqual([s.definition for s in senses], ['a means of testing', 'a critical examination'])
+        self.assertListEqual(senses[0].examples, ['a spelling test', 'a test of strength'])
+        self.assertListEqual(senses[1].examples, [])
+
+    def test_lookup_every_word(self):
+        for word in ('tesla', 'testament', 'tester', 'zebra', u'CAFÉ'):
+            self.assertEqual(len(list(self.dictionary.lookup(word))), 1, word)
+
+    def test_not_found(self):
+        with self.assertRaises(WordNotFoundException) as context:
+            list(self.dictionary.lookup('testy'))
+        self.assertListEqual(context.exception.suggestions, ['tesla', 'test', 'testament', 'tester'])
+
+        for word in ('aardvark', 'zzz', ''):
+            self.assertRaises(WordNotFoundException, list, self.dictionary.lookup(word))
+
+    def test_index_reused(self):
+        mtime = os.stat(self.dictionary.index_path).st_mtime
+        self.dictionary.close()
+
+        self.dictionary = LocalDictionary(self.path)
+        self.assertEqual(os.stat(self.dictionary.index_path).st_mtime, mtime)
+
+    def test_index_rebuilt(self):
+        self.dictionary.close()
+        with open(self.path, 'a') as f:
+            f.write('testy\tadjective\tirritable\n')
+
+        # Make sure the modification is visible even on filesystems with coarse timestamps
+        later = time.time() + 10
+        os.utime(self.path, (later, later))
+
+        self.dictionary = LocalDictionary(self.path)
+        self.assertEqual(next(self.dictionary.lookup('testy')).senses[0].definition, 'irritable')
+
+    def test_index_not_built(self):
+        self.dictionary.close()
+        os.remove(self.dictionary.index_path)
+        self.assertRaises(IndexOutOfDateException, LocalDictionary, self.path, build=False)
+        self.assertFalse(os.path.exists(self.dictionary.index_path))
+
+        self.dictionary = LocalDictionary(self.path)
+        self.dictionary.close()
+        self.dictionary = LocalDictionary(self.path, build=False)
+        self.assertEqual(len(list(self.dictionary.lookup('tester'))), 1)
+
+    def test_empty(self):
+        path = os.path.join(self.directory, 'empty.tsv')
+        open(path, 'w').close()
+
+        dictionary = LocalDictionary(path)
+        self.assertRaises(WordNotFoundException, list, dictionary.lookup('test'))
+        dictionary.close()
+
+    def test_missing(self):
+        self.assertRaises(IOError, LocalDictionary, os.path.join(self.directory, 'missing.tsv'))
+
+
+class DictionaryPluginTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'dictionary.tsv')
+        with open(self.path, 'w') as f:
+            f.write(DICTIONARY)
+
+        config = ConfigParser()
+        config.add_section('Dictionary')
+        config.set('Dictionary', 'Backend', 'local')
+        config.add_section('Local')
+        config.set('Local', 'Path', self.path)
+
+        # Only the parts of the plugin used to open its dictionary
+        self.plugin = Dictionary.__new__(Dictionary)
+        self.plugin._log = logging.getLogger('firefly.plugins.dictionary')
+        self.plugin.config = config
+        self.plugin.api_key = ''
+        self.plugin.dictionary = None
+        self.plugin._generation = 0
+
+    def tearDown(self):
+        self.plugin._close_dictionary()
+        shutil.rmtree(self.directory)
+
+    @mock.patch.object(Dictionary, 'data_path', '')
+    @mock.patch('firefly.plugins.dictionary.threads.deferToThread')
+    def test_index_built_in_thread(self, mock_defer_to_thread):
+        built = defer.Deferred()
+        mock_defer_to_thread.return_value = built
+
+        # Merriam-Webster is used until the index has been built in a thread
+        self.plugin._open_dictionary()
+        mock_defer_to_thread.assert_called_once_with(LocalDictionary, self.path)
+        self.assertFalse(os.path.exists(self.path + '.index'))
+        self.assertIsInstance(self.plugin.dictionary, CollegiateDictionary)
+        self.assertFalse(self.plugin.local)
+
+        built.callback(LocalDictionary(self.path))
+        self.assertIsInstance(self.plugin.dictionary, LocalDictionary)
+        self.assertTrue(self.plugin.local)
+
+        # Once indexed, the local dictionary is opened straight away
+        self.plugin._open_dictionary()
+        self.assertEqual(mock_defer_to_thread.call_count, 1)
+        self.assertIsInstance(self.plugin.dictionary, LocalDictionary)
+        self.assertTrue(self.plugin.local)
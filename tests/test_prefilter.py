@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from firefly.languages.cache import LanguageCache
+from firefly.languages.prefilter import KeywordPrefilter
+
+
+class KeywordPrefilterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.prefilter = KeywordPrefilter()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write(self, *patterns):
+        path = os.path.join(self.path, 'test.aml')
+        with open(path, 'w') as f:
+            f.write('<agentml version="0.2" xmlns="">')
+            for pattern in patterns:
+                f.write('<trigger>{p}<template>Hi</template></trigger>'.format(p=pattern))
+            f.write('</agentml>')
+
+        return path
+
+    def test_pattern_anchors(self):
+        self.assertSetEqual(KeywordPrefilter.pattern_anchors('this is a test'), {'this'})
+        self.assertSetEqual(KeywordPrefilter.pattern_anchors('(hi|hello)'), {'hi', 'hello'})
+        self.assertSetEqual(KeywordPrefilter.pattern_anchors('[please] tell me *'), {'tell'})
+        self.assertSetEqual(KeywordPrefilter.pattern_anchors('hello, world'), {'world'})
+
+    def test_pattern_without_anchors(self):
+        self.assertIsNone(KeywordPrefilter.pattern_anchors('*'))
+        self.assertIsNone(KeywordPrefilter.pattern_anchors('# _ *'))
+        self.assertIsNone(KeywordPrefilter.pattern_anchors('colo[u]r'))
+        self.assertIsNone(KeywordPrefilter.pattern_anchors('(a|b)(c|d)'))
+
+    def test_check(self):
+        self.prefilter.load_file(self._write('<pattern>this is a test</pattern>', '<pattern>(hi|hello) *</pattern>'))
+
+        self.assertTrue(self.prefilter.enabled)
+        self.assertTrue(self.prefilter.check('This is a test'))
+        self.assertTrue(self.prefilter.check('well, HELLO there'))
+        self.assertFalse(self.prefilter.check('nobody said anything'))
+
+        self.assertEqual(self.prefilter.checked, 3)
+        self.assertEqual(self.prefilter.passed, 2)
+        self.assertEqual(self.prefilter.rejected, 1)
+
+    def test_unanchored_patterns_disable(self):
+        self.prefilter.load_file(self._write('<pattern>this is a test</pattern>', '<pattern>*</pattern>'))
+
+        self.assertFalse(self.prefilter.enabled)
+        self.assertTrue(self.prefilter.check('nobody said anything'))
+
+    def test_regex_patterns_disable(self):
+        self.prefilter.load_file(self._write('<pattern regex="true">^test$</pattern>'))
+
+        self.assertFalse(self.prefilter.enabled)
+        self.assertTrue(self.prefilter.check('nobody said anything'))
+
+    def test_cached_index(self):
+        cache = LanguageCache(os.path.join(self.path, 'cache'))
+        path = self._write('<pattern>this is a test</pattern>', '<pattern>*</pattern>')
+        self.prefilter.load_file(path, cache)
+
+        # The file has already been indexed, so it isn't parsed again
+        prefilter = KeywordPrefilter()
+        with mock.patch.object(prefilter, 'index_file') as mock_index_file:
+            prefilter.load_file(path, cache)
+        self.assertFalse(mock_index_file.called)
+        self.assertSetEqual(prefilter.anchors, {'this'})
+        self.assertEqual((prefilter.patterns, prefilter.unanchored), (2, 1))
+
+        # Until it changes
+        path = self._write('<pattern>(hi|hello) *</pattern>')
+        later = os.stat(path).st_mtime + 10
+        os.utime(path, (later, later))
+
+        prefilter = KeywordPrefilter()
+        prefilter.load_file(path, cache)
+        self.assertSetEqual(prefilter.anchors, {'hi', 'hello'})
+        self.assertTrue(prefilter.enabled)
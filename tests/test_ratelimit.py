@@ -0,0 +1,59 @@
+import unittest
+
+from firefly.errors import RateLimitedError
+from firefly.ratelimit import TokenBucket
+
+
+class TokenBucketTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.bucket = TokenBucket(rate=0.5, burst=2, clock=lambda: self.now)
+
+    def test_burst(self):
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.assertEqual(self.bucket.retry_after(), 2.0)
+        self.assertRaises(RateLimitedError, self.bucket.reserve)
+
+    def test_refill(self):
+        self.bucket.reserve()
+        self.bucket.reserve()
+
+        self.now = 1.0
+        self.assertEqual(self.bucket.retry_after(), 1.0)
+        self.now = 2.0
+        self.assertEqual(self.bucket.reserve(), 0)
+
+        # Never refills past the burst size
+        self.now = 100.0
+        self.assertEqual(self.bucket.tokens, 2)
+
+    def test_configure(self):
+        self.bucket.reserve()
+        self.now = 1.0
+
+        # Tokens refilled at the old rate are kept
+        self.bucket.configure(rate=1, burst=3)
+        self.assertEqual(self.bucket.tokens, 1.5)
+        self.now = 2.0
+        self.assertEqual(self.bucket.tokens, 2.5)
+
+        # But never more than the new burst size
+        self.bucket.configure(rate=1, burst=1)
+        self.assertEqual(self.bucket.tokens, 1)
+
+    def test_queue(self):
+        self.bucket.reserve()
+        self.bucket.reserve()
+
+        # Requests over the limit are spread out at the refill rate
+        self.assertEqual(self.bucket.reserve(max_wait=5), 2.0)
+        self.assertEqual(self.bucket.reserve(max_wait=5), 4.0)
+
+        with self.assertRaises(RateLimitedError) as context:
+            self.bucket.reserve(max_wait=5)
+        self.assertEqual(context.exception.retry_after, 1.0)
+
+        # Declined requests don't take a token
+        self.assertEqual(self.bucket.tokens, -2)
@@ -0,0 +1,59 @@
+import unittest
+
+from twisted.internet import defer
+from twisted.internet.error import DNSLookupError
+
+from firefly.resolver import Resolver
+
+
+class ResolverTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.lookups = []
+        self.pending = {}
+        self.resolver = Resolver(ttl=300, negative_ttl=60, lookup=self.lookup, clock=lambda: self.now)
+
+    def lookup(self, host):
+        self.lookups.append(host)
+        self.pending[host] = defer.Deferred()
+        return self.pending[host]
+
+    def test_cache(self):
+        results = []
+        self.resolver.resolve('Example.org').addCallback(results.append)
+        self.pending['example.org'].callback('93.184.216.34')
+
+        self.resolver.resolve('example.org').addCallback(results.append)
+        self.assertListEqual(results, ['93.184.216.34', '93.184.216.34'])
+        self.assertListEqual(self.lookups, ['example.org'])
+
+        # Expired, or explicitly ignored, entries are looked up again
+        self.now = 301
+        self.resolver.resolve('example.org')
+        self.resolver.resolve('example.org', ignore_cache=True)
+        self.assertListEqual(self.lookups, ['example.org', 'example.org'])
+
+    def test_negative_cache(self):
+        failures = []
+        self.resolver.resolve('masked.example').addErrback(failures.append)
+        self.pending['masked.example'].errback(DNSLookupError('masked.example'))
+
+        self.resolver.resolve('masked.example').addErrback(failures.append)
+        self.assertEqual(len(failures), 2)
+        for failure in failures:
+            failure.trap(DNSLookupError)
+        self.assertListEqual(self.lookups, ['masked.example'])
+
+        self.now = 61
+        self.resolver.resolve('masked.example').addErrback(failures.append)
+        self.assertListEqual(self.lookups, ['masked.example', 'masked.example'])
+
+    def test_single_flight(self):
+        results = []
+        self.resolver.resolve('example.org').addCallback(results.append)
+        self.resolver.resolve('example.org').addCallback(results.append)
+        self.assertListEqual(self.lookups, ['example.org'])
+
+        self.pending['example.org'].callback('93.184.216.34')
+        self.assertListEqual(results, ['93.184.216.34', '93.184.216.34'])
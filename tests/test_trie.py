@@ -0,0 +1,77 @@
+import cPickle as pickle
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from firefly.languages.trie import TrieLanguage, PatternError, expand, convert_file, convert_directory
+
+
+class TrieLanguageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.language = TrieLanguage()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_expand(self):
+        self.assertListEqual(sorted(expand(u'[please] (hi|hello there) *')), [
+            (u'hello', u'there', u'*'), (u'hi', u'*'),
+            (u'please', u'hello', u'there', u'*'), (u'please', u'hi', u'*')
+        ])
+        self.assertRaises(PatternError, expand, u'(hi|hello')
+        self.assertRaises(PatternError, expand, u'hi]')
+
+    def test_get_reply(self):
+        self.language.add_trigger('this is a test', ['The test was a success!'])
+        self.language.add_trigger('my name is _', ['Hello <star/>'])
+        self.language.add_trigger('i am # years old', ['<star/> is young'])
+        self.language.add_trigger('* is *', ['So <star index="1"/> is <star index="2"/>?'])
+
+        self.assertEqual(self.language.get_reply('This is a test!'), 'The test was a success!')
+        self.assertEqual(self.language.get_reply('my name is Bob'), 'Hello bob')
+        self.assertEqual(self.language.get_reply('I am 30 years old'), '30 is young')
+        self.assertEqual(self.language.get_reply('the sky is very blue'), 'So the sky is very blue?')
+        self.assertIsNone(self.language.get_reply('nothing to see here'))
+
+    def test_groups(self):
+        self.language.add_trigger('hello', ['Hi!'], group='private')
+
+        self.assertIsNone(self.language.get_reply('hello'))
+        self.assertIsNone(self.language.get_reply('hello', groups={None, 'public'}))
+        self.assertEqual(self.language.get_reply('hello', groups={None, 'private'}), 'Hi!')
+
+    def test_state(self):
+        self.language.add_trigger('this is a test', ['The test was a success!'])
+
+        language = TrieLanguage()
+        language.set_state(pickle.loads(pickle.dumps(self.language.get_state(), pickle.HIGHEST_PROTOCOL)))
+        self.assertEqual(language.get_reply('this is a test'), 'The test was a success!')
+
+    def test_convert(self):
+        aml_path = os.path.join(self.path, 'aml')
+        os.makedirs(aml_path)
+        with open(os.path.join(aml_path, 'test.aml'), 'w') as f:
+            f.write('<agentml version="0.2" xmlns="">'
+                    '<trigger><pattern>this is a test</pattern><template>Success!</template></trigger>'
+                    '<group name="private"><trigger><pattern>hi *</pattern><template>'
+                    '<random><item>Hey <star/></item><item>Hello</item></random></template></trigger></group>'
+                    '<trigger><pattern>unsupported</pattern><template><var name="test"/></template></trigger>'
+                    '</agentml>')
+
+        self.assertListEqual(convert_file(os.path.join(aml_path, 'test.aml')), [
+            {'pattern': 'this is a test', 'group': None, 'responses': ['Success!']},
+            {'pattern': 'hi *', 'group': 'private', 'responses': ['Hey <star/>', 'Hello']},
+        ])
+
+        json_path = os.path.join(self.path, 'json')
+        written = convert_directory(aml_path, json_path)
+        self.assertListEqual(written, [os.path.join(json_path, 'test.json')])
+        with open(written[0]) as f:
+            self.assertEqual(len(json.load(f)['triggers']), 2)
+
+        self.language.load_directory(json_path)
+        self.assertEqual(self.language.get_reply('this is a test'), 'Success!')
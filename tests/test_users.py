@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+from ConfigParser import ConfigParser
+
+from firefly.users import User, ConfigUserStore, SQLiteUserStore
+
+
+class UserStoreTests(object):
+
+    def test_get(self):
+        self.store.add(User('admin@example.org', 'Admin', 'Admin', 'Administrator', 'hash'))
+
+        user = self.store.get('admin@example.org')
+        self.assertEqual(user.email, 'admin@example.org')
+        self.assertEqual(user.nick, 'Admin')
+        self.assertEqual(user.name, 'Administrator')
+        self.assertEqual(user.password, 'hash')
+        self.assertTrue(user.is_admin)
+
+        self.assertIn('admin@example.org', self.store)
+        self.assertIsNone(self.store.get('user@example.org'))
+
+    def test_find(self):
+        self.store.add(User('admin@example.org', 'admin', 'Admin'))
+        self.store.add(User('user@example.org', 'user'))
+
+        self.assertEqual(self.store.find('aDMIN').email, 'admin@example.org')
+        self.assertIsNone(self.store.find('user'))
+
+    def test_add_remove(self):
+        self.store.add(User('user@example.org', 'user', 'User'))
+        self.store.add(User('user@example.org', 'admin', 'Renamed'))
+        self.assertListEqual(list(self.store), ['user@example.org'])
+        self.assertEqual(self.store.find('renamed').group, 'admin')
+        self.assertIsNone(self.store.find('user'))
+
+        self.assertTrue(self.store.remove('user@example.org'))
+        self.assertFalse(self.store.remove('user@example.org'))
+        self.assertListEqual(list(self.store), [])
+
+
+class ConfigUserStoreTestCase(UserStoreTests, unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.cfg')
+        os.close(fd)
+        self.store = ConfigUserStore(ConfigParser(), self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_write(self):
+        self.store.add(User('user@example.org', 'user', 'User', 'A User', 'hash'))
+
+        config = ConfigParser()
+        config.read(self.path)
+        self.assertEqual(ConfigUserStore(config, self.path).get('user@example.org').name, 'A User')
+
+
+class SQLiteUserStoreTestCase(UserStoreTests, unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.store = SQLiteUserStore(os.path.join(self.tempdir, 'users.sqlite'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tempdir)
+
+    def test_check(self):
+        notified = []
+        self.store.subscribe(notified.append)
+        self.assertFalse(self.store.check())
+
+        # Changes committed by another connection are detected
+        other = SQLiteUserStore(self.store.path)
+        other.add(User('user@example.org'))
+        other.close()
+
+        self.assertTrue(self.store.check())
+        self.assertListEqual(notified, [self.store])
+        self.assertIn('user@example.org', self.store)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import unittest
+from StringIO import StringIO
+
+from firefly.plugins.dictionary import Dictionary
+from firefly.plugins.dictionary.webster import CollegiateDictionary, InvalidAPIKeyException, \
+    InvalidResponseException, WordNotFoundException, _EscapingReader
+
+ENTRIES = """<?xml version="1.0" encoding="utf-8" ?>
+<entry_list version="1.0">
+    <entry id="R&D"><ew>R&D</ew><hw>R&amp;D</hw><fl>abbreviation</fl><def><dt>:research &#8212; development</dt></def>
+    </entry>
+    <entry id="test"><ew>test</ew><hw>test</hw><fl>noun</fl><def><dt>:a means of testing</dt></def></entry>
+    <entry id="test case"><ew>test case</ew><hw>test case</hw><fl>noun</fl><def><dt>:a precedent</dt></def></entry>
+</entry_list>
+"""
+
+SUGGESTIONS = """<?xml version="1.0" encoding="utf-8" ?>
+<entry_list version="1.0"><suggestion>test</suggestion><suggestion>set</suggestion></entry_list>
+"""
+
+
+class ChunkedResponse(StringIO):
+    """
+    A response that is read in fixed size chunks, like a socket.
+    """
+    def __init__(self, data, chunk_size):
+        StringIO.__init__(self, data)
+        self.chunk_size = chunk_size
+        self.consumed = 0
+
+    def read(self, n=-1):
+        data = StringIO.read(self, self.chunk_size)
+        self.consumed += len(data)
+        return data
+
+
+class WebsterTestCase(unittest.TestCase):
+
+    def test_escaping_reader(self):
+        # Escaping must not depend on where the chunk boundaries fall
+        for chunk_size in range(1, 16):
+            reader = _EscapingReader(ChunkedResponse('AT&T &amp; R&D &#8212; &#x2014; Q&', chunk_size))
+            data = ''.join(iter(lambda: reader.read(chunk_size), ''))
+            self.assertEqual(data, 'AT&amp;T &amp; R&amp;D &#8212; &#x2014; Q&amp;')
+
+    def test_lookup(self):
+        for chunk_size in (1, 7, 64, 4096):
+            dictionary = CollegiateDictionary('key', urlopen=lambda url: ChunkedResponse(ENTRIES, chunk_size))
+            entries = list(dictionary.lookup('test'))
+            self.assertListEqual([e.headword for e in entries], ['R&D', 'test', 'test case'])
+            self.assertEqual(entries[0].senses[0].definition, u'research — development')
+
+    def test_lookup_early_exit(self):
+        response = ChunkedResponse(ENTRIES, 64)
+        dictionary = CollegiateDictionary('key', urlopen=lambda url: response)
+
+        entries = dictionary.lookup('test')
+        self.assertEqual(next(entries).headword, 'R&D')
+        entries.close()
+
+        self.assertLess(response.consumed, len(ENTRIES))
+        self.assertTrue(response.closed)
+
+    def test_lookup_suggestions(self):
+        dictionary = CollegiateDictionary('key', urlopen=lambda url: StringIO(SUGGESTIONS))
+        with self.assertRaises(WordNotFoundException) as context:
+            list(dictionary.lookup('tset'))
+
+        self.assertListEqual(context.exception.suggestions, ['test', 'set'])
+
+    def test_lookup_invalid(self):
+        dictionary = CollegiateDictionary('key', urlopen=lambda url: StringIO('Invalid API key. Not subscribed.'))
+        self.assertRaises(InvalidAPIKeyException, list, dictionary.lookup('test'))
+
+        dictionary = CollegiateDictionary('key', urlopen=lambda url: StringIO('<entry_list><entry>'))
+        self.assertRaises(InvalidResponseException, list, dictionary.lookup('test'))
+
+    def test_fetch_invalid(self):
+        # Malformed responses must not be mistaken for (and cached as) words that weren't found
+        dictionary = CollegiateDictionary('key', urlopen=lambda url: StringIO('<entry_list><entry>'))
+        self.assertRaises(InvalidResponseException, Dictionary._fetch_definitions, dictionary, 'test', 3)
+
+        dictionary = CollegiateDictionary('key', urlopen=lambda url: StringIO(SUGGESTIONS))
+        self.assertEqual(Dictionary._fetch_definitions(dictionary, 'tset', 3), ([], ['test', 'set']))